@@ -3,10 +3,14 @@
 """
 Agro Marketplace Bot - Головний файл запуску
 Синхронізований з веб-панеллю через єдину БД
+
+Єдина точка входу (Procfile: worker: python bot.py); run_bot.py лише
+перенаправляє сюди.
 """
 
 import asyncio
 import logging
+import os
 import sys
 from pathlib import Path
 
@@ -14,12 +18,14 @@ from pathlib import Path
 PROJECT_ROOT = Path(__file__).parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
-from aiogram import Bot, Dispatcher
+from aiogram import Bot
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
 
 # Імпорт конфігурації
-from config.settings import BOT_TOKEN, ADMIN_IDS, DB_PATH
+from config.settings import BOT_TOKEN, ADMIN_IDS, DB_PATH, BOT_MODE, BOT_WORKERS
+from src.bot.runner import bot_session, run_updates, start_metrics_server
+from src.bot.dispatcher import create_dispatcher
 
 # Створюємо директорію для логів
 (PROJECT_ROOT / "logs").mkdir(exist_ok=True)
@@ -61,62 +67,62 @@ async def main():
     # Виконуємо міграцію перед стартом
     run_migration()
 
+    # Окремий /metrics (METRICS_PORT); у шардованому режимі віддає зведення всіх воркерів
+    metrics_server = await start_metrics_server()
+    try:
+        await run_bot()
+    finally:
+        if metrics_server:
+            await metrics_server.cleanup()
+
+
+async def run_bot():
+    """Запуск обробки оновлень: один процес або супервізор шардів"""
+    if BOT_WORKERS > 1:
+        # Оновлення розподіляються між процесами-воркерами по user id
+        from src.bot.sharding import ShardSupervisor
+        logger.info(f"🧩 Воркерів: {BOT_WORKERS}")
+        await ShardSupervisor(BOT_WORKERS).run()
+        return
+
     # Ініціалізація бота
     bot = Bot(
         token=BOT_TOKEN,
+        session=bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
 
-    # Ініціалізація диспетчера
-    dp = Dispatcher()
+    # Ініціалізація диспетчера (storage, middleware, роутери)
+    dp = create_dispatcher()
 
-    # Підключення middleware для перевірки бану
-    try:
-        from src.bot.middlewares.ban_check import BanCheckMiddleware
-        dp.message.middleware(BanCheckMiddleware())
-        dp.callback_query.middleware(BanCheckMiddleware())
-        logger.info("✅ BanCheckMiddleware підключено")
-    except Exception as e:
-        logger.warning(f"⚠️  Не вдалося підключити BanCheckMiddleware: {e}")
-
-    # Підключення роутерів
-    try:
-        from src.bot.handlers import (
-            start, registration, market, chat, 
-            logistics, admin_tools, subscriptions, 
-            offers_handlers, calculators
-        )
-        
-        dp.include_router(start.router)
-        dp.include_router(registration.router)
-        dp.include_router(calculators.router)
-        dp.include_router(market.router)
-        dp.include_router(offers_handlers.router)
-        dp.include_router(chat.router)
-        dp.include_router(logistics.router)
-        dp.include_router(subscriptions.router)
-        dp.include_router(admin_tools.router)
-        
-        logger.info("✅ Всі роутери підключено")
-    except Exception as e:
-        logger.error(f"❌ Помилка підключення роутерів: {e}")
-        logger.warning("⚠️  Бот запуститься без деяких функцій")
+    # Події з веб-панелі (бан, розсилки тощо); у шардованому режимі їх обробляє воркер 0
+    sync_processor = None
+    if os.getenv("BOT_BACKGROUND_JOBS", "1") != "0":
+        from src.bot.middlewares.sync import SyncEventProcessor
+        sync_processor = SyncEventProcessor(bot)
 
     logger.info(f"📋 Адміністратори: {ADMIN_IDS}")
     logger.info(f"💾 База даних: {DB_PATH}")
-    logger.info("🚀 Запуск polling...")
+    logger.info(f"🚀 Запуск ({BOT_MODE})...")
 
     try:
-        # Видалення webhook (якщо був)
-        await bot.delete_webhook(drop_pending_updates=True)
+        if sync_processor:
+            await sync_processor.start()
+            logger.info("🔄 Синхронізація з веб-панеллю активована")
 
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        # Polling або webhook — залежно від BOT_MODE
+        await run_updates(bot, dp)
 
     except Exception as e:
         logger.error(f"❌ Помилка запуску бота: {e}")
         raise
     finally:
+        if sync_processor:
+            await sync_processor.stop()
+        from src.bot.services.delivery import shutdown_delivery
+        await shutdown_delivery()
+        # Записуємо відкладені стани FSM
+        await dp.storage.close()
         await bot.session.close()
 
 
@@ -33,3 +33,28 @@ ADMIN_PASS = os.getenv('ADMIN_PASS', 'admin123')
 
 # Логування
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+# Отримання оновлень Telegram: polling (за замовчуванням) або webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling').strip().lower()
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '').rstrip('/')  # https://bot.example.com
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+# Однаковий для всіх процесів; порожній — генерується при старті (лише для одного процесу)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8080')))
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '16'))
+# Власний/тестовий сервер Bot API (напр. http://127.0.0.1:8081); порожній — api.telegram.org
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '').rstrip('/')
+
+# Кількість процесів-обробників оновлень (шардування по user id); 1 — без супервізора
+BOT_WORKERS = int(os.getenv('BOT_WORKERS', '1'))
+
+# Метрики обробників: знімки процесів (bot-<pid>.json) для /metrics і панелі
+METRICS_DIR = os.getenv('METRICS_DIR', str(DB_PATH.parent / 'metrics'))
+# Окремий HTTP-сервер /metrics (за замовчуванням лише 127.0.0.1); 0 — вимкнено
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+# Bearer-токен для збору /metrics без входу (Prometheus): панель і порт вебхука.
+# Порожній — /metrics панелі лише після входу, на порту вебхука /metrics немає
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
@@ -23,6 +23,9 @@ from config.settings import BOT_TOKEN, ADMIN_IDS, DB_FILE
 
 # Імпорт handlers
 from bot.handlers import start, registration, market, chat, logistics, admin_tools, subscriptions, offers_handlers, calculators
+from src.bot.services.delivery import shutdown_delivery
+from src.bot.runner import bot_session, run_updates
+from src.bot.fsm_storage import create_storage
 
 # Налаштування логування
 logging.basicConfig(
@@ -60,11 +63,12 @@ async def main():
     # Ініціалізація бота
     bot = Bot(
         token=BOT_TOKEN,
+        session=bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
 
     # Ініціалізація диспетчера
-    dp = Dispatcher()
+    dp = Dispatcher(storage=create_storage())
 
     # Підключення роутерів
     dp.include_router(start.router)
@@ -82,15 +86,15 @@ async def main():
     logger.info(f"💾 База даних: {DB_FILE}")
 
     try:
-        # Видалення webhook (якщо був)
-        await bot.delete_webhook(drop_pending_updates=True)
-
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        # Polling або webhook — залежно від BOT_MODE
+        await run_updates(bot, dp)
 
     except Exception as e:
         logger.error(f"❌ Помилка запуску бота: {e}")
     finally:
+        await shutdown_delivery()
+        # Записуємо відкладені стани FSM
+        await dp.storage.close()
         await bot.session.close()
 
 
@@ -0,0 +1,77 @@
+"""
+Dispatcher factory - one place that wires storage, middlewares and routers
+
+Used by bot.py (single process) and by the shard workers in sharding.py,
+so every process handles updates with exactly the same setup.
+"""
+import logging
+
+from aiogram import Dispatcher
+
+from src.bot.fsm_storage import create_storage
+
+logger = logging.getLogger(__name__)
+
+
+def create_dispatcher() -> Dispatcher:
+    """Dispatcher with FSM storage, concurrency and ban check middlewares and all routers"""
+    dp = Dispatcher(storage=create_storage())
+
+    # Запис трафіку (UPDATE_RECORD_FILE) — першим, щоб фіксувати час надходження
+    from src.bot.middlewares.recorder import create_recorder
+    recorder = create_recorder()
+    if recorder is not None:
+        dp.update.outer_middleware(recorder)
+        dp.shutdown.register(recorder.close)
+
+    # Оновлення користувача — по черзі, загальна паралельність обмежена
+    from src.bot.middlewares.concurrency import concurrency_middleware
+    dp.update.outer_middleware(concurrency_middleware)
+
+    # Метрики обробників — після черги, тож міряється саме обробка, а не очікування
+    from src.bot.middlewares.metrics import handler_label_middleware, metrics_middleware
+    dp.update.outer_middleware(metrics_middleware)
+    dp.message.middleware(handler_label_middleware)
+    dp.callback_query.middleware(handler_label_middleware)
+    dp.shutdown.register(metrics_middleware.close)
+
+    # Трасування SQL (SQL_TRACE=1): повільні запити з планом, N+1 по оновленнях
+    from src.database import sql_trace
+    if sql_trace.SQL_TRACE:
+        from src.bot.middlewares.sql_trace import sql_trace_middleware
+        sql_trace.install_aiosqlite()
+        dp.update.outer_middleware(sql_trace_middleware)
+
+    # Підключення middleware для перевірки бану
+    try:
+        from src.bot.middlewares.ban_check import BanCheckMiddleware
+        dp.message.middleware(BanCheckMiddleware())
+        dp.callback_query.middleware(BanCheckMiddleware())
+        logger.info("✅ BanCheckMiddleware підключено")
+    except Exception as e:
+        logger.warning(f"⚠️  Не вдалося підключити BanCheckMiddleware: {e}")
+
+    # Підключення роутерів
+    try:
+        from src.bot.handlers import (
+            start, registration, market, chat,
+            logistics, admin_tools, subscriptions,
+            offers_handlers, calculators
+        )
+
+        dp.include_router(start.router)
+        dp.include_router(registration.router)
+        dp.include_router(calculators.router)
+        dp.include_router(market.router)
+        dp.include_router(offers_handlers.router)
+        dp.include_router(chat.router)
+        dp.include_router(logistics.router)
+        dp.include_router(subscriptions.router)
+        dp.include_router(admin_tools.router)
+
+        logger.info("✅ Всі роутери підключено")
+    except Exception as e:
+        logger.error(f"❌ Помилка підключення роутерів: {e}")
+        logger.warning("⚠️  Бот запуститься без деяких функцій")
+
+    return dp
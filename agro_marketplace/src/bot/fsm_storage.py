@@ -0,0 +1,269 @@
+"""
+SQLite FSM Storage - persistent aiogram FSM state shared between workers
+
+One row per StorageKey (bot, chat, user, thread, business connection,
+destiny) holding the state name and a compact JSON blob of the data.
+Writes are buffered and flushed in batches every FSM_FLUSH_INTERVAL, reads
+check the pending buffer and the batch being written first, so a worker
+always sees its own writes.
+Abandoned flows older than FSM_TTL are purged in the background.
+
+Other workers see a write after the next flush (<= FSM_FLUSH_INTERVAL).
+If a batch fails, keys are retried one by one with backoff; a key that fails
+FSM_MAX_FLUSH_FAILURES times in a row is quarantined (kept in memory for this
+worker, no more write attempts) so one bad record can't stall the others.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import aiosqlite
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite").strip().lower()
+FSM_DB_FILE = os.getenv("FSM_DB_FILE", "data/fsm.db")
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
+# Незавершені сценарії старші за це видаляються (секунди, за замовчуванням 7 днів)
+FSM_TTL = float(os.getenv("FSM_TTL", str(7 * 24 * 3600)))
+PURGE_INTERVAL = 3600.0
+# Після стількох невдалих записів поспіль ключ більше не пишемо (лише пам'ять воркера)
+FSM_MAX_FLUSH_FAILURES = int(os.getenv("FSM_MAX_FLUSH_FAILURES", "5"))
+FSM_MAX_FLUSH_BACKOFF = 30.0
+
+_Record = Tuple[Optional[str], Dict[str, Any]]
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id,
+                     key.business_connection_id, key.destiny)
+    )
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class SQLiteStorage(BaseStorage):
+    """aiogram BaseStorage on SQLite with write-behind batching"""
+
+    def __init__(self, db_path: str = FSM_DB_FILE, flush_interval: float = FSM_FLUSH_INTERVAL,
+                 ttl: float = FSM_TTL):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self._db: Optional[aiosqlite.Connection] = None
+        self._db_lock = asyncio.Lock()
+        self._pending: Dict[str, _Record] = {}
+        # Пакет, що саме пишеться: видно читанням, доки не закомічено
+        self._inflight: Dict[str, _Record] = {}
+        self._failures: Dict[str, int] = {}
+        self._quarantine: Dict[str, _Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+        self._closed = False
+
+    # ---------- Зʼєднання ----------
+
+    async def _conn(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._db_lock:
+                if self._db is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+                    db = await aiosqlite.connect(self.db_path, timeout=10)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute(
+                        """CREATE TABLE IF NOT EXISTS fsm_states (
+                            key TEXT PRIMARY KEY,
+                            state TEXT,
+                            data TEXT NOT NULL DEFAULT '{}',
+                            updated_at REAL NOT NULL
+                        )"""
+                    )
+                    await db.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states(updated_at)")
+                    await db.commit()
+                    self._db = db
+        return self._db
+
+    # ---------- Читання ----------
+
+    async def _get(self, key: StorageKey) -> _Record:
+        k = _key(key)
+        pending = self._pending.get(k) or self._inflight.get(k) or self._quarantine.get(k)
+        if pending is not None:
+            return pending
+        db = await self._conn()
+        async with db.execute("SELECT state, data FROM fsm_states WHERE key=?", (k,)) as cur:
+            row = await cur.fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1] or "{}")
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._get(key)
+        return state
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._get(key)
+        return dict(data)
+
+    # ---------- Запис (write-behind) ----------
+
+    async def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        k = _key(key)
+        self._pending[k] = (state, data)
+        self._quarantine.pop(k, None)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        _, data = await self._get(key)
+        await self._put(key, _state_name(state), data)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        state, _ = await self._get(key)
+        await self._put(key, state, dict(data))
+
+    async def flush(self) -> None:
+        """Writes all pending changes in one transaction, falling back to per-key writes"""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._inflight.update(batch)
+        try:
+            await self._flush_batch(batch)
+        finally:
+            # Записане вже в БД, решта повернулась у _pending / карантин
+            for k, record in batch.items():
+                if self._inflight.get(k) is record:
+                    del self._inflight[k]
+
+    async def _flush_batch(self, batch: Dict[str, _Record]) -> None:
+        now = time.time()
+        rows: Dict[str, Tuple[str, tuple]] = {}
+        for k, (state, data) in batch.items():
+            if state is None and not data:
+                rows[k] = ("delete", (k,))
+                continue
+            try:
+                rows[k] = ("upsert", (k, state, json.dumps(data, ensure_ascii=False, separators=(",", ":")), now))
+            except (TypeError, ValueError) as e:
+                self._failed(k, batch[k], e)
+
+        written = set()
+        try:
+            try:
+                await self._write(list(rows.values()))
+                written.update(rows)
+            except Exception as e:
+                if len(rows) == 1:
+                    k = next(iter(rows))
+                    self._failed(k, batch[k], e)
+                    rows = {}
+                else:
+                    logger.warning(f"FSM batch flush failed ({len(rows)} keys), retrying per key: {e}")
+                for k, row in rows.items():
+                    try:
+                        await self._write([row])
+                        written.add(k)
+                    except Exception as key_error:
+                        self._failed(k, batch[k], key_error)
+        except BaseException:
+            # Скасування: не губимо незаписане, новіші записи мають пріоритет
+            for k in rows.keys() - written:
+                self._pending.setdefault(k, batch[k])
+            raise
+        for k in written:
+            self._failures.pop(k, None)
+
+    async def _write(self, rows) -> None:
+        db = await self._conn()
+        try:
+            upserts = [params for op, params in rows if op == "upsert"]
+            deletes = [params for op, params in rows if op == "delete"]
+            if upserts:
+                await db.executemany(
+                    """INSERT INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)
+                       ON CONFLICT(key) DO UPDATE SET state=excluded.state, data=excluded.data,
+                                                      updated_at=excluded.updated_at""",
+                    upserts,
+                )
+            if deletes:
+                await db.executemany("DELETE FROM fsm_states WHERE key=?", deletes)
+            await db.commit()
+        except BaseException:
+            try:
+                await db.rollback()
+            except Exception:
+                pass
+            raise
+
+    def _failed(self, k: str, record: _Record, error: Exception) -> None:
+        failures = self._failures.get(k, 0) + 1
+        if failures >= FSM_MAX_FLUSH_FAILURES:
+            self._failures.pop(k, None)
+            self._quarantine[k] = record
+            logger.error(f"FSM: key {k} not written after {failures} attempts, kept in memory only: {error}")
+            return
+        self._failures[k] = failures
+        # Новіший запис (якщо вже є) має пріоритет
+        self._pending.setdefault(k, record)
+
+    async def purge_expired(self) -> int:
+        """Deletes flows not touched for longer than ttl"""
+        db = await self._conn()
+        cur = await db.execute("DELETE FROM fsm_states WHERE updated_at < ?", (time.time() - self.ttl,))
+        await db.commit()
+        return cur.rowcount
+
+    async def _flush_loop(self):
+        delay = self.flush_interval
+        while not self._closed:
+            await asyncio.sleep(delay)
+            try:
+                await self.flush()
+                if time.time() - self._last_purge > PURGE_INTERVAL:
+                    self._last_purge = time.time()
+                    removed = await self.purge_expired()
+                    if removed:
+                        logger.info(f"🧹 FSM: removed {removed} abandoned flows")
+            except Exception as e:
+                logger.error(f"Error flushing FSM storage: {e}")
+            # Поки є ключі з помилками — повторюємо рідше
+            delay = min(delay * 2, FSM_MAX_FLUSH_BACKOFF) if self._failures else self.flush_interval
+            if not self._pending:
+                # Нічого не чекає запису — цикл перезапуститься з наступним записом
+                return
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        try:
+            await self.flush()
+            if self._pending:
+                logger.error(f"FSM: {len(self._pending)} changes not written on close")
+        finally:
+            if self._db is not None:
+                await self._db.close()
+                self._db = None
+
+
+def create_storage() -> BaseStorage:
+    """FSM storage for Dispatcher(storage=...): SQLite unless FSM_STORAGE=memory"""
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLiteStorage()
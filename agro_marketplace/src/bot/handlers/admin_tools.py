@@ -38,6 +38,7 @@ def kb_admin():
     kb = InlineKeyboardBuilder()
     kb.button(text="📊 Статистика", callback_data="admin:stats")
     kb.button(text="📦 Останні лоти", callback_data="admin:lots")
+    kb.button(text="🚛 Консолідація", callback_data="admin:loads")
     kb.adjust(1)
     return kb.as_markup()
 
@@ -4,15 +4,25 @@
 
 from __future__ import annotations
 
+import asyncio
+import os
+import tempfile
+
 from aiogram import Router, F
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from src.bot.keyboards.main import main_menu
+from src.bot.services.freight import TARIFFS, REGION_INDEX, quote_all_regions
+from src.bot.services.batch_calc import BatchCalcError, process_batch
+from src.bot.utils.geo import REGIONS
 
 router = Router()
 
+# Ліміт Bot API на завантаження файлів ботом
+MAX_BATCH_FILE_BYTES = 20 * 1024 * 1024
+
 # ---------------- FSM ----------------
 
 class LotCalc(StatesGroup):
@@ -22,11 +32,21 @@ class LotCalc(StatesGroup):
     commission = State()
     delivery = State()
 
+class BatchCalc(StatesGroup):
+    file = State()
+
+class FreightCalc(StatesGroup):
+    from_region = State()
+    volume = State()
+    body = State()
+
 # ---------------- Keyboards ----------------
 
 def kb_calc_menu():
     kb = ReplyKeyboardBuilder()
     kb.button(text="🧮 Лот: сума/комісія/доставка")
+    kb.button(text="🚚 Доставка: оцінка по областях")
+    kb.button(text="📄 Пакетний розрахунок (CSV/XLSX)")
     kb.button(text="⬅️ Назад")
     kb.adjust(1)
     return kb.as_markup(resize_keyboard=True)
@@ -38,6 +58,21 @@ def kb_inline_yes_no(prefix: str):
     b.adjust(2)
     return b.as_markup()
 
+def kb_regions():
+    kb = ReplyKeyboardBuilder()
+    for r in REGIONS:
+        kb.button(text=r)
+    kb.button(text="⬅️ Назад")
+    kb.adjust(2)
+    return kb.as_markup(resize_keyboard=True)
+
+def kb_freight_body():
+    b = InlineKeyboardBuilder()
+    for key, tariff in TARIFFS.items():
+        b.button(text=tariff.title, callback_data=f"calc:freight:body:{key}")
+    b.adjust(2, 1)
+    return b.as_markup()
+
 def kb_inline_back_to_menu():
     b = InlineKeyboardBuilder()
     b.button(text="⬅️ До калькуляторів", callback_data="calc:back")
@@ -207,3 +242,115 @@ async def calc_back(cb: CallbackQuery, state: FSMContext):
     await cb.answer()
     await state.set_state(LotCalc.menu)
     await cb.message.answer("🧮 Оберіть калькулятор 👇", reply_markup=kb_calc_menu())
+
+# ---------------- Freight estimator ----------------
+
+@router.message(LotCalc.menu, F.text == "🚚 Доставка: оцінка по областях")
+async def freight_calc_start(message: Message, state: FSMContext):
+    await state.set_state(FreightCalc.from_region)
+    await message.answer("Оберіть <b>область завантаження</b> 👇", reply_markup=kb_regions())
+
+@router.message(FreightCalc.from_region)
+async def freight_calc_region(message: Message, state: FSMContext):
+    region = (message.text or "").strip()
+    if region == "⬅️ Назад":
+        await state.set_state(LotCalc.menu)
+        await message.answer("🧮 Оберіть калькулятор 👇", reply_markup=kb_calc_menu())
+        return
+    if region not in REGION_INDEX:
+        await message.answer("Оберіть область кнопкою нижче 👇", reply_markup=kb_regions())
+        return
+    await state.update_data(freight_from=region)
+    await state.set_state(FreightCalc.volume)
+    await message.answer("Введіть <b>обсяг</b> у тоннах (наприклад: <code>120</code>):", reply_markup=ReplyKeyboardRemove())
+
+@router.message(FreightCalc.volume)
+async def freight_calc_volume(message: Message, state: FSMContext):
+    volume = _parse_number(message.text)
+    if volume is None or volume <= 0:
+        await message.answer("❌ Не бачу число. Введіть обсяг ще раз (приклад: <code>120</code>).")
+        return
+    await state.update_data(freight_volume=volume)
+    await state.set_state(FreightCalc.body)
+    await message.answer("Оберіть <b>тип кузова</b>:", reply_markup=kb_freight_body())
+
+@router.callback_query(FreightCalc.body, F.data.startswith("calc:freight:body:"))
+async def freight_calc_result(cb: CallbackQuery, state: FSMContext):
+    body = cb.data.split(":")[-1]
+    data = await state.get_data()
+    region = data.get("freight_from")
+    volume = float(data.get("freight_volume", 0.0))
+    await cb.answer()
+
+    # Один векторний розрахунок до всіх 24 областей
+    quotes = quote_all_regions(region, volume, body)
+    tariff = TARIFFS.get(body)
+    lines = [
+        f"🚚 <b>Оцінка доставки</b> з {region} • {volume:g} т • {tariff.title if tariff else body}\n",
+    ]
+    for q in quotes:
+        lines.append(
+            f"• {q['region']}: ~{q['km']:.0f} км → <b>{_fmt_money(q['cost'])}</b> грн "
+            f"({_fmt_money(q['per_ton'])} грн/т)"
+        )
+    lines.append("\n<i>Орієнтовно: відстань між обласними центрами × тариф кузова.</i>")
+
+    await cb.message.answer("\n".join(lines), reply_markup=kb_inline_back_to_menu())
+    await state.set_state(LotCalc.menu)
+
+# ---------------- Batch calculator ----------------
+
+@router.message(LotCalc.menu, F.text == "📄 Пакетний розрахунок (CSV/XLSX)")
+async def batch_calc_start(message: Message, state: FSMContext):
+    await state.set_state(BatchCalc.file)
+    await message.answer(
+        "📄 Надішліть файл <b>CSV</b> або <b>XLSX</b> з колонками:\n"
+        "• <code>ціна</code> (price) і <code>кількість</code> (qty) — обовʼязково\n"
+        "• <code>комісія</code> (%, commission) і <code>доставка</code> (грн, delivery) — за бажанням\n\n"
+        "Комісію за замовчуванням можна вказати в підписі до файлу, напр. <code>1.5</code>.",
+        reply_markup=kb_inline_back_to_menu()
+    )
+
+@router.message(BatchCalc.file, F.document)
+async def batch_calc_file(message: Message, state: FSMContext):
+    doc = message.document
+    if doc.file_size and doc.file_size > MAX_BATCH_FILE_BYTES:
+        await message.answer("❌ Файл завеликий (максимум 20 МБ).")
+        return
+
+    default_commission = _parse_number(message.caption or "") or 0.0
+    filename = doc.file_name or "batch.csv"
+    base = os.path.splitext(os.path.basename(filename))[0]
+    await message.answer("⏳ Рахую…")
+
+    with tempfile.TemporaryDirectory(prefix="calc_") as tmp:
+        in_path = os.path.join(tmp, "input" + os.path.splitext(filename)[1].lower())
+        out_path = os.path.join(tmp, f"{base}_result.csv")
+        await message.bot.download(doc, destination=in_path)
+        try:
+            # Рахуємо чанками у фоновому потоці, щоб не блокувати інших користувачів
+            summary = await asyncio.to_thread(process_batch, in_path, out_path, filename, default_commission)
+        except BatchCalcError as e:
+            await message.answer(f"❌ {e}")
+            return
+        except Exception:
+            await message.answer("❌ Не вдалося прочитати файл. Перевірте формат і спробуйте ще раз.")
+            return
+
+        text = (
+            "📄 <b>Пакетний розрахунок</b>\n"
+            f"• Рядків: <b>{summary['rows']}</b> (помилок: {summary['invalid']})\n"
+            f"• Кількість: <b>{summary['qty']:g}</b>\n"
+            f"• Сума: <b>{_fmt_money(summary['subtotal'])}</b> грн\n"
+            f"• Комісія: <b>{_fmt_money(summary['commission'])}</b> грн\n"
+            f"• Доставка: <b>{_fmt_money(summary['delivery'])}</b> грн\n"
+            f"— — —\n"
+            f"✅ <b>Всього: {_fmt_money(summary['total'])} грн</b>"
+        )
+        await message.answer_document(FSInputFile(out_path, filename=f"{base}_result.csv"), caption=text)
+
+    await state.set_state(LotCalc.menu)
+
+@router.message(BatchCalc.file)
+async def batch_calc_no_file(message: Message):
+    await message.answer("Надішліть файл CSV або XLSX документом 📎", reply_markup=kb_inline_back_to_menu())
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import html
 import os
 import logging
 from typing import Optional
@@ -12,12 +14,36 @@ from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
 from src.bot.keyboards.main import main_menu
+from src.bot.services.chat_routes import ChatRouteCache, ChatMessageWriter
+from src.bot.services.delivery import deliver, Lane
+from src.bot.services.chat_archive import ChatArchiver, load_archived_messages
 
 logger = logging.getLogger(__name__)
 router = Router()
 
 DB_FILE = os.getenv("DB_FILE", "data/agro_bot.db")
 
+# Маршрути активних чатів (session_id -> обидві сторони) і відкладений запис повідомлень
+chat_routes = ChatRouteCache()
+message_writer = ChatMessageWriter(DB_FILE)
+# Перенесення старих повідомлень в архів (data/chat_archive.db)
+chat_archiver = ChatArchiver(DB_FILE)
+
+HISTORY_LIMIT = 30
+
+
+@router.startup()
+async def _start_chat_archiver():
+    # У шардованому режимі фонові задачі запускає лише один воркер
+    if os.getenv("BOT_BACKGROUND_JOBS", "1") != "0":
+        await chat_archiver.start()
+
+
+@router.shutdown()
+async def _flush_chat_messages():
+    await chat_archiver.stop()
+    await message_writer.stop()
+
 class ChatState(StatesGroup):
     chatting = State()
 
@@ -30,7 +56,8 @@ def kb_chat_controls():
 def kb_open_chat(session_id: int):
     kb = InlineKeyboardBuilder()
     kb.button(text="💬 Відкрити чат", callback_data=f"chat:open:{session_id}")
-    kb.adjust(1)
+    kb.button(text="📜 Історія", callback_data=f"chat:history:{session_id}")
+    kb.adjust(2)
     return kb.as_markup()
 
 async def _ensure_tables():
@@ -374,6 +401,7 @@ async def open_chat_with_contact(cb: CallbackQuery, state: FSMContext):
     # Створюємо або отримуємо сесію
     try:
         session_id = await _get_or_create_session(my_user_id, contact_user_id, None)
+        await chat_routes.load(DB_FILE, session_id)
         
         # Відкриваємо чат
         await state.update_data(chat_session_id=session_id)
@@ -449,6 +477,31 @@ async def open_chat(cb: CallbackQuery, state: FSMContext):
     await _ensure_tables()
     session_id = int(cb.data.split(":")[-1])
 
+    user_id = await _get_user_id(cb.from_user.id)
+    if not user_id:
+        await cb.answer("Спочатку /start", show_alert=True)
+        return
+
+    # Один JOIN: сесія + обидві сторони; маршрут лишається в кеші до виходу з чату
+    route = await chat_routes.load(DB_FILE, session_id)
+    if not route:
+        await cb.answer("Чат не активний", show_alert=True)
+        return
+    if user_id not in (route.parties[0].user_id, route.parties[1].user_id):
+        await cb.answer("Немає доступу", show_alert=True)
+        return
+
+    await state.update_data(chat_session_id=session_id)
+    await state.set_state(ChatState.chatting)
+    await cb.message.answer("💬 Ви в чаті. Пишіть повідомлення. Для виходу натисніть «❌ Вийти з чату».", reply_markup=kb_chat_controls())
+    await cb.answer()
+
+@router.callback_query(F.data.startswith("chat:history:"))
+async def chat_history(cb: CallbackQuery):
+    """Показує останні повідомлення чату (архів + поточні)"""
+    await _ensure_tables()
+    session_id = int(cb.data.split(":")[-1])
+
     user_id = await _get_user_id(cb.from_user.id)
     if not user_id:
         await cb.answer("Спочатку /start", show_alert=True)
@@ -457,25 +510,44 @@ async def open_chat(cb: CallbackQuery, state: FSMContext):
     async with aiosqlite.connect(DB_FILE) as db:
         db.row_factory = aiosqlite.Row
         cur = await db.execute(
-            "SELECT id, user1_id, user2_id, status FROM chat_sessions WHERE id=?",
+            "SELECT user1_id, user2_id FROM chat_sessions WHERE id=?",
             (session_id,),
         )
         sess = await cur.fetchone()
+        if not sess or user_id not in (sess["user1_id"], sess["user2_id"]):
+            await cb.answer("Немає доступу", show_alert=True)
+            return
+        cur = await db.execute(
+            "SELECT sender_user_id, content, created_at FROM chat_messages WHERE session_id=? ORDER BY id DESC LIMIT ?",
+            (session_id, HISTORY_LIMIT),
+        )
+        recent = [dict(r) for r in reversed(await cur.fetchall())]
 
-    if not sess or sess["status"] != "active":
-        await cb.answer("Чат не активний", show_alert=True)
-        return
-    if user_id not in (sess["user1_id"], sess["user2_id"]):
-        await cb.answer("Немає доступу", show_alert=True)
+    # Архів читаємо лише якщо гарячих повідомлень замало
+    if len(recent) < HISTORY_LIMIT:
+        archived = await asyncio.to_thread(load_archived_messages, session_id)
+        recent = archived[-(HISTORY_LIMIT - len(recent)):] + recent if archived else recent
+
+    if not recent:
+        await cb.answer("Повідомлень ще немає", show_alert=True)
         return
 
-    await state.update_data(chat_session_id=session_id)
-    await state.set_state(ChatState.chatting)
-    await cb.message.answer("💬 Ви в чаті. Пишіть повідомлення. Для виходу натисніть «❌ Вийти з чату».", reply_markup=kb_chat_controls())
+    lines = [f"📜 <b>Історія чату #{session_id}</b> (останні {len(recent)}):\n"]
+    for m in recent:
+        who = "Ви" if m["sender_user_id"] == user_id else "Співрозмовник"
+        lines.append(f"<i>{(m.get('created_at') or '')[:16]}</i> <b>{who}:</b> {html.escape(m['content'] or '')}")
+
+    # Ліміт Telegram — 4096 символів; відкидаємо найстаріші рядки, не ріжучи HTML
+    while len(lines) > 2 and len("\n".join(lines)) > 4000:
+        del lines[1]
+    await cb.message.answer("\n".join(lines))
     await cb.answer()
 
 @router.message(ChatState.chatting, F.text == "❌ Вийти з чату")
 async def exit_chat(message: Message, state: FSMContext):
+    data = await state.get_data()
+    if data.get("chat_session_id"):
+        chat_routes.evict(data["chat_session_id"])
     await state.clear()
     # визначаємо адмін чи ні для меню
     is_admin = False
@@ -493,58 +565,42 @@ async def chat_message(message: Message, state: FSMContext):
         await message.answer("Чат не знайдено. Спробуйте ще раз.", reply_markup=main_menu())
         return
 
-    sender_user_id = await _get_user_id(message.from_user.id)
-    if not sender_user_id:
+    text = (message.text or "").strip()
+    if not text:
+        return
+
+    # Маршрут з кешу; після рестарту бота — один JOIN і далі знову з пам'яті
+    route = await chat_routes.resolve(DB_FILE, session_id)
+    if not route:
         await state.clear()
-        await message.answer("Спочатку /start", reply_markup=main_menu())
+        await message.answer("Чат не знайдено.", reply_markup=main_menu())
         return
 
-    text = (message.text or "").strip()
-    if not text:
+    sender = route.party_by_telegram(message.from_user.id)
+    recipient = route.peer_of(message.from_user.id)
+    if not sender or not recipient:
+        await state.clear()
+        await message.answer("Спочатку /start", reply_markup=main_menu())
         return
 
-    # Зберігаємо повідомлення
-    async with aiosqlite.connect(DB_FILE) as db:
-        db.row_factory = aiosqlite.Row
-        
-        # Отримуємо інфо про сесію
-        sess = await db.execute(
-            "SELECT user1_id, user2_id FROM chat_sessions WHERE id=?",
-            (session_id,)
-        ).fetchone()
-        
-        if not sess:
-            await state.clear()
-            await message.answer("Чат не знайдено.", reply_markup=main_menu())
-            return
-        
-        # Визначаємо отримувача
-        recipient_user_id = sess["user2_id"] if sess["user1_id"] == sender_user_id else sess["user1_id"]
-        
-        # Зберігаємо повідомлення в БД
-        await db.execute(
-            "INSERT INTO chat_messages(session_id, sender_user_id, content) VALUES(?,?,?)",
-            (session_id, sender_user_id, text),
-        )
-        await db.commit()
+    # Зберігаємо повідомлення (пакетний запис у фоні)
+    message_writer.enqueue(session_id, sender.user_id, text)
 
     # Підтверджуємо відправнику
     await message.answer("✅ Надіслано")
     
     # Пересилаємо отримувачу
+    if not recipient.telegram_id:
+        return
     try:
-        recipient_telegram_id = await _get_user_telegram_id(recipient_user_id)
-        if recipient_telegram_id:
-            sender_info = await _get_user_info(sender_user_id)
-            sender_name = sender_info.get("full_name", "Користувач") if sender_info else "Користувач"
-            
-            # Відправляємо повідомлення отримувачу
-            await message.bot.send_message(
-                recipient_telegram_id,
-                f"💬 <b>Нове повідомлення від {sender_name}</b>\n\n"
-                f"{text}\n\n"
-                f"<i>Для відповіді відкрийте чат через «💬 Мої чати»</i>"
-            )
+        await deliver(
+            message.bot,
+            recipient.telegram_id,
+            f"💬 <b>Нове повідомлення від {sender.name}</b>\n\n"
+            f"{text}\n\n"
+            f"<i>Для відповіді відкрийте чат через «💬 Мої чати»</i>",
+            lane=Lane.INTERACTIVE,
+        )
     except Exception as e:
         logger.error(f"Не вдалося надіслати повідомлення отримувачу: {e}")
 
@@ -600,7 +656,8 @@ async def add_contact_request(cb: CallbackQuery):
             )
             kb.adjust(2)
             
-            await cb.bot.send_message(
+            await deliver(
+                cb.bot,
                 to_telegram_id,
                 f"📬 <b>Новий запит в контакти!</b>\n\n"
                 f"<b>{from_name}</b> хоче додати вас у контакти.\n\n"
@@ -640,7 +697,8 @@ async def accept_contact_request(cb: CallbackQuery):
     
     if contact_telegram_id:
         try:
-            await cb.bot.send_message(
+            await deliver(
+                cb.bot,
                 contact_telegram_id,
                 f"✅ <b>{my_name}</b> прийняв ваш запит в контакти!\n\n"
                 f"Тепер ви можете писати один одному в особисті повідомлення."
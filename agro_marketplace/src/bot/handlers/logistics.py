@@ -10,7 +10,8 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime
+import os
+from datetime import date, datetime
 from typing import Optional
 
 import aiosqlite
@@ -20,10 +21,33 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, ReplyKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.services.delivery import deliver
+from src.bot.services.logistics_matching import matching_index
+from src.bot.services.availability import (
+    availability_index, BookingError, parse_date_range, shipment_window,
+)
+from src.bot.services.consolidation import ConsolidationJob
+from src.bot.handlers.admin_tools import is_admin
+
 
 router = Router()
 DB_FILE = "agro_bot.db"
 
+# Фонова консолідація дрібних заявок у спільні завантаження
+consolidation_job = ConsolidationJob(DB_FILE)
+
+
+@router.startup()
+async def _start_consolidation():
+    # У шардованому режимі фонові задачі запускає лише один воркер
+    if os.getenv("BOT_BACKGROUND_JOBS", "1") != "0":
+        await consolidation_job.start()
+
+
+@router.shutdown()
+async def _stop_consolidation():
+    await consolidation_job.stop()
+
 # --- Довідник областей (шаблон) ---
 OBLASTS = [
     "Вінницька", "Волинська", "Дніпропетровська", "Донецька", "Житомирська",
@@ -59,6 +83,7 @@ class CreateShipment(StatesGroup):
     from_city = State()    # населений пункт
     to_region = State()    # область (з шаблону)
     to_city = State()      # населений пункт
+    dates = State()        # вікно завантаження (необовʼязково)
     comment = State()
 
 
@@ -270,7 +295,8 @@ async def start_chat_from_shipment(cb: CallbackQuery):
     # Сповіщаємо автора заявки
     owner_tg = await _get_tg_by_user_id(owner_user_id)
     if owner_tg:
-        await cb.bot.send_message(
+        await deliver(
+            cb.bot,
             owner_tg,
             f"💬 Хтось хоче звʼязатися по вашій заявці <code>{shipment_id}</code>.\nНатисніть, щоб відкрити чат:",
             reply_markup=kb_open_chat(session_id),
@@ -284,6 +310,34 @@ def kb_shipment_chat(shipment_id: int) -> InlineKeyboardMarkup:
     return kb.as_markup()
 
 
+def kb_match_shipment(shipment_id: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔎 Підібрати транспорт", callback_data=f"log:match:ship:{shipment_id}")
+    kb.button(text="📅 Вільні авто в області", callback_data=f"log:free:{shipment_id}")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def kb_booked(shipment_id: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✅ Перевезення виконано", callback_data=f"log:done:{shipment_id}")
+    kb.button(text="❌ Скасувати бронь", callback_data=f"log:release:{shipment_id}")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def kb_book(shipment_id: int, vehicle_id: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="📌 Забронювати", callback_data=f"log:book:{shipment_id}:{vehicle_id}")
+    return kb.as_markup()
+
+
+def kb_match_vehicle(vehicle_id: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔎 Підібрати заявки", callback_data=f"log:match:veh:{vehicle_id}")
+    return kb.as_markup()
+
+
 
 async def _get_user_id(telegram_id: int) -> Optional[int]:
     async with aiosqlite.connect(DB_FILE) as db:
@@ -307,7 +361,8 @@ def _shipment_text(row: aiosqlite.Row) -> str:
         f"📦 <b>Заявка</b> • 🆔 <code>{row['id']}</code>\n"
         f"🚚 Вантаж: <b>{row['cargo_type']}</b> • {row['volume_tons']} т\n"
         f"📍 {row['from_region']} → {row['to_region']}\n"
-        f"📝 {row['comment'] or '—'}\n"
+        + (f"📅 {row['date_from']} — {row['date_to'] or row['date_from']}\n" if row["date_from"] else "")
+        + f"📝 {row['comment'] or '—'}\n"
     )
 
 
@@ -427,8 +482,9 @@ async def vehicle_finish(message: Message, state: FSMContext):
         return
 
     now = datetime.now().isoformat(timespec="seconds")
+    work_regions = json.dumps([data.get("base_region")], ensure_ascii=False)
     async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
+        cur = await db.execute(
             """
             INSERT INTO vehicles (
                 owner_user_id, body_type, capacity_tons, count_units, base_region,
@@ -442,16 +498,35 @@ async def vehicle_finish(message: Message, state: FSMContext):
                 float(data.get("capacity_tons")),
                 int(data.get("count_units")),
                 data.get("base_region"),
-                json.dumps([data.get("base_region")], ensure_ascii=False),
+                work_regions,
                 comment,
                 now,
                 now,
             ),
         )
         await db.commit()
+        vehicle_id = cur.lastrowid
+
+    # Інкрементально додаємо авто в індекси підбору та доступності
+    vehicle_row = {
+        "id": vehicle_id,
+        "owner_user_id": user_id,
+        "body_type": data.get("body_type"),
+        "capacity_tons": data.get("capacity_tons"),
+        "count_units": data.get("count_units"),
+        "base_region": data.get("base_region"),
+        "work_regions": work_regions,
+        "available_from": None,
+        "status": "available",
+    }
+    await matching_index.ensure_loaded(DB_FILE)
+    matching_index.upsert_vehicle(vehicle_row)
+    await availability_index.ensure_loaded(DB_FILE)
+    availability_index.upsert_vehicle(vehicle_row)
 
     await state.clear()
     await message.answer("✅ Авто додано", reply_markup=kb_logistics_menu())
+    await message.answer("Знайти заявки для цього авто:", reply_markup=kb_match_vehicle(vehicle_id))
 
 
 @router.message(F.text == "📦 Створити заявку")
@@ -547,6 +622,22 @@ async def shipment_to_city(message: Message, state: FSMContext):
         return
 
     await state.update_data(to_location=city)
+    await state.set_state(CreateShipment.dates)
+    await message.answer("Дати завантаження, напр. <code>15.06-18.06</code> (або '-' щоб пропустити):")
+
+
+@router.message(CreateShipment.dates)
+async def shipment_dates(message: Message, state: FSMContext):
+    raw = (message.text or "").strip()
+    if raw in ("-", "—"):
+        await state.update_data(date_from=None, date_to=None)
+    else:
+        parsed = parse_date_range(raw)
+        if not parsed:
+            await message.answer("Некоректно. Приклад: 15.06-18.06 або 15.06")
+            return
+        await state.update_data(date_from=parsed[0], date_to=parsed[1])
+
     await state.set_state(CreateShipment.comment)
     await message.answer("Коментар (або '-' щоб пропустити):")
 
@@ -565,13 +656,13 @@ async def shipment_finish(message: Message, state: FSMContext):
 
     now = datetime.now().isoformat(timespec="seconds")
     async with aiosqlite.connect(DB_FILE) as db:
-        await db.execute(
+        cur = await db.execute(
             """
             INSERT INTO shipments (
                 creator_user_id, cargo_type, volume_tons, from_region, from_location, to_region, to_location,
-                comment, status, created_at, updated_at
+                date_from, date_to, comment, status, created_at, updated_at
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'active', ?, ?)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'active', ?, ?)
             """,
             (
                 user_id,
@@ -581,15 +672,37 @@ async def shipment_finish(message: Message, state: FSMContext):
                 data.get("from_location"),
                 data.get("to_region"),
                 data.get("to_location"),
+                data.get("date_from"),
+                data.get("date_to"),
                 comment,
                 now,
                 now,
             ),
         )
         await db.commit()
+        shipment_id = cur.lastrowid
+
+    # Інкрементально додаємо заявку в індекси підбору та доступності
+    shipment_row = {
+        "id": shipment_id,
+        "creator_user_id": user_id,
+        "volume_tons": data.get("volume_tons"),
+        "from_region": data.get("from_region"),
+        "to_region": data.get("to_region"),
+        "required_body_types": None,
+        "date_from": data.get("date_from"),
+        "date_to": data.get("date_to"),
+        "created_at": now,
+        "status": "active",
+    }
+    await matching_index.ensure_loaded(DB_FILE)
+    matching_index.upsert_shipment(shipment_row)
+    await availability_index.ensure_loaded(DB_FILE)
+    availability_index.upsert_shipment(shipment_row)
 
     await state.clear()
     await message.answer("✅ Заявку створено", reply_markup=kb_logistics_menu())
+    await message.answer("Підібрати транспорт під заявку:", reply_markup=kb_match_shipment(shipment_id))
 
 
 @router.message(F.text == "🚛 Транспорт")
@@ -608,7 +721,7 @@ async def list_vehicles(message: Message):
 
     await message.answer("🚛 <b>Доступний транспорт</b> (20):", reply_markup=kb_logistics_menu())
     for r in rows[:10]:
-        await message.answer(_vehicle_text(r), reply_markup=kb_logistics_menu())
+        await message.answer(_vehicle_text(r), reply_markup=kb_match_vehicle(int(r["id"])))
 
 
 @router.message(F.text == "📨 Заявки")
@@ -628,5 +741,280 @@ async def list_shipments(message: Message):
     await message.answer("📨 <b>Активні заявки</b> (20):", reply_markup=kb_logistics_menu())
     me_uid = await _get_user_id(message.from_user.id)
     for r in rows[:10]:
-        mk = kb_shipment_chat(int(r["id"])) if (me_uid and int(r["creator_user_id"]) != int(me_uid)) else None
+        if me_uid and int(r["creator_user_id"]) != int(me_uid):
+            mk = kb_shipment_chat(int(r["id"]))
+        else:
+            mk = kb_match_shipment(int(r["id"]))
         await message.answer(_shipment_text(r), reply_markup=mk)
+
+
+@router.callback_query(F.data.startswith("log:match:ship:"))
+async def match_vehicles_for_shipment(cb: CallbackQuery):
+    await _ensure_tables()
+    shipment_id = int(cb.data.split(":")[-1])
+    await matching_index.ensure_loaded(DB_FILE)
+
+    if not matching_index.get_shipment(shipment_id):
+        await cb.answer("Заявка неактивна або не знайдена", show_alert=True)
+        return
+
+    await availability_index.ensure_loaded(DB_FILE)
+    ship = matching_index.get_shipment(shipment_id)
+    async with aiosqlite.connect(DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        cur = await db.execute("SELECT date_from, date_to, created_at FROM shipments WHERE id=?", (shipment_id,))
+        ship_row = await cur.fetchone()
+    if not ship_row:
+        await cb.answer("Заявку не знайдено", show_alert=True)
+        return
+    start, end = shipment_window(ship_row["date_from"], ship_row["date_to"], ship_row["created_at"])
+
+    # Лише авто, що мають вільну місткість у вікні заявки
+    matches = [
+        m for m in matching_index.vehicles_for_shipment(shipment_id, limit=30)
+        if availability_index.free_tons(m.vehicle_id, start, end) >= ship.volume_tons
+    ][:10]
+    if not matches:
+        await cb.answer("Поки немає підходящого транспорту поблизу", show_alert=True)
+        return
+    me_uid = await _get_user_id(cb.from_user.id)
+    can_book = me_uid is not None and int(me_uid) == ship.creator_user_id
+
+    await cb.message.answer(f"🔎 <b>Транспорт для заявки</b> <code>{shipment_id}</code> ({len(matches)}):")
+    async with aiosqlite.connect(DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        ids = [m.vehicle_id for m in matches]
+        cur = await db.execute(
+            f"SELECT * FROM vehicles WHERE id IN ({','.join('?' * len(ids))})", ids
+        )
+        rows = {int(r["id"]): r for r in await cur.fetchall()}
+
+    for m in matches:
+        row = rows.get(m.vehicle_id)
+        if row:
+            await cb.message.answer(
+                _vehicle_text(row)
+                + f"🛣 Подача: ~{m.empty_run_km:.0f} км • Завантаження: {m.utilization:.0%}",
+                reply_markup=kb_book(shipment_id, m.vehicle_id) if can_book else None,
+            )
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("log:match:veh:"))
+async def match_shipments_for_vehicle(cb: CallbackQuery):
+    await _ensure_tables()
+    vehicle_id = int(cb.data.split(":")[-1])
+    await matching_index.ensure_loaded(DB_FILE)
+
+    if not matching_index.get_vehicle(vehicle_id):
+        await cb.answer("Авто недоступне або не знайдене", show_alert=True)
+        return
+
+    # Лише заявки, у вікно яких авто ще має вільну місткість
+    await availability_index.ensure_loaded(DB_FILE)
+    matches = []
+    for m in matching_index.shipments_for_vehicle(vehicle_id, limit=30):
+        window = availability_index.window(m.shipment_id)
+        if window is None or availability_index.free_tons(vehicle_id, window.start, window.end) >= window.volume:
+            matches.append(m)
+    matches = matches[:10]
+    if not matches:
+        await cb.answer("Поки немає підходящих заявок поблизу", show_alert=True)
+        return
+
+    await cb.message.answer(f"🔎 <b>Заявки для авто</b> <code>{vehicle_id}</code> ({len(matches)}):")
+    async with aiosqlite.connect(DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        ids = [m.shipment_id for m in matches]
+        cur = await db.execute(
+            f"SELECT * FROM shipments WHERE id IN ({','.join('?' * len(ids))})", ids
+        )
+        rows = {int(r["id"]): r for r in await cur.fetchall()}
+
+    for m in matches:
+        row = rows.get(m.shipment_id)
+        if row:
+            await cb.message.answer(
+                _shipment_text(row)
+                + f"🛣 Подача: ~{m.empty_run_km:.0f} км • Завантаження: {m.utilization:.0%}",
+                reply_markup=kb_shipment_chat(m.shipment_id),
+            )
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("log:book:"))
+async def book_vehicle(cb: CallbackQuery):
+    await _ensure_tables()
+    _, _, shipment_id, vehicle_id = cb.data.split(":")
+    shipment_id, vehicle_id = int(shipment_id), int(vehicle_id)
+
+    me_uid = await _get_user_id(cb.from_user.id)
+    async with aiosqlite.connect(DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        cur = await db.execute("SELECT creator_user_id FROM shipments WHERE id=?", (shipment_id,))
+        ship = await cur.fetchone()
+        cur = await db.execute("SELECT owner_user_id FROM vehicles WHERE id=?", (vehicle_id,))
+        veh = await cur.fetchone()
+    if not ship or not me_uid or int(ship["creator_user_id"]) != int(me_uid):
+        await cb.answer("Бронювати може лише автор заявки", show_alert=True)
+        return
+
+    await availability_index.ensure_loaded(DB_FILE)
+    try:
+        booking = await availability_index.book(DB_FILE, shipment_id, vehicle_id)
+    except BookingError as e:
+        await cb.answer(f"❌ {e}", show_alert=True)
+        return
+
+    # Заявка більше не активна — прибираємо її з підбору
+    matching_index.remove_shipment(shipment_id)
+
+    await cb.message.answer(
+        f"📌 Авто <code>{vehicle_id}</code> заброньовано під заявку <code>{shipment_id}</code> "
+        f"({booking['tons']:g} т).",
+        reply_markup=kb_booked(shipment_id),
+    )
+    owner_tg = await _get_tg_by_user_id(int(veh["owner_user_id"])) if veh else None
+    if owner_tg:
+        session_id = await _get_or_create_chat_session(me_uid, int(veh["owner_user_id"]), shipment_id)
+        await deliver(
+            cb.bot,
+            owner_tg,
+            f"📌 Ваше авто <code>{vehicle_id}</code> заброньовано під заявку <code>{shipment_id}</code> "
+            f"({booking['tons']:g} т).\nНатисніть, щоб відкрити чат із замовником:",
+            reply_markup=kb_open_chat(session_id),
+        )
+    await cb.answer("Заброньовано ✅")
+
+
+@router.callback_query(F.data.startswith("log:free:"))
+async def free_vehicles_for_shipment(cb: CallbackQuery):
+    """Авто з базою в області завантаження, вільні на всі дні вікна заявки"""
+    await _ensure_tables()
+    shipment_id = int(cb.data.split(":")[-1])
+    await availability_index.ensure_loaded(DB_FILE)
+    window = availability_index.window(shipment_id)
+    if not window:
+        await cb.answer("Заявка неактивна або не знайдена", show_alert=True)
+        return
+
+    free = availability_index.vehicles_free(window.region, window.start, window.end, window.volume, limit=10)
+    if not free:
+        await cb.answer("На ці дати вільного транспорту в області немає", show_alert=True)
+        return
+
+    async with aiosqlite.connect(DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        ids = [vehicle_id for vehicle_id, _ in free]
+        cur = await db.execute(
+            f"SELECT * FROM vehicles WHERE id IN ({','.join('?' * len(ids))})", ids
+        )
+        rows = {int(r["id"]): r for r in await cur.fetchall()}
+        cur = await db.execute("SELECT creator_user_id FROM shipments WHERE id=?", (shipment_id,))
+        ship = await cur.fetchone()
+    me_uid = await _get_user_id(cb.from_user.id)
+    can_book = ship is not None and me_uid is not None and int(ship["creator_user_id"]) == int(me_uid)
+
+    await cb.message.answer(
+        f"📅 <b>Вільні авто</b> ({window.region}, "
+        f"{date.fromordinal(window.start):%d.%m}–{date.fromordinal(window.end):%d.%m}): {len(free)}"
+    )
+    for vehicle_id, tons in free:
+        row = rows.get(vehicle_id)
+        if row:
+            await cb.message.answer(
+                _vehicle_text(row) + f"📦 Вільно у вікні: {tons:g} т",
+                reply_markup=kb_book(shipment_id, vehicle_id) if can_book else None,
+            )
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("log:release:") | F.data.startswith("log:done:"))
+async def finish_booking(cb: CallbackQuery):
+    """Скасування броні (заявка знову активна) або завершення перевезення"""
+    await _ensure_tables()
+    _, action, shipment_id = cb.data.split(":")
+    shipment_id = int(shipment_id)
+    completed = action == "done"
+
+    me_uid = await _get_user_id(cb.from_user.id)
+    creator = await _get_shipment_creator(shipment_id)
+    if not me_uid or creator != int(me_uid):
+        await cb.answer("Це може зробити лише автор заявки", show_alert=True)
+        return
+
+    await availability_index.ensure_loaded(DB_FILE)
+    result = await availability_index.release(DB_FILE, shipment_id, completed=completed)
+    if not result["vehicles"]:
+        await cb.answer("Активної броні для заявки немає", show_alert=True)
+        return
+
+    if result["shipment"]:
+        await matching_index.ensure_loaded(DB_FILE)
+        matching_index.upsert_shipment(result["shipment"])
+
+    if completed:
+        text = f"✅ Перевезення за заявкою <code>{shipment_id}</code> завершено, авто звільнено."
+    else:
+        text = f"❌ Бронь за заявкою <code>{shipment_id}</code> скасовано, заявка знову активна."
+    await cb.message.edit_reply_markup(reply_markup=None)
+    await cb.message.answer(text)
+
+    async with aiosqlite.connect(DB_FILE) as db:
+        ids = result["vehicles"]
+        cur = await db.execute(
+            f"SELECT DISTINCT owner_user_id FROM vehicles WHERE id IN ({','.join('?' * len(ids))})", ids
+        )
+        owners = [int(r[0]) for r in await cur.fetchall()]
+    for owner_id in owners:
+        owner_tg = await _get_tg_by_user_id(owner_id)
+        if owner_tg:
+            await deliver(cb.bot, owner_tg, text)
+    await cb.answer()
+
+
+# ========== КОНСОЛІДАЦІЯ (адмін) ==========
+
+@router.callback_query(F.data.in_({"admin:loads", "admin:loads:run"}))
+async def admin_load_proposals(cb: CallbackQuery):
+    if not is_admin(cb.from_user.id):
+        await cb.answer("Немає доступу", show_alert=True)
+        return
+
+    if cb.data == "admin:loads:run":
+        stats = await consolidation_job.run_now()
+        await cb.message.answer(
+            f"🔄 Перераховано: {stats['shipments']} заявок → {stats['proposals']} завантажень "
+            f"за {stats['seconds']:.2f} с"
+        )
+
+    rows = []
+    async with aiosqlite.connect(DB_FILE) as db:
+        db.row_factory = aiosqlite.Row
+        try:
+            cur = await db.execute(
+                "SELECT * FROM load_proposals WHERE status='proposed' ORDER BY utilization DESC, load_tons DESC LIMIT 10"
+            )
+            rows = await cur.fetchall()
+        except aiosqlite.OperationalError:
+            # Таблиця зʼявиться після першого проходу
+            pass
+
+    kb = InlineKeyboardBuilder()
+    kb.button(text="🔄 Перерахувати", callback_data="admin:loads:run")
+
+    if not rows:
+        await cb.message.answer("🚛 Пропозицій консолідації поки немає.", reply_markup=kb.as_markup())
+        await cb.answer()
+        return
+
+    lines = ["🚛 <b>Пропозиції консолідації</b> (топ-10):\n"]
+    for r in rows:
+        ids = ", ".join(str(i) for i in json.loads(r["shipment_ids"]))
+        lines.append(
+            f"• Авто <code>{r['vehicle_id']}</code>: {r['from_region']} → {r['to_region']} • "
+            f"{r['date_from']}…{r['date_to']}\n"
+            f"  {r['load_tons']:g}/{r['capacity_tons']:g} т (<b>{r['utilization']:.0%}</b>) • заявки: {ids}"
+        )
+    await cb.message.answer("\n".join(lines), reply_markup=kb.as_markup())
+    await cb.answer()
@@ -22,6 +22,8 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.services.freight import REGION_INDEX, landed_costs
+
 logger = logging.getLogger(__name__)
 router = Router()
 
@@ -77,6 +79,13 @@ async def get_user_id(telegram_id: int) -> Optional[int]:
         return row[0] if row else None
 
 
+async def get_user_region(telegram_id: int) -> Optional[str]:
+    async with aiosqlite.connect(DB_FILE) as db:
+        cur = await db.execute("SELECT region FROM users WHERE telegram_id=?", (telegram_id,))
+        row = await cur.fetchone()
+        return row[0] if row else None
+
+
 def _get_lot_volume(lot) -> float:
     try:
         if hasattr(lot, "keys") and "volume_tons" in lot.keys():
@@ -223,6 +232,32 @@ def format_lot_text(lot: dict) -> str:
     return text
 
 
+def delivery_lines(lots: list, to_region: Optional[str], user_id: Optional[int]) -> dict[int, str]:
+    """Ціна з доставкою до області користувача для чужих лотів на продаж (один розрахунок на сторінку)"""
+    if to_region not in REGION_INDEX:
+        return {}
+    rows = []
+    for lot in lots:
+        if lot["type"] != "sell" or lot["owner_user_id"] == user_id or lot["region"] not in REGION_INDEX:
+            continue
+        try:
+            price = float(lot["price"] or 0)
+        except (TypeError, ValueError):
+            continue
+        volume = _get_lot_volume(lot)
+        if price > 0 and volume > 0:
+            rows.append((lot["id"], price, lot["region"], volume))
+    if not rows:
+        return {}
+
+    ids, prices, regions, volumes = zip(*rows)
+    landed = landed_costs(prices, regions, to_region, volumes)
+    return {
+        lot_id: f"🚚 З доставкою до {to_region} обл.: ~<b>{cost:.0f} грн/т</b>"
+        for lot_id, cost in zip(ids, landed.tolist())
+    }
+
+
 # ---------- Handlers ----------
 
 @router.message(F.text == "🌾 Маркет")
@@ -441,10 +476,14 @@ async def exchange_offers(message: Message):
         return
 
     user_id = await get_user_id(message.from_user.id)
+    delivery = delivery_lines(lots, await get_user_region(message.from_user.id), user_id)
     await message.answer(f"💰 Пропозиції: {len(lots)}")
     for lot in lots:
         is_owner = (lot["owner_user_id"] == user_id)
-        await message.answer(format_lot_text(dict(lot)), reply_markup=kb_lot_actions(lot["id"], is_owner))
+        text = format_lot_text(dict(lot))
+        if lot["id"] in delivery:
+            text += f"\n{delivery[lot['id']]}"
+        await message.answer(text, reply_markup=kb_lot_actions(lot["id"], is_owner))
 
 
 @router.callback_query(F.data.startswith("lot:delete:"))
@@ -9,6 +9,8 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from src.bot.services.delivery import deliver
+
 router = Router()
 DB_FILE = "agro_bot.db"
 
@@ -281,7 +283,8 @@ async def accept_offer(cb: CallbackQuery):
 
     # повідомлення тому, хто зробив пропозицію
     try:
-        await cb.bot.send_message(
+        await deliver(
+            cb.bot,
             offer["sender_telegram_id"],
             "✅ <b>Вашу пропозицію прийнято!</b>\n\n"
             f"🌾 {offer['crop']}\n"
@@ -328,7 +331,8 @@ async def reject_offer(cb: CallbackQuery):
     await cb.answer("❌ Пропозицію відхилено", show_alert=True)
 
     try:
-        await cb.bot.send_message(
+        await deliver(
+            cb.bot,
             offer["sender_telegram_id"],
             "❌ <b>Вашу пропозицію відхилено</b>\n\n"
             f"🌾 {offer['crop']}\n"
@@ -435,7 +439,8 @@ async def make_offer_message(message: Message, state: FSMContext):
 
     # notify owner
     try:
-        await message.bot.send_message(
+        await deliver(
+            message.bot,
             lot["owner_telegram_id"],
             "📨 <b>Нова пропозиція!</b>\n\n"
             f"🌾 {lot['crop']}\n"
@@ -5,6 +5,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import os
 from src.database.migrate import migrate
 import json
@@ -26,12 +27,18 @@ from aiogram.types import (
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
+from src.bot.services.delivery import get_delivery_scheduler, Lane
+
 # Логування
 logger = logging.getLogger(__name__)
 
 router = Router()
 
 DB_FILE = os.getenv('DB_FILE', './agro_bot.db')
+# Як часто оновлювати повідомлення з прогресом розсилки (секунди)
+BROADCAST_PROGRESS_INTERVAL = 10
+# Фонові задачі розсилок (тримаємо посилання, щоб їх не зібрав GC)
+_broadcast_tasks: set = set()
 
 # Run migrations once at import (safe & idempotent)
 migrate(os.path.abspath(DB_FILE))
@@ -211,8 +218,9 @@ def kb_admin_panel():
     kb.button(text="👥 Користувачі", callback_data="admin:users:0")
     kb.button(text="📢 Розсилка", callback_data="admin:broadcast")
     kb.button(text="⛔ Бан/Розбан", callback_data="admin:ban")
+    kb.button(text="🚛 Консолідація", callback_data="admin:loads")
     kb.button(text="❌ Закрити", callback_data="admin:close")
-    kb.adjust(2, 2, 1)
+    kb.adjust(2, 2, 1, 1)
     return kb.as_markup()
 
 
@@ -895,24 +903,61 @@ async def admin_broadcast_confirm(cb: CallbackQuery, state: FSMContext):
         cur = await db.execute("SELECT telegram_id FROM users WHERE is_banned=0")
         users = await cur.fetchall()
 
-    sent = 0
-    failed = 0
+    # Розсилка йде окремою (нижчою) чергою планувальника — чати й сповіщення не чекають на неї.
+    # Хендлер лише ставить повідомлення в чергу; прогрес оновлюється окремим повідомленням
+    scheduler = get_delivery_scheduler(cb.bot)
+    futures = [
+        await scheduler.submit(user[0], f"📢 <b>Повідомлення від адміністрації:</b>\n\n{text}", lane=Lane.BULK)
+        for user in users
+    ]
+    progress = await cb.message.answer(_broadcast_progress_text(0, 0, len(futures)))
+
+    task = asyncio.create_task(_track_broadcast(progress, futures))
+    _broadcast_tasks.add(task)
+    task.add_done_callback(_broadcast_tasks.discard)
 
-    for user in users:
-        try:
-            await cb.bot.send_message(user[0], f"📢 <b>Повідомлення від адміністрації:</b>\n\n{text}")
-            sent += 1
-        except Exception:
-            failed += 1
 
-    await cb.message.answer(
-        f"✅ <b>Розсилка завершена</b>\n\n"
+def _broadcast_progress_text(sent: int, failed: int, total: int) -> str:
+    return (
+        f"📢 <b>Розсилка</b>\n\n"
+        f"Оброблено: {sent + failed} з {total}\n"
         f"Надіслано: {sent}\n"
-        f"Помилок: {failed}",
-        reply_markup=kb_admin_menu()
+        f"Помилок: {failed}"
     )
 
 
+def _broadcast_failed(future: asyncio.Future) -> bool:
+    return future.done() and (future.cancelled() or future.exception() is not None)
+
+
+async def _track_broadcast(progress: Message, futures: list) -> None:
+    """Оновлює повідомлення з прогресом, поки черга розсилки не спорожніє"""
+    total = len(futures)
+    shown = None
+    pending = set(futures)
+    while pending:
+        _, pending = await asyncio.wait(pending, timeout=BROADCAST_PROGRESS_INTERVAL)
+        failed = sum(1 for f in futures if _broadcast_failed(f))
+        done = total - len(pending)
+        if pending and (done, failed) != shown:
+            shown = (done, failed)
+            try:
+                await progress.edit_text(_broadcast_progress_text(done - failed, failed, total))
+            except Exception:
+                pass
+
+    failed = sum(1 for f in futures if _broadcast_failed(f))
+    try:
+        await progress.answer(
+            f"✅ <b>Розсилка завершена</b>\n\n"
+            f"Надіслано: {total - failed}\n"
+            f"Помилок: {failed}",
+            reply_markup=kb_admin_menu()
+        )
+    except Exception as e:
+        logger.error(f"Не вдалося надіслати підсумок розсилки: {e}")
+
+
 @router.callback_query(F.data == "admin:broadcast:cancel")
 async def admin_broadcast_cancel(cb: CallbackQuery, state: FSMContext):
     await state.clear()
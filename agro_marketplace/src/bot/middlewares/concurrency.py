@@ -0,0 +1,148 @@
+"""
+Middleware для обмеження паралельної обробки оновлень (aiogram 3.x)
+
+Реєструється як outer middleware на рівні Update:
+- оновлення одного користувача обробляються строго по черзі (keyed lock),
+  тож подвійне натискання `lot:delete` / `offer:accept` не біжить паралельно;
+- різні користувачі обробляються паралельно, але не більше UPDATE_CONCURRENCY
+  одночасно (глобальний семафор);
+- якщо в черзі вже UPDATE_QUEUE_LIMIT оновлень (або у користувача
+  UPDATE_USER_QUEUE_LIMIT), нове оновлення відкидається, а натискання кнопки
+  отримує коротку відповідь, щоб не крутився індикатор.
+
+Поточні показники — stats(); вони йдуть у знімок метрик (middlewares/metrics.py)
+і на /metrics як agro_bot_updates_in_flight / _queued / _shed_total.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+UPDATE_QUEUE_LIMIT = int(os.getenv("UPDATE_QUEUE_LIMIT", "1000"))
+UPDATE_USER_QUEUE_LIMIT = int(os.getenv("UPDATE_USER_QUEUE_LIMIT", "5"))
+
+SHED_TEXT = "⏳ Бот зараз перевантажений, спробуйте ще раз за хвилину"
+
+
+class _UserSlot:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """Серіалізує оновлення користувача й обмежує загальну паралельність."""
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, queue_limit: int = UPDATE_QUEUE_LIMIT,
+                 user_queue_limit: int = UPDATE_USER_QUEUE_LIMIT):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.user_queue_limit = user_queue_limit
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._slots: Dict[int, _UserSlot] = {}
+
+        # Метрики
+        self.in_flight = 0
+        self.queued = 0
+        self.peak_in_flight = 0
+        self.peak_queued = 0
+        self.processed = 0
+        self.shed = 0
+        self.wait_seconds = 0.0
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        key: Optional[int] = user.id if user else (chat.id if chat else None)
+
+        if self.queued >= self.queue_limit:
+            return await self._shed(event, key, "queue full")
+
+        slot = None
+        if key is not None:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._slots[key] = _UserSlot()
+            if slot.pending >= self.user_queue_limit:
+                return await self._shed(event, key, "user queue full")
+            slot.pending += 1
+
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        started = time.monotonic()
+        dequeued = False
+        try:
+            if slot is not None:
+                await slot.lock.acquire()
+            try:
+                async with self._semaphore:
+                    self.queued -= 1
+                    dequeued = True
+                    self.wait_seconds += time.monotonic() - started
+                    self.in_flight += 1
+                    self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                    try:
+                        return await handler(event, data)
+                    finally:
+                        self.in_flight -= 1
+                        self.processed += 1
+            finally:
+                if slot is not None:
+                    slot.lock.release()
+        finally:
+            if not dequeued:
+                self.queued -= 1
+            if slot is not None:
+                slot.pending -= 1
+                if slot.pending == 0 and self._slots.get(key) is slot:
+                    del self._slots[key]
+
+    async def _shed(self, event: Any, key: Optional[int], reason: str) -> None:
+        self.shed += 1
+        logger.warning("Update shed (%s) for %s", reason, key)
+        callback = event.callback_query if isinstance(event, Update) else None
+        if callback is not None:
+            try:
+                await callback.answer(SHED_TEXT)
+            except Exception:
+                pass
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_queued": self.peak_queued,
+            "processed": self.processed,
+            "shed": self.shed,
+            "active_users": len(self._slots),
+            "avg_wait_ms": round(self.wait_seconds / self.processed * 1000, 2) if self.processed else 0.0,
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+        }
+
+
+concurrency_middleware = ConcurrencyMiddleware()
+
+
+def stats() -> Dict[str, Any]:
+    """Показники обмежувача для логів / метрик"""
+    return concurrency_middleware.stats()
@@ -0,0 +1,168 @@
+"""
+Middleware для метрик обробників (aiogram 3.x)
+
+MetricsMiddleware — outer middleware на рівні Update: міряє час обробки
+оновлення (perf_counter_ns) і рахує помилки. Ряд метрик — це
+(router, handler, label):
+- router / handler — модуль і функція хендлера, що спрацював; їх записує
+  HandlerLabelMiddleware (inner middleware на message / callback_query),
+  бо лише там відомий обраний хендлер. Без хендлера — "-" / "unhandled";
+- label — префікс callback_data без id ("offer:accept:17" → "offer:accept"),
+  для повідомлень — стан FSM або команда, інакше тип оновлення.
+
+Гістограми — src/bot/services/metrics.py (фіксована пам'ять на ряд).
+Раз на METRICS_FLUSH_INTERVAL секунд знімок пишеться у METRICS_DIR, звідки
+його читають /metrics (runner.py) і сторінка панелі «Метрики бота».
+При SQL_TRACE=1 у знімок додається статистика SQL (src/database/sql_trace.py).
+Знімок також несе показники обмежувача паралельності (concurrency.stats()):
+оновлення в обробці, в черзі і відкинуті.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from config.settings import METRICS_DIR
+from src.bot.middlewares import concurrency
+from src.bot.services import metrics
+from src.database import sql_trace
+
+logger = logging.getLogger(__name__)
+
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+LABEL_MAX_LENGTH = 48
+
+
+class _HandlerProbe:
+    __slots__ = ("router", "handler")
+
+    def __init__(self):
+        self.router = "-"
+        self.handler = "unhandled"
+
+
+def _callback_label(data: str) -> str:
+    # Перші два сегменти без чисел: кількість рядів обмежена набором кнопок
+    parts = []
+    for part in data.split(":", 2)[:2]:
+        if not part or part.lstrip("-").isdigit():
+            break
+        parts.append(part)
+    return ":".join(parts)[:LABEL_MAX_LENGTH] or "callback"
+
+
+def update_label(update: Update, raw_state: Optional[str]) -> str:
+    """Low-cardinality label: callback prefix, FSM state, command or update type"""
+    callback = update.callback_query
+    if callback is not None:
+        return _callback_label(callback.data or "")
+    if raw_state:
+        return raw_state[:LABEL_MAX_LENGTH]
+    message = update.message
+    if message is not None:
+        text = message.text
+        if text and text.startswith("/"):
+            return text.split(maxsplit=1)[0].split("@", 1)[0][:LABEL_MAX_LENGTH]
+        return "message"
+    return update.event_type
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """Записує тривалість і результат обробки кожного оновлення."""
+
+    def __init__(self, directory: str = METRICS_DIR, flush_interval: float = METRICS_FLUSH_INTERVAL):
+        self.registry = metrics.MetricsRegistry()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        probe = data["metrics_probe"] = _HandlerProbe()
+        error = False
+        started = time.perf_counter_ns()
+        try:
+            return await handler(event, data)
+        except BaseException:
+            error = True
+            raise
+        finally:
+            micros = (time.perf_counter_ns() - started) // 1000
+            try:
+                label = update_label(event, data.get("raw_state")) if isinstance(event, Update) else "-"
+                self.registry.record((probe.router, probe.handler, label), micros, error,
+                                     int(time.monotonic() // 60))
+            except Exception as e:
+                logger.error(f"Error recording metrics: {e}")
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def snapshot(self) -> Dict[str, Any]:
+        snapshot = self.registry.snapshot()
+        snapshot["concurrency"] = concurrency.stats()
+        if sql_trace.SQL_TRACE:
+            snapshot["sql"] = sql_trace.registry.snapshot()
+        return snapshot
+
+    async def flush(self) -> None:
+        await asyncio.to_thread(metrics.write_snapshot, self.directory, self.snapshot())
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {e}")
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        if self.registry.series:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing metrics snapshot: {e}")
+
+
+class HandlerLabelMiddleware(BaseMiddleware):
+    """Позначає в пробі, який хендлер обробив подію."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        probe = data.get("metrics_probe")
+        handler_object = data.get("handler")
+        if probe is not None and handler_object is not None:
+            callback = handler_object.callback
+            probe.router = callback.__module__.rsplit(".", 1)[-1]
+            probe.handler = callback.__qualname__
+        return await handler(event, data)
+
+
+metrics_middleware = MetricsMiddleware()
+handler_label_middleware = HandlerLabelMiddleware()
+
+
+def collect_snapshots() -> List[Dict[str, Any]]:
+    """Live snapshot of this process plus fresh snapshots of the other bot processes"""
+    own_pid = os.getpid()
+    snapshots = [s for s in metrics.read_snapshots(metrics_middleware.directory) if s["pid"] != own_pid]
+    if metrics_middleware.registry.series:
+        snapshots.append(metrics_middleware.snapshot())
+    return snapshots
@@ -0,0 +1,241 @@
+"""
+Middleware для запису вхідного трафіку (aiogram 3.x)
+
+Вмикається лише змінною UPDATE_RECORD_FILE. Кожне оновлення з часом
+надходження дописується у файл JSON Lines ({"t": unix_time, "u": update}),
+стиснений gzip-членами: раз на секунду буфер дописується одним gzip-блоком,
+тож файл лише росте і читається звичайним gzip.open().
+
+Дані анонімізуються до запису:
+- id користувачів і чатів — HMAC-SHA256 з ключем UPDATE_RECORD_KEY
+  (стабільне відображення: сесії користувача зберігаються, той самий ключ
+  дає ті самі id у replay і в анонімізованій копії БД);
+- імена, username, телефони, назви чатів — замінюються;
+- посилання (url кнопок і text_link) — замінюються хешем, reply_markup
+  вкладених повідомлень бота не записується;
+- довільний текст — літери на «x», цифри на «0» (довжина зберігається);
+  лишаються лише точні збіги з кнопками reply-клавіатур бота і сама команда
+  (без аргументів), бо від них залежить маршрутизація. Усе інше, зокрема
+  телефони, @username і числа, маскується.
+
+UPDATE_RECORD_SAMPLE (0..1) — частка користувачів, що записуються.
+У шардованому режимі кожен воркер пише свій файл: "{pid}" у шляху.
+Відтворення — src/loadtest/replay.py.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import re
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+UPDATE_RECORD_FILE = os.getenv("UPDATE_RECORD_FILE", "")
+UPDATE_RECORD_KEY = os.getenv("UPDATE_RECORD_KEY", "")
+UPDATE_RECORD_SAMPLE = float(os.getenv("UPDATE_RECORD_SAMPLE", "1"))
+FLUSH_INTERVAL = 1.0
+
+_ID_PARENTS = {"from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat", "new_chat_member",
+               "old_chat_member", "left_chat_member"}
+_NAME_FIELDS = {"first_name", "last_name", "username", "title", "bio", "email"}
+_TEXT_FIELDS = {"text", "caption"}
+# reply_markup вкладених повідомлень бота (callback_query.message тощо) містить url-кнопки з t.me/<username>
+_DROP_FIELDS = {"phone_number", "vcard", "photo", "document", "voice", "video", "audio", "sticker", "contact",
+                "reply_markup"}
+_URL_FIELDS = {"url"}
+
+_LETTER = re.compile(r"[^\W\d_]")
+_DIGIT = re.compile(r"\d")
+
+
+def _keyboard_texts(markup: Any) -> Set[str]:
+    return {button.text for row in getattr(markup, "keyboard", None) or [] for button in row}
+
+
+def _known_texts() -> Set[str]:
+    """Button texts of the bot's reply keyboards (the values handlers match on)"""
+    texts: Set[str] = set()
+    try:
+        from src.bot.handlers import calculators, chat, logistics, market, registration, start
+        from src.bot.keyboards import main
+        texts.update(name for name, _ in market.CROPS)
+        texts.update(market.REGIONS)
+        texts.update(name for name, _ in market.LOCATIONS)
+        texts.update(start.ROLE_TEXT_TO_CODE)
+        builders = [main.main_menu, registration.main_menu_kb] + [
+            getattr(module, name)
+            for module in (calculators, chat, logistics, market, start)
+            for name in dir(module) if name.startswith("kb_")
+        ]
+    except Exception as e:
+        logger.warning(f"Recorder: keyboard texts unavailable: {e}")
+        return texts
+    for builder in builders:
+        # Меню залежать від прапорця (адмін / зареєстрований) — беремо обидва варіанти
+        for args in ((), (False,), (True,)):
+            try:
+                texts.update(_keyboard_texts(builder(*args)))
+            except Exception:
+                continue
+    return texts
+
+
+class Anonymizer:
+    """Deterministic HMAC-based anonymization of raw update dicts"""
+
+    def __init__(self, key: bytes, keep_texts: Optional[Set[str]] = None):
+        self.key = key
+        self.keep_texts = keep_texts if keep_texts is not None else _known_texts()
+
+    def _digest(self, kind: str, value: Any) -> bytes:
+        return hmac.new(self.key, f"{kind}:{value}".encode(), hashlib.sha256).digest()
+
+    def anon_id(self, value: int) -> int:
+        # 48 біт: вміщується в int64 Telegram, знак (групи < 0) зберігається
+        n = int.from_bytes(self._digest("id", value)[:6], "big") + 1
+        return -n if value < 0 else n
+
+    def name(self, value: str) -> str:
+        return "u" + self._digest("name", value)[:4].hex()
+
+    def url(self, value: str) -> str:
+        return "https://example.invalid/" + self._digest("url", value)[:6].hex()
+
+    def text(self, value: str) -> str:
+        stripped = value.strip()
+        if not stripped:
+            return value
+        if stripped.startswith("/"):
+            return stripped.split()[0]  # аргументи команд можуть бути персональними
+        if stripped in self.keep_texts:
+            return value
+        return _DIGIT.sub("0", _LETTER.sub("x", value))
+
+    def update(self, data: Any, parent: str = "") -> Any:
+        if isinstance(data, list):
+            return [self.update(item, parent) for item in data]
+        if not isinstance(data, dict):
+            return data
+        result: Dict[str, Any] = {}
+        for key, value in data.items():
+            if key in _DROP_FIELDS:
+                continue
+            if key == "id" and parent in _ID_PARENTS and isinstance(value, int):
+                result[key] = self.anon_id(value)
+            elif key == "chat_instance":
+                result[key] = self.name(value)
+            elif key in _URL_FIELDS and isinstance(value, str):
+                # text_link / кнопки: tg://user?id=<id>, https://t.me/<username>
+                result[key] = self.url(value)
+            elif key in _NAME_FIELDS and isinstance(value, str):
+                result[key] = self.name(value)
+            elif key in _TEXT_FIELDS and isinstance(value, str):
+                result[key] = self.text(value)
+            elif key == "location" and isinstance(value, dict):
+                # Точність ~10 км
+                result[key] = {k: round(v, 1) if isinstance(v, float) else v for k, v in value.items()}
+            else:
+                result[key] = self.update(value, key)
+        return result
+
+
+class RecorderMiddleware(BaseMiddleware):
+    """Дописує анонімізовані оновлення у стиснений append-only файл."""
+
+    def __init__(self, path: str, key: bytes, sample: float = 1.0, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.anonymizer = Anonymizer(key)
+        self.sample = sample
+        self.flush_interval = flush_interval
+        self._buffer: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                self._record(event, data)
+            except Exception as e:
+                logger.error(f"Error recording update {event.update_id}: {e}")
+        return await handler(event, data)
+
+    def _record(self, update: Update, data: Dict[str, Any]) -> None:
+        arrived = time.time()
+        user = data.get("event_from_user")
+        if self.sample < 1.0 and user is not None:
+            # Вибірка по користувачу — його сесія записується повністю
+            if abs(self.anonymizer.anon_id(user.id)) % 10_000 >= self.sample * 10_000:
+                return
+        raw = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+        line = json.dumps({"t": round(arrived, 4), "u": self.anonymizer.update(raw)},
+                          ensure_ascii=False, separators=(",", ":"))
+        self._buffer.append(line + "\n")
+        self.recorded += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def _write(self, lines: List[str]) -> None:
+        # Один gzip-член на пакет; O_APPEND — запис не перетирає попередні блоки
+        with open(self.path, "ab") as f:
+            f.write(gzip.compress("".join(lines).encode("utf-8"), compresslevel=6))
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        lines, self._buffer = self._buffer, []
+        await asyncio.to_thread(self._write, lines)
+
+    async def _flush_loop(self):
+        while self._buffer:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error writing update recording: {e}")
+
+    async def close(self) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self.flush()
+        logger.info(f"📼 Записано оновлень: {self.recorded} → {self.path}")
+
+
+def create_recorder() -> Optional[RecorderMiddleware]:
+    """Recorder from UPDATE_RECORD_* settings; None when recording is off"""
+    if not UPDATE_RECORD_FILE:
+        return None
+    key = UPDATE_RECORD_KEY.encode()
+    if not key:
+        key = secrets.token_bytes(32)
+        logger.warning("⚠️ UPDATE_RECORD_KEY не задано — id анонімізуються випадковим ключем цього процесу")
+    logger.info(f"📼 Запис оновлень у {UPDATE_RECORD_FILE} (вибірка {UPDATE_RECORD_SAMPLE:.0%})")
+    return RecorderMiddleware(UPDATE_RECORD_FILE, key, UPDATE_RECORD_SAMPLE)
+
+
+def read_recording(path: str):
+    """Yields (arrival_time, update_dict) from a recording file"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record["t"], record["u"]
@@ -0,0 +1,39 @@
+"""
+Middleware для трасування SQL по оновленнях (aiogram 3.x)
+
+Реєструється лише при SQL_TRACE=1, outer middleware на рівні Update після
+MetricsMiddleware. Відкриває область src/database/sql_trace.py на час
+обробки оновлення: усі запити через aiosqlite.connect рахуються їй, а на
+завершенні перевіряється N+1. Область називається за хендлером, який
+записав HandlerLabelMiddleware ("offers_handlers.offers_incoming").
+"""
+
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from src.database import sql_trace
+
+
+class SqlTraceMiddleware(BaseMiddleware):
+    """Групує SQL-запити оновлення в одну область трасування."""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        probe = data.get("metrics_probe")
+        if probe is not None:
+            scope = sql_trace.TraceScope(resolve=lambda: f"{probe.router}.{probe.handler}")
+        else:
+            scope = sql_trace.TraceScope(event.event_type if isinstance(event, Update) else "-")
+        with scope:
+            return await handler(event, data)
+
+
+sql_trace_middleware = SqlTraceMiddleware()
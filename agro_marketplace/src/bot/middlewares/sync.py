@@ -9,6 +9,7 @@ from aiogram.types import TelegramObject, Message, Update
 
 # ВИПРАВЛЕНИЙ ІМПОРТ - відносний шлях
 from ..services.sync_service import FileBasedSync
+from ..services.delivery import Lane, deliver
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +70,10 @@ class SyncEventProcessor:
                         await self._handle_lot_status_changed(data)
                     elif event_type == 'settings_changed':
                         await self._handle_settings_changed(data)
+                    elif event_type == 'users_bulk':
+                        await self._handle_users_bulk(data)
+                    elif event_type == 'lots_bulk':
+                        await self._handle_lots_bulk(data)
                     
                     # Mark as processed
                     FileBasedSync.mark_event_processed(idx)
@@ -86,14 +91,15 @@ class SyncEventProcessor:
             return
         
         try:
-            await self.bot.send_message(
+            await deliver(
+                self.bot,
                 telegram_id,
                 "⛔️ <b>Ваш акаунт заблоковано</b>\n\n"
                 "Ви більше не можете користуватися ботом.\n"
                 "Якщо вважаєте, що це помилка, зв'яжіться з адміністратором.",
                 parse_mode="HTML"
             )
-            logger.info(f"Notified user {telegram_id} about ban")
+            logger.info(f"Queued notification for user {telegram_id} about ban")
         except Exception as e:
             logger.error(f"Failed to notify user {telegram_id} about ban: {e}")
     
@@ -104,13 +110,14 @@ class SyncEventProcessor:
             return
         
         try:
-            await self.bot.send_message(
+            await deliver(
+                self.bot,
                 telegram_id,
                 "✅ <b>Ваш акаунт розблоковано</b>\n\n"
                 "Ви знову можете користуватися всіма функціями бота.",
                 parse_mode="HTML"
             )
-            logger.info(f"Notified user {telegram_id} about unban")
+            logger.info(f"Queued notification for user {telegram_id} about unban")
         except Exception as e:
             logger.error(f"Failed to notify user {telegram_id} about unban: {e}")
     
@@ -133,15 +140,51 @@ class SyncEventProcessor:
         message = status_messages.get(new_status, f'Статус вашого оголошення #{lot_id} змінено на: {new_status}')
         
         try:
-            await self.bot.send_message(
+            await deliver(
+                self.bot,
                 owner_telegram_id,
                 message.format(lot_id),
                 parse_mode="HTML"
             )
-            logger.info(f"Notified user {owner_telegram_id} about lot {lot_id} status change")
+            logger.info(f"Queued notification for user {owner_telegram_id} about lot {lot_id} status change")
         except Exception as e:
             logger.error(f"Failed to notify user {owner_telegram_id} about lot status: {e}")
     
+    async def _handle_users_bulk(self, data: Dict[str, Any]):
+        """Handle bulk ban/unban: one notification per user via the BULK lane"""
+        telegram_ids = data.get('telegram_ids') or []
+        if data.get('action') == 'ban':
+            text = ("⛔️ <b>Ваш акаунт заблоковано</b>\n\n"
+                    "Ви більше не можете користуватися ботом.\n"
+                    "Якщо вважаєте, що це помилка, зв'яжіться з адміністратором.")
+        else:
+            text = ("✅ <b>Ваш акаунт розблоковано</b>\n\n"
+                    "Ви знову можете користуватися всіма функціями бота.")
+
+        for telegram_id in telegram_ids:
+            await deliver(self.bot, telegram_id, text, lane=Lane.BULK, parse_mode="HTML")
+        logger.info(f"Queued bulk {data.get('action')} notifications for {len(telegram_ids)} users")
+
+    async def _handle_lots_bulk(self, data: Dict[str, Any]):
+        """Handle bulk lot status change: one message per owner listing all their lots"""
+        new_status = data.get('new_status')
+        by_owner: Dict[int, list] = {}
+        for lot_id, owner_telegram_id in data.get('lots') or []:
+            by_owner.setdefault(owner_telegram_id, []).append(lot_id)
+
+        titles = {
+            'active': '✅ Ваші оголошення активовано адміністратором',
+            'closed': '⏹ Ваші оголошення закрито адміністратором',
+            'archived': '📦 Ваші оголошення переміщено в архів',
+        }
+        title = titles.get(new_status, f'Статус ваших оголошень змінено на: {new_status}')
+        for owner_telegram_id, lot_ids in by_owner.items():
+            ids = ", ".join(f"#{i}" for i in lot_ids[:50])
+            if len(lot_ids) > 50:
+                ids += f" … (+{len(lot_ids) - 50})"
+            await deliver(self.bot, owner_telegram_id, f"{title}: {ids}", lane=Lane.BULK, parse_mode="HTML")
+        logger.info(f"Queued lot status notifications for {len(by_owner)} owners")
+
     async def _handle_settings_changed(self, data: Dict[str, Any]):
         """Handle settings change event"""
         changed = data.get('changed', {})
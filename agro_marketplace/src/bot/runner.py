@@ -0,0 +1,235 @@
+"""
+Update Runner - polling or webhook ingestion for the same Dispatcher
+
+BOT_MODE=polling keeps the old behaviour (delete_webhook + start_polling).
+BOT_MODE=webhook starts an aiohttp server that checks Telegram's secret
+token header, puts updates into a bounded queue and feeds them to the
+Dispatcher from a fixed pool of workers. When the queue is full the server
+answers 503 and Telegram redelivers later, so a burst can't exhaust memory.
+
+TELEGRAM_API_URL points the bot at a local / fake Bot API server for tests.
+GET /metrics serves handler latency histograms in Prometheus text format on
+METRICS_PORT (start_metrics_server(), 127.0.0.1 by default). The public webhook
+port exposes /metrics only when METRICS_TOKEN is set, and only to requests
+with "Authorization: Bearer <METRICS_TOKEN>".
+"""
+import asyncio
+import hmac
+import logging
+import secrets
+import signal
+from typing import Callable, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+
+from config.settings import (
+    BOT_MODE,
+    METRICS_HOST,
+    METRICS_PORT,
+    METRICS_TOKEN,
+    TELEGRAM_API_URL,
+    WEBHOOK_BASE_URL,
+    WEBHOOK_HOST,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_SECRET,
+    WEBHOOK_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Скільки чекати на дообробку черги при зупинці
+DRAIN_TIMEOUT = 10.0
+
+
+def bot_session() -> Optional[AiohttpSession]:
+    """Session for Bot(); None means the default api.telegram.org session"""
+    if not TELEGRAM_API_URL:
+        return None
+    return AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+
+
+async def metrics_view(request: web.Request) -> web.Response:
+    """Handler metrics of all bot processes, Prometheus text format"""
+    from src.bot.middlewares.metrics import collect_snapshots
+    from src.bot.services.metrics import render_prometheus
+    return web.Response(text=render_prometheus(collect_snapshots()), content_type="text/plain",
+                        headers={"Cache-Control": "no-store"})
+
+
+async def protected_metrics_view(request: web.Request) -> web.Response:
+    """/metrics on the public webhook port: Bearer METRICS_TOKEN only"""
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not (METRICS_TOKEN and hmac.compare_digest(token, METRICS_TOKEN)):
+        return web.Response(status=401, text="Unauthorized\n")
+    return await metrics_view(request)
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT) -> Optional[web.AppRunner]:
+    """Separate /metrics listener; None when METRICS_PORT is not set"""
+    if not port:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📈 Метрики: http://{host}:{port}/metrics")
+    return runner
+
+
+class WebhookServer:
+    """aiohttp webhook endpoint with a bounded update queue"""
+
+    def __init__(self, bot: Bot, dp: Dispatcher, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET,
+                 host: str = WEBHOOK_HOST, port: int = WEBHOOK_PORT,
+                 queue_size: int = WEBHOOK_QUEUE_SIZE, workers: int = WEBHOOK_WORKERS,
+                 on_update: Optional[Callable[[dict], bool]] = None):
+        self.bot = bot
+        self.dp = dp
+        self.path = path
+        if not secret:
+            secret = secrets.token_urlsafe(32)
+            logger.warning("⚠️ WEBHOOK_SECRET не задано — згенеровано тимчасовий (лише для одного процесу)")
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.received = 0
+        self.rejected = 0
+        self._tasks = []
+        self._runner: Optional[web.AppRunner] = None
+        # Зовнішній приймач сирих оновлень (супервізор шардів) замість власної черги;
+        # повертає False, якщо переповнений
+        self.on_update = on_update
+
+    # ---------- HTTP ----------
+
+    async def _handle_update(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            return web.Response(status=401)
+        if self.on_update is not None:
+            try:
+                accepted = self.on_update(await request.json())
+            except ValueError:
+                return web.Response(status=400)
+            if not accepted:
+                self.rejected += 1
+                return web.Response(status=503, headers={"Retry-After": "1"})
+            self.received += 1
+            return web.Response()
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception:
+            return web.Response(status=400)
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram повторить доставку пізніше
+            self.rejected += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        self.received += 1
+        return web.Response()
+
+    async def _health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "mode": "webhook",
+            "queue": self.queue.qsize(),
+            "received": self.received,
+            "rejected": self.rejected,
+        })
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        app.router.add_get("/healthz", self._health)
+        if METRICS_TOKEN:
+            # Порт вебхука публічний — без токена метрики лише на METRICS_PORT
+            app.router.add_get("/metrics", protected_metrics_view)
+        return app
+
+    # ---------- Workers ----------
+
+    async def _worker(self):
+        while True:
+            update = await self.queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Error handling update {update.update_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    # ---------- Lifecycle ----------
+
+    async def start(self):
+        if self.on_update is None:
+            workflow_data = {"dispatcher": self.dp, "bots": [self.bot], **self.dp.workflow_data}
+            await self.dp.emit_startup(bot=self.bot, **workflow_data)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        if WEBHOOK_BASE_URL:
+            await self.bot.set_webhook(
+                url=WEBHOOK_BASE_URL + self.path,
+                secret_token=self.secret,
+                allowed_updates=self.dp.resolve_used_update_types(),
+                max_connections=min(100, max(1, self.workers * 2)),
+            )
+        else:
+            logger.warning("⚠️ WEBHOOK_BASE_URL не задано — webhook у Telegram не реєструється")
+        logger.info(f"🌐 Webhook слухає {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner:
+            # Спершу перестаємо приймати нові оновлення, потім дообробляємо чергу
+            await self._runner.cleanup()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Webhook: не оброблено {self.queue.qsize()} оновлень при зупинці")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.on_update is None:
+            workflow_data = {"dispatcher": self.dp, "bots": [self.bot], **self.dp.workflow_data}
+            await self.dp.emit_shutdown(bot=self.bot, **workflow_data)
+
+    async def serve(self):
+        """Runs until cancelled (Ctrl+C / SIGTERM)"""
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows
+        await self.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await self.stop()
+
+
+async def run_updates(bot: Bot, dp: Dispatcher):
+    """Receives updates in the configured mode until stopped"""
+    if BOT_MODE == "webhook":
+        logger.info("🚀 Запуск у режимі webhook...")
+        await WebhookServer(bot, dp).serve()
+        return
+
+    # Видалення webhook (якщо був)
+    await bot.delete_webhook(drop_pending_updates=True)
+    # Запуск polling
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
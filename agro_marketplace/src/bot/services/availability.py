@@ -0,0 +1,409 @@
+"""
+Availability Scheduler - vehicle capacity over time and shipment date windows
+
+Each vehicle keeps a step-function timeline of booked tons (sorted breakpoints,
+bisect lookups). Vehicles are bucketed by region in capacity order and booked
+intervals are kept per region sorted by start day, so "vehicles free in region
+R between D1 and D2 with >= X tons" bisects to the capacity slice and only
+walks the timelines of vehicles that actually have a booking overlapping the
+window; all others are free up to their full capacity. Bookings are written
+in a BEGIN IMMEDIATE transaction that re-checks capacity against the DB, so no
+double-booking is possible even with several writers. Cancelling or completing
+a shipment releases its bookings.
+"""
+import asyncio
+import logging
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Вікно за замовчуванням, якщо в заявці не вказані дати
+DEFAULT_WINDOW_DAYS = int(os.getenv("SHIPMENT_DEFAULT_WINDOW_DAYS", "3"))
+AVAILABILITY_RELOAD_SECONDS = float(os.getenv("AVAILABILITY_RELOAD_SECONDS", "600"))
+
+
+class BookingError(Exception):
+    """Booking can't be made (no capacity, inactive shipment, etc.)"""
+
+
+def _day(value) -> Optional[int]:
+    """ISO date/datetime string or date -> ordinal day"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value.toordinal()
+    try:
+        return datetime.fromisoformat(str(value).strip()[:19]).date().toordinal()
+    except ValueError:
+        return None
+
+
+def shipment_window(date_from, date_to, created_at=None) -> Tuple[int, int]:
+    """Shipment window as inclusive ordinal days (defaults when dates are missing)"""
+    start = _day(date_from) or _day(created_at) or date.today().toordinal()
+    end = _day(date_to) or start + DEFAULT_WINDOW_DAYS
+    return start, max(start, end)
+
+
+@dataclass
+class VehicleTimeline:
+    """Booked tons as a step function: used[i] applies on [points[i], points[i+1])"""
+    vehicle_id: int
+    region: str
+    capacity: float
+    available_from: int
+    points: List[int] = field(default_factory=lambda: [0])
+    used: List[float] = field(default_factory=lambda: [0.0])
+    # Заброньовані інтервали (start, end) — для індексу бронювань по області
+    bookings: List[Tuple[int, int]] = field(default_factory=list)
+
+    def _split(self, day: int) -> int:
+        i = bisect_right(self.points, day) - 1
+        if self.points[i] != day:
+            self.points.insert(i + 1, day)
+            self.used.insert(i + 1, self.used[i])
+            i += 1
+        return i
+
+    def add(self, start: int, end: int, tons: float) -> None:
+        """Adds (or with negative tons removes) load on inclusive [start, end]"""
+        i = self._split(start)
+        j = self._split(end + 1)
+        for k in range(i, j):
+            self.used[k] += tons
+
+    def peak(self, start: int, end: int) -> float:
+        i = bisect_right(self.points, start) - 1
+        j = bisect_right(self.points, end)
+        return max(self.used[i:j])
+
+    def free(self, start: int, end: int) -> float:
+        if start < self.available_from:
+            return 0.0
+        return max(0.0, self.capacity - self.peak(start, end))
+
+
+@dataclass(frozen=True)
+class ShipmentWindow:
+    shipment_id: int
+    region: str
+    start: int
+    end: int
+    volume: float
+
+
+class AvailabilityIndex:
+    """Interval index over vehicle capacity and shipment windows"""
+
+    def __init__(self):
+        self._vehicles: Dict[int, VehicleTimeline] = {}
+        # region -> [(capacity, vehicle_id)] sorted
+        self._by_region: Dict[str, List[Tuple[float, int]]] = {}
+        # region -> [(start, end, vehicle_id)] sorted: бронювання авто цієї області
+        self._booked: Dict[str, List[Tuple[int, int, int]]] = {}
+        self._max_booking: Dict[str, int] = {}
+        self._shipments: Dict[int, ShipmentWindow] = {}
+        self._loaded_at = 0.0
+        self._load_lock = asyncio.Lock()
+        self._book_lock = asyncio.Lock()
+
+    # ---------- Завантаження ----------
+
+    async def ensure_loaded(self, db_file: str) -> None:
+        if time.monotonic() - self._loaded_at < AVAILABILITY_RELOAD_SECONDS:
+            return
+        async with self._load_lock:
+            if time.monotonic() - self._loaded_at < AVAILABILITY_RELOAD_SECONDS:
+                return
+            await self._load(db_file)
+
+    async def _load(self, db_file: str) -> None:
+        async with aiosqlite.connect(db_file) as db:
+            db.row_factory = aiosqlite.Row
+            await ensure_bookings_table(db)
+            vehicles = await (await db.execute("SELECT * FROM vehicles WHERE status='available'")).fetchall()
+            shipments = await (await db.execute("SELECT * FROM shipments WHERE status='active'")).fetchall()
+            bookings = await (await db.execute(
+                "SELECT vehicle_id, tons, date_from, date_to FROM vehicle_bookings WHERE status='booked'"
+            )).fetchall()
+
+        self.fill(vehicles, shipments, bookings)
+        self._loaded_at = time.monotonic()
+
+    def fill(self, vehicles, shipments, bookings) -> None:
+        """Rebuilds the index from already fetched rows (also used by the consolidation planner)"""
+        self._vehicles.clear()
+        self._by_region.clear()
+        self._booked.clear()
+        self._max_booking.clear()
+        self._shipments.clear()
+        for row in vehicles:
+            self.upsert_vehicle(row)
+        for row in shipments:
+            self.upsert_shipment(row)
+        for b in bookings:
+            self._add_booking(int(b["vehicle_id"]), _day(b["date_from"]), _day(b["date_to"]), float(b["tons"]))
+
+    # ---------- Інкрементальні оновлення ----------
+
+    def upsert_vehicle(self, row) -> None:
+        vehicle_id = int(row["id"])
+        old = self._vehicles.pop(vehicle_id, None)
+        if old:
+            self._by_region[old.region].remove((old.capacity, vehicle_id))
+            self._unindex_bookings(old)
+        if (row["status"] or "available") != "available":
+            return
+        tl = VehicleTimeline(
+            vehicle_id=vehicle_id,
+            region=row["base_region"],
+            capacity=float(row["capacity_tons"] or 0) * int(row["count_units"] or 1),
+            available_from=_day(row["available_from"]) or 0,
+        )
+        if old:
+            tl.points, tl.used, tl.bookings = old.points, old.used, old.bookings
+        self._vehicles[vehicle_id] = tl
+        insort(self._by_region.setdefault(tl.region, []), (tl.capacity, vehicle_id))
+        for start, end in tl.bookings:
+            self._index_booking(tl, start, end)
+
+    def upsert_shipment(self, row) -> None:
+        shipment_id = int(row["id"])
+        self.remove_shipment(shipment_id)
+        if (row["status"] or "active") != "active":
+            return
+        start, end = shipment_window(row["date_from"], row["date_to"], row["created_at"])
+        self._shipments[shipment_id] = ShipmentWindow(
+            shipment_id, row["from_region"], start, end, float(row["volume_tons"] or 0)
+        )
+
+    def remove_shipment(self, shipment_id: int) -> None:
+        self._shipments.pop(shipment_id, None)
+
+    def _index_booking(self, tl: VehicleTimeline, start: int, end: int) -> None:
+        insort(self._booked.setdefault(tl.region, []), (start, end, tl.vehicle_id))
+        self._max_booking[tl.region] = max(self._max_booking.get(tl.region, 0), end - start)
+
+    def _unindex_bookings(self, tl: VehicleTimeline) -> None:
+        booked = self._booked.get(tl.region, [])
+        for start, end in tl.bookings:
+            i = bisect_left(booked, (start, end, tl.vehicle_id))
+            if i < len(booked) and booked[i] == (start, end, tl.vehicle_id):
+                del booked[i]
+
+    def _add_booking(self, vehicle_id: int, start: int, end: int, tons: float) -> None:
+        tl = self._vehicles.get(vehicle_id)
+        if not tl:
+            return
+        tl.add(start, end, tons)
+        tl.bookings.append((start, end))
+        self._index_booking(tl, start, end)
+
+    def _remove_booking(self, vehicle_id: int, start: int, end: int, tons: float) -> None:
+        tl = self._vehicles.get(vehicle_id)
+        if not tl or (start, end) not in tl.bookings:
+            return
+        tl.add(start, end, -tons)
+        tl.bookings.remove((start, end))
+        booked = self._booked.get(tl.region, [])
+        i = bisect_left(booked, (start, end, vehicle_id))
+        if i < len(booked) and booked[i] == (start, end, vehicle_id):
+            del booked[i]
+
+    # ---------- Запити ----------
+
+    def free_tons(self, vehicle_id: int, start: int, end: int) -> float:
+        tl = self._vehicles.get(vehicle_id)
+        return tl.free(start, end) if tl else 0.0
+
+    def window(self, shipment_id: int) -> Optional[ShipmentWindow]:
+        return self._shipments.get(shipment_id)
+
+    def _busy_vehicles(self, region: str, start: int, end: int) -> Set[int]:
+        """Vehicles of region with at least one booking overlapping [start, end]"""
+        booked = self._booked.get(region, [])
+        # Бронювання може перетинатись лише якщо почалось не раніше ніж start - найдовше бронювання
+        lo = bisect_left(booked, (start - self._max_booking.get(region, 0), -1, -1))
+        hi = bisect_right(booked, (end, float("inf"), float("inf")))
+        return {vid for b_start, b_end, vid in booked[lo:hi] if b_end >= start}
+
+    def vehicles_free(self, region: str, start: int, end: int, min_tons: float,
+                      limit: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(vehicle_id, free_tons) for vehicles in region with >= min_tons free on [start, end], smallest first"""
+        bucket = self._by_region.get(region, [])
+        busy = self._busy_vehicles(region, start, end)
+        result = []
+        for capacity, vehicle_id in bucket[bisect_left(bucket, (min_tons, -1)):]:
+            tl = self._vehicles[vehicle_id]
+            if start < tl.available_from:
+                continue
+            # Без бронювань у вікні авто вільне повністю — таймлайн не переглядаємо
+            free = tl.free(start, end) if vehicle_id in busy else capacity
+            if free >= min_tons:
+                result.append((vehicle_id, free))
+                if limit and len(result) >= limit:
+                    break
+        return result
+
+    # ---------- Бронювання ----------
+
+    async def book(self, db_file: str, shipment_id: int, vehicle_id: int) -> Dict[str, float]:
+        """Atomically books vehicle capacity for a shipment; raises BookingError"""
+        async with self._book_lock:
+            async with aiosqlite.connect(db_file, isolation_level=None) as db:
+                db.row_factory = aiosqlite.Row
+                await ensure_bookings_table(db)
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    ship = await (await db.execute(
+                        "SELECT * FROM shipments WHERE id=?", (shipment_id,)
+                    )).fetchone()
+                    veh = await (await db.execute(
+                        "SELECT * FROM vehicles WHERE id=?", (vehicle_id,)
+                    )).fetchone()
+                    if not ship or ship["status"] != "active":
+                        raise BookingError("Заявка вже неактивна")
+                    if not veh or veh["status"] != "available":
+                        raise BookingError("Авто недоступне")
+
+                    start, end = shipment_window(ship["date_from"], ship["date_to"], ship["created_at"])
+                    tons = float(ship["volume_tons"] or 0)
+
+                    # Перевірка по БД (джерело правди), а не лише по пам'яті
+                    tl = VehicleTimeline(
+                        vehicle_id, veh["base_region"],
+                        float(veh["capacity_tons"] or 0) * int(veh["count_units"] or 1),
+                        _day(veh["available_from"]) or 0,
+                    )
+                    overlapping = await (await db.execute(
+                        """SELECT tons, date_from, date_to FROM vehicle_bookings
+                           WHERE vehicle_id=? AND status='booked' AND date_from<=? AND date_to>=?""",
+                        (vehicle_id, date.fromordinal(end).isoformat(), date.fromordinal(start).isoformat()),
+                    )).fetchall()
+                    for b in overlapping:
+                        tl.add(_day(b["date_from"]), _day(b["date_to"]), float(b["tons"]))
+                    free = tl.free(start, end)
+                    if free < tons:
+                        raise BookingError(f"Недостатньо місткості: вільно {free:g} т з {tons:g} т")
+
+                    now = datetime.now().isoformat(timespec="seconds")
+                    await db.execute(
+                        """INSERT INTO vehicle_bookings
+                           (vehicle_id, shipment_id, tons, date_from, date_to, status, created_at)
+                           VALUES (?,?,?,?,?,'booked',?)""",
+                        (vehicle_id, shipment_id, tons,
+                         date.fromordinal(start).isoformat(), date.fromordinal(end).isoformat(), now),
+                    )
+                    await db.execute(
+                        "UPDATE shipments SET status='in_progress', updated_at=? WHERE id=?",
+                        (now, shipment_id),
+                    )
+                    await db.execute("COMMIT")
+                except BaseException:
+                    await db.execute("ROLLBACK")
+                    raise
+
+            self._add_booking(vehicle_id, start, end, tons)
+            self.remove_shipment(shipment_id)
+            return {"tons": tons, "free_after": free - tons, "start": start, "end": end}
+
+    async def release(self, db_file: str, shipment_id: int, completed: bool = False) -> Dict[str, Any]:
+        """
+        Releases all bookings of a shipment.
+
+        Cancelled booking (completed=False) makes the shipment active again;
+        completed=True closes the shipment and frees the vehicles.
+        """
+        booking_status, shipment_status = ("completed", "completed") if completed else ("released", "active")
+        async with self._book_lock:
+            async with aiosqlite.connect(db_file, isolation_level=None) as db:
+                db.row_factory = aiosqlite.Row
+                await ensure_bookings_table(db)
+                await db.execute("BEGIN IMMEDIATE")
+                try:
+                    bookings = await (await db.execute(
+                        "SELECT id, vehicle_id, tons, date_from, date_to FROM vehicle_bookings "
+                        "WHERE shipment_id=? AND status='booked'",
+                        (shipment_id,),
+                    )).fetchall()
+                    now = datetime.now().isoformat(timespec="seconds")
+                    await db.execute(
+                        "UPDATE vehicle_bookings SET status=? WHERE shipment_id=? AND status='booked'",
+                        (booking_status, shipment_id),
+                    )
+                    await db.execute(
+                        "UPDATE shipments SET status=?, updated_at=? WHERE id=? AND status='in_progress'",
+                        (shipment_status, now, shipment_id),
+                    )
+                    ship = await (await db.execute("SELECT * FROM shipments WHERE id=?", (shipment_id,))).fetchone()
+                    await db.execute("COMMIT")
+                except BaseException:
+                    await db.execute("ROLLBACK")
+                    raise
+
+            for b in bookings:
+                self._remove_booking(int(b["vehicle_id"]), _day(b["date_from"]), _day(b["date_to"]), float(b["tons"]))
+            if ship:
+                self.upsert_shipment(ship)
+            return {"vehicles": [int(b["vehicle_id"]) for b in bookings], "shipment": ship}
+
+
+async def ensure_bookings_table(db: aiosqlite.Connection) -> None:
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS vehicle_bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_id INTEGER NOT NULL,
+            shipment_id INTEGER NOT NULL,
+            tons REAL NOT NULL,
+            date_from TEXT NOT NULL,
+            date_to TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'booked',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_vehicle_bookings_vehicle ON vehicle_bookings(vehicle_id, status, date_from)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_vehicle_bookings_shipment ON vehicle_bookings(shipment_id)"
+    )
+
+
+def parse_date_range(text: str) -> Optional[Tuple[str, str]]:
+    """'15.06-18.06', '15.06.2025 - 18.06.2025' or '15.06' -> (ISO from, ISO to)"""
+    parts = [p.strip() for p in (text or "").replace("—", "-").split("-") if p.strip()]
+    if not 1 <= len(parts) <= 2:
+        return None
+    today = date.today()
+    days = []
+    for p in parts:
+        bits = p.split(".")
+        try:
+            if len(bits) == 2:
+                d = date(today.year, int(bits[1]), int(bits[0]))
+                if d < today - timedelta(days=1):
+                    d = d.replace(year=today.year + 1)
+            elif len(bits) == 3:
+                year = int(bits[2])
+                d = date(year + 2000 if year < 100 else year, int(bits[1]), int(bits[0]))
+            else:
+                return None
+        except ValueError:
+            return None
+        days.append(d)
+    if len(days) == 1:
+        days.append(days[0])
+    if days[1] < days[0]:
+        return None
+    return days[0].isoformat(), days[1].isoformat()
+
+
+# Global availability index
+availability_index = AvailabilityIndex()
@@ -0,0 +1,164 @@
+"""
+Batch Deal Calculator - prices a CSV/XLSX table of positions
+
+Rows are read in fixed-size chunks (csv reader / openpyxl read-only mode),
+each chunk is computed as NumPy arrays and appended to the output CSV right
+away, so memory stays bounded by CHUNK_ROWS no matter how big the file is.
+
+Expected columns (header names are case-insensitive, UA/EN):
+    price | ціна, qty | кількість, commission | комісія (%), delivery | доставка (грн)
+Other columns are passed through unchanged.
+"""
+import csv
+import os
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+CHUNK_ROWS = 5000
+
+COLUMN_ALIASES = {
+    "price": {"price", "ціна", "цена", "price_per_unit", "ціна за од."},
+    "qty": {"qty", "quantity", "кількість", "количество", "обсяг", "volume", "тонн", "т"},
+    "commission": {"commission", "commission_pct", "комісія", "комісія %", "комиссия"},
+    "delivery": {"delivery", "доставка", "delivery_cost"},
+}
+RESULT_COLUMNS = ["subtotal", "commission_amount", "total", "status"]
+
+
+class BatchCalcError(Exception):
+    """Input file can't be processed (format / missing columns)"""
+
+
+def _to_float(value) -> float:
+    if value is None:
+        return np.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    s = str(value).strip().replace(" ", "").replace("\xa0", "").replace(",", ".")
+    if not s:
+        return np.nan
+    try:
+        return float(s)
+    except ValueError:
+        return np.nan
+
+
+def _map_columns(header: Sequence) -> Dict[str, int]:
+    normalized = [str(h or "").strip().lower() for h in header]
+    mapping = {}
+    for key, aliases in COLUMN_ALIASES.items():
+        for idx, name in enumerate(normalized):
+            if name in aliases:
+                mapping[key] = idx
+                break
+    missing = {"price", "qty"} - set(mapping)
+    if missing:
+        raise BatchCalcError(
+            "Не знайдено колонки: " + ", ".join(sorted(missing)) + ". Потрібні щонайменше «ціна» і «кількість»."
+        )
+    return mapping
+
+
+def _iter_csv(path: str) -> Iterator[List]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(f, dialect)
+
+
+def _iter_xlsx(path: str) -> Iterator[List]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise BatchCalcError("XLSX не підтримується на цьому сервері — надішліть CSV")
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        wb.close()
+
+
+def _iter_rows(path: str, filename: str) -> Iterator[List]:
+    ext = os.path.splitext(filename or path)[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return _iter_xlsx(path)
+    if ext in (".csv", ".txt", ""):
+        return _iter_csv(path)
+    raise BatchCalcError("Підтримуються лише файли CSV або XLSX")
+
+
+def _chunks(rows: Iterator[List], size: int) -> Iterator[List[List]]:
+    chunk = []
+    for row in rows:
+        if not any(c not in (None, "") for c in row):
+            continue
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _column(chunk: List[List], idx: Optional[int], default: float) -> np.ndarray:
+    if idx is None:
+        return np.full(len(chunk), default, dtype=np.float64)
+    values = np.fromiter(
+        (_to_float(r[idx]) if idx < len(r) else np.nan for r in chunk), dtype=np.float64, count=len(chunk)
+    )
+    return values
+
+
+def process_batch(in_path: str, out_path: str, filename: str = "",
+                  default_commission: float = 0.0, chunk_rows: int = CHUNK_ROWS) -> Dict[str, float]:
+    """Computes all rows of in_path into out_path (CSV); returns summary totals"""
+    rows = _iter_rows(in_path, filename)
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise BatchCalcError("Файл порожній")
+    cols = _map_columns(header)
+
+    summary = {"rows": 0, "valid": 0, "invalid": 0, "qty": 0.0,
+               "subtotal": 0.0, "commission": 0.0, "delivery": 0.0, "total": 0.0}
+
+    with open(out_path, "w", encoding="utf-8-sig", newline="") as out:
+        writer = csv.writer(out, delimiter=";")
+        writer.writerow([str(h or "") for h in header] + RESULT_COLUMNS)
+
+        for chunk in _chunks(rows, chunk_rows):
+            price = _column(chunk, cols.get("price"), np.nan)
+            qty = _column(chunk, cols.get("qty"), np.nan)
+            commission_pct = _column(chunk, cols.get("commission"), default_commission)
+            delivery = _column(chunk, cols.get("delivery"), 0.0)
+            commission_pct = np.where(np.isnan(commission_pct), default_commission, commission_pct)
+            delivery = np.where(np.isnan(delivery), 0.0, delivery)
+
+            valid = (price > 0) & (qty > 0) & (commission_pct >= 0) & (commission_pct <= 100) & (delivery >= 0)
+            subtotal = np.where(valid, price * qty, 0.0)
+            commission = subtotal * commission_pct / 100.0
+            total = np.where(valid, subtotal + commission + delivery, 0.0)
+
+            n_valid = int(valid.sum())
+            summary["rows"] += len(chunk)
+            summary["valid"] += n_valid
+            summary["invalid"] += len(chunk) - n_valid
+            summary["qty"] += float(qty[valid].sum())
+            summary["subtotal"] += float(subtotal.sum())
+            summary["commission"] += float(commission[valid].sum())
+            summary["delivery"] += float(delivery[valid].sum())
+            summary["total"] += float(total.sum())
+
+            for row, ok, s, c, t in zip(chunk, valid, subtotal, commission, total):
+                if ok:
+                    writer.writerow(list(row) + [f"{s:.2f}", f"{c:.2f}", f"{t:.2f}", "ok"])
+                else:
+                    writer.writerow(list(row) + ["", "", "", "error"])
+
+    return summary
@@ -0,0 +1,228 @@
+"""
+Chat Archive - retention tiering for chat_messages
+
+Messages of sessions that have been idle (or closed) for more than
+CHAT_ARCHIVE_DAYS are packed per session into zlib-compressed JSON chunks in
+a separate SQLite file and removed from the hot chat_messages table.
+Archived history stays available via load_archived_messages().
+
+Usage:
+    python -m src.bot.services.chat_archive [db_path] [archive_path] [days]
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import zlib
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DAYS = int(os.getenv("CHAT_ARCHIVE_DAYS", "30"))
+ARCHIVE_FILE = os.getenv("CHAT_ARCHIVE_FILE", "data/chat_archive.db")
+ARCHIVE_INTERVAL = float(os.getenv("CHAT_ARCHIVE_INTERVAL", "3600"))
+# Скільки сесій архівуємо за один прохід (щоб не тримати lock на основній БД довго)
+BATCH_SESSIONS = 200
+
+CODEC = "zlib-json"
+
+
+def _connect_archive(archive_path: str) -> sqlite3.Connection:
+    archive_dir = os.path.dirname(archive_path)
+    if archive_dir:
+        os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(archive_path)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS chat_archive_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            first_message_id INTEGER NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            first_at TEXT,
+            last_at TEXT,
+            codec TEXT NOT NULL,
+            payload BLOB NOT NULL,
+            archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_archive_session ON chat_archive_chunks(session_id, last_message_id)"
+    )
+    return conn
+
+
+def _pack(rows: List[Dict[str, Any]]) -> bytes:
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 9)
+
+
+def _unpack(codec: str, payload: bytes) -> List[Dict[str, Any]]:
+    if codec != CODEC:
+        raise ValueError(f"Unknown archive codec: {codec}")
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+
+def archive_once(db_path: str, archive_path: str = ARCHIVE_FILE, days: int = ARCHIVE_DAYS,
+                 batch_sessions: int = BATCH_SESSIONS) -> Dict[str, int]:
+    """
+    Archives idle/closed sessions whose last message is older than `days`.
+
+    Archive chunk is committed first, hot rows are deleted afterwards; a crash
+    in between only leaves rows that are dropped on the next run.
+    """
+    stats = {"sessions": 0, "messages": 0, "bytes": 0}
+    if not os.path.exists(db_path):
+        return stats
+
+    hot = sqlite3.connect(db_path)
+    hot.row_factory = sqlite3.Row
+    archive = _connect_archive(archive_path)
+    try:
+        if not hot.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='chat_messages'"
+        ).fetchone():
+            return stats
+
+        candidates = hot.execute(
+            """SELECT session_id, MAX(id) AS last_id
+               FROM chat_messages
+               GROUP BY session_id
+               HAVING MAX(created_at) < datetime('now', ?)
+               LIMIT ?""",
+            (f"-{int(days)} days", batch_sessions),
+        ).fetchall()
+
+        for cand in candidates:
+            session_id, last_id = cand["session_id"], cand["last_id"]
+
+            # Те, що вже лежить в архіві (попередній прохід впав до DELETE) — лише видаляємо
+            archived_upto = archive.execute(
+                "SELECT MAX(last_message_id) FROM chat_archive_chunks WHERE session_id=?",
+                (session_id,),
+            ).fetchone()[0] or 0
+
+            rows = [
+                dict(r) for r in hot.execute(
+                    "SELECT * FROM chat_messages WHERE session_id=? AND id>? AND id<=? ORDER BY id",
+                    (session_id, archived_upto, last_id),
+                )
+            ]
+            if rows:
+                payload = _pack(rows)
+                archive.execute(
+                    """INSERT INTO chat_archive_chunks
+                       (session_id, first_message_id, last_message_id, message_count,
+                        first_at, last_at, codec, payload)
+                       VALUES (?,?,?,?,?,?,?,?)""",
+                    (session_id, rows[0]["id"], rows[-1]["id"], len(rows),
+                     rows[0].get("created_at"), rows[-1].get("created_at"), CODEC, payload),
+                )
+                archive.commit()
+                stats["messages"] += len(rows)
+                stats["bytes"] += len(payload)
+
+            hot.execute("DELETE FROM chat_messages WHERE session_id=? AND id<=?", (session_id, last_id))
+            hot.commit()
+            stats["sessions"] += 1
+    finally:
+        hot.close()
+        archive.close()
+
+    if stats["sessions"]:
+        logger.info(
+            f"📦 Chat archive: {stats['sessions']} sessions, {stats['messages']} messages, "
+            f"{stats['bytes']} bytes compressed"
+        )
+    return stats
+
+
+def load_archived_messages(session_id: int, archive_path: str = ARCHIVE_FILE) -> List[Dict[str, Any]]:
+    """Returns archived messages of a session in chronological order"""
+    if not os.path.exists(archive_path):
+        return []
+    # Лише читання: без CREATE TABLE і без write-lock, поки архіватор пише
+    conn = sqlite3.connect(f"file:{os.path.abspath(archive_path)}?mode=ro", uri=True)
+    try:
+        chunks = conn.execute(
+            "SELECT codec, payload FROM chat_archive_chunks WHERE session_id=? ORDER BY first_message_id",
+            (session_id,),
+        ).fetchall()
+    except sqlite3.OperationalError:
+        # Архівний файл є, але схему ще не створено
+        return []
+    finally:
+        conn.close()
+
+    messages: List[Dict[str, Any]] = []
+    for codec, payload in chunks:
+        messages.extend(_unpack(codec, payload))
+    return messages
+
+
+class ChatArchiver:
+    """Periodic background archiving job"""
+
+    def __init__(self, db_path: str, archive_path: str = ARCHIVE_FILE, days: int = ARCHIVE_DAYS,
+                 interval: float = ARCHIVE_INTERVAL):
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.days = days
+        self.interval = interval
+        self.is_running = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the archiving loop"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"✅ Chat archiver started (older than {self.days} days)")
+
+    async def stop(self):
+        """Stop the archiving loop"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info("⏹ Chat archiver stopped")
+
+    async def _loop(self):
+        while self.is_running:
+            try:
+                # Проходимо батчами, поки є що архівувати
+                while True:
+                    stats = await asyncio.to_thread(
+                        archive_once, self.db_path, self.archive_path, self.days
+                    )
+                    if stats["sessions"] < BATCH_SESSIONS:
+                        break
+            except Exception as e:
+                logger.error(f"Error in chat archiver: {e}")
+            await asyncio.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "data/agro_bot.db"
+    archive_path = sys.argv[2] if len(sys.argv) > 2 else ARCHIVE_FILE
+    days = int(sys.argv[3]) if len(sys.argv) > 3 else ARCHIVE_DAYS
+
+    print("=" * 60)
+    print(f"📦 Архівація чатів: {db_path} → {archive_path} (старше {days} днів)")
+    print("=" * 60)
+
+    total = {"sessions": 0, "messages": 0, "bytes": 0}
+    while True:
+        stats = archive_once(db_path, archive_path, days)
+        for key in total:
+            total[key] += stats[key]
+        if stats["sessions"] < BATCH_SESSIONS:
+            break
+
+    print(f"✅ Сесій: {total['sessions']}, повідомлень: {total['messages']}, стиснуто: {total['bytes']} байт")
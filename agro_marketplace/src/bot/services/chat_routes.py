@@ -0,0 +1,177 @@
+"""
+Chat routing table - in-memory routes for anonymous chat relay
+
+Maps session_id to both parties (user id, telegram id, display name) so that
+relaying a chat message needs no DB lookups, plus a write-behind queue that
+batches chat_messages INSERTs on a single connection.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NAME = "Користувач"
+
+
+@dataclass(frozen=True)
+class ChatParty:
+    """One side of a chat session"""
+    user_id: int
+    telegram_id: Optional[int]
+    name: str
+
+
+@dataclass(frozen=True)
+class ChatRoute:
+    """Both parties of an active chat session"""
+    session_id: int
+    parties: Tuple[ChatParty, ChatParty]
+
+    def party_by_telegram(self, telegram_id: int) -> Optional[ChatParty]:
+        for party in self.parties:
+            if party.telegram_id == telegram_id:
+                return party
+        return None
+
+    def peer_of(self, telegram_id: int) -> Optional[ChatParty]:
+        a, b = self.parties
+        if a.telegram_id == telegram_id:
+            return b
+        if b.telegram_id == telegram_id:
+            return a
+        return None
+
+
+class ChatRouteCache:
+    """LRU cache of chat routes, filled on session open and evicted on exit"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._routes: "OrderedDict[int, Tuple[float, ChatRoute]]" = OrderedDict()
+
+    def get(self, session_id: int) -> Optional[ChatRoute]:
+        item = self._routes.get(session_id)
+        if not item:
+            return None
+        loaded_at, route = item
+        if time.monotonic() - loaded_at > self.ttl:
+            # Імена/статус могли змінитись — перечитаємо при наступному load()
+            del self._routes[session_id]
+            return None
+        self._routes.move_to_end(session_id)
+        return route
+
+    def put(self, route: ChatRoute) -> None:
+        self._routes[route.session_id] = (time.monotonic(), route)
+        self._routes.move_to_end(route.session_id)
+        while len(self._routes) > self.max_size:
+            self._routes.popitem(last=False)
+
+    def evict(self, session_id: int) -> None:
+        self._routes.pop(session_id, None)
+
+    async def load(self, db_file: str, session_id: int) -> Optional[ChatRoute]:
+        """Loads an active session with both parties in one query and caches it"""
+        async with aiosqlite.connect(db_file) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute(
+                """
+                SELECT cs.id,
+                       cs.user1_id, u1.telegram_id AS tg1, u1.full_name AS name1,
+                       cs.user2_id, u2.telegram_id AS tg2, u2.full_name AS name2
+                FROM chat_sessions cs
+                         LEFT JOIN users u1 ON u1.id = cs.user1_id
+                         LEFT JOIN users u2 ON u2.id = cs.user2_id
+                WHERE cs.id = ? AND cs.status = 'active'
+                """,
+                (session_id,),
+            )
+            row = await cur.fetchone()
+
+        if not row:
+            self.evict(session_id)
+            return None
+
+        route = ChatRoute(
+            session_id=row["id"],
+            parties=(
+                ChatParty(row["user1_id"], row["tg1"], row["name1"] or DEFAULT_NAME),
+                ChatParty(row["user2_id"], row["tg2"], row["name2"] or DEFAULT_NAME),
+            ),
+        )
+        self.put(route)
+        return route
+
+    async def resolve(self, db_file: str, session_id: int) -> Optional[ChatRoute]:
+        """Cached route or a single lookup on miss (e.g. after bot restart)"""
+        return self.get(session_id) or await self.load(db_file, session_id)
+
+
+class ChatMessageWriter:
+    """Write-behind queue for chat_messages: batches INSERTs on one connection"""
+
+    def __init__(self, db_file: str, batch_size: int = 200):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def enqueue(self, session_id: int, sender_user_id: int, content: str) -> None:
+        """Queues a message for INSERT; starts the writer lazily"""
+        if self._task is None or self._task.done():
+            self._restart()
+        self._queue.put_nowait((session_id, sender_user_id, content))
+
+    def _restart(self) -> None:
+        """New queue and writer task; messages left by a dead writer are carried over"""
+        pending = []
+        if self._task is not None:
+            if not self._task.cancelled() and self._task.exception() is not None:
+                logger.error("Chat message writer died, restarting", exc_info=self._task.exception())
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is not None:
+                    pending.append(item)
+            if pending:
+                logger.warning(f"Re-queueing {len(pending)} unwritten chat messages")
+        self._queue = asyncio.Queue()
+        for item in pending:
+            self._queue.put_nowait(item)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flushes queued messages and stops the writer"""
+        if self._task is None or self._task.done():
+            return
+        self._queue.put_nowait(None)
+        await self._task
+
+    async def _run(self) -> None:
+        async with aiosqlite.connect(self.db_file) as db:
+            stopping = False
+            while not stopping:
+                batch = [await self._queue.get()]
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+
+                if None in batch:
+                    stopping = True
+                    batch = [item for item in batch if item is not None]
+                if not batch:
+                    continue
+
+                try:
+                    await db.executemany(
+                        "INSERT INTO chat_messages(session_id, sender_user_id, content) VALUES(?,?,?)",
+                        batch,
+                    )
+                    await db.commit()
+                except Exception as e:
+                    logger.error(f"Failed to write {len(batch)} chat messages: {e}")
@@ -0,0 +1,305 @@
+"""
+Shipment Consolidation - packs small shipments into available vehicles
+
+Active shipments are grouped by corridor (from_region -> to_region) and
+overlapping date windows, then packed with First-Fit Decreasing into vehicle
+units (capacity_tons each, count_units per vehicle) based in the pickup region.
+Tons already booked in vehicle_bookings are subtracted per vehicle through an
+AvailabilityIndex, so a load never exceeds what the vehicle has free over its
+date window. Only loads that combine two or more shipments are proposed.
+Results go into the load_proposals table; each run replaces the previous
+proposals.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from src.bot.services.availability import AvailabilityIndex, shipment_window
+
+logger = logging.getLogger(__name__)
+
+CONSOLIDATION_INTERVAL = float(os.getenv("CONSOLIDATION_INTERVAL", "900"))
+# Пропонуємо завантаження лише від цієї утилізації
+MIN_UTILIZATION = float(os.getenv("CONSOLIDATION_MIN_UTILIZATION", "0.6"))
+
+
+@dataclass(frozen=True)
+class _Item:
+    shipment_id: int
+    volume: float
+    start: int
+    end: int
+    bodies: FrozenSet[str]  # порожня — будь-який кузов
+
+
+@dataclass
+class _Bin:
+    vehicle_id: int
+    unit: int
+    body_type: str
+    capacity: float
+    items: List[_Item] = field(default_factory=list)
+    load: float = 0.0
+    start: int = 0
+    end: int = 10 ** 9
+
+    def fits(self, item: _Item) -> bool:
+        return (
+            self.load + item.volume <= self.capacity + 1e-9
+            and (not item.bodies or self.body_type in item.bodies)
+            and max(self.start, item.start) <= min(self.end, item.end)
+        )
+
+    def add(self, item: _Item) -> None:
+        self.items.append(item)
+        self.load += item.volume
+        self.start = max(self.start, item.start)
+        self.end = min(self.end, item.end)
+
+
+def _parse_bodies(raw) -> FrozenSet[str]:
+    if not raw:
+        return frozenset()
+    try:
+        value = json.loads(raw)
+        if isinstance(value, list):
+            return frozenset(str(v) for v in value)
+    except (TypeError, ValueError):
+        pass
+    return frozenset(p.strip() for p in str(raw).split(",") if p.strip())
+
+
+def _window_clusters(items: List[_Item]) -> List[List[_Item]]:
+    """Splits corridor items into clusters with a common date overlap (sweep by start)"""
+    clusters: List[List[_Item]] = []
+    current: List[_Item] = []
+    common_end = None
+    for item in sorted(items, key=lambda i: i.start):
+        if current and item.start > common_end:
+            clusters.append(current)
+            current, common_end = [], None
+        current.append(item)
+        common_end = item.end if common_end is None else min(common_end, item.end)
+    if current:
+        clusters.append(current)
+    return clusters
+
+
+def plan_loads(shipments: List[sqlite3.Row], vehicles: List[sqlite3.Row],
+               bookings: Sequence[sqlite3.Row] = ()) -> List[Dict]:
+    """Pure planning step: returns proposed loads (no DB access); bookings are active vehicle_bookings rows"""
+    availability = AvailabilityIndex()
+    availability.fill(vehicles, (), bookings)
+    # Тонни, вже віддані під прийняті пропозиції, по авто
+    committed: Dict[int, float] = defaultdict(float)
+
+    # Одиниці транспорту по регіонах (база + робочі регіони)
+    units_by_region: Dict[str, List[Tuple[float, int, int, str]]] = defaultdict(list)
+    for v in vehicles:
+        regions = {v["base_region"]}
+        try:
+            regions.update(json.loads(v["work_regions"] or "[]"))
+        except (TypeError, ValueError):
+            pass
+        for unit in range(int(v["count_units"] or 1)):
+            for region in regions:
+                units_by_region[region].append(
+                    (float(v["capacity_tons"] or 0), int(v["id"]), unit, v["body_type"])
+                )
+
+    corridors: Dict[Tuple[str, str], List[_Item]] = defaultdict(list)
+    for s in shipments:
+        start, end = shipment_window(s["date_from"], s["date_to"], s["created_at"])
+        corridors[(s["from_region"], s["to_region"])].append(
+            _Item(int(s["id"]), float(s["volume_tons"] or 0), start, end, _parse_bodies(s["required_body_types"]))
+        )
+
+    clusters = []
+    for (from_region, to_region), items in corridors.items():
+        for cluster in _window_clusters(items):
+            if len(cluster) >= 2:
+                clusters.append((sum(i.volume for i in cluster), from_region, to_region, cluster))
+    # Спершу найбільші кластери — їм дістаються найкращі машини
+    clusters.sort(key=lambda c: c[0], reverse=True)
+
+    used_units = set()
+    proposals = []
+    for _, from_region, to_region, cluster in clusters:
+        units = [u for u in units_by_region.get(from_region, []) if (u[1], u[2]) not in used_units]
+        if not units:
+            continue
+        # Менші машини першими: щільніше завантаження для FFD
+        units.sort()
+        max_capacity = units[-1][0]
+
+        bins: List[_Bin] = []
+
+        def room(vehicle_id: int, start: int, end: int) -> float:
+            """Вільні тонни авто у вікні мінус бронювання і вже розкладене по його кузовах"""
+            planned = sum(b.load for b in bins if b.vehicle_id == vehicle_id)
+            return availability.free_tons(vehicle_id, start, end) - committed[vehicle_id] - planned
+
+        for item in sorted(cluster, key=lambda i: i.volume, reverse=True):
+            if item.volume >= max_capacity:
+                continue  # повне завантаження — консолідувати нічого
+            target = next(
+                (
+                    b for b in bins
+                    if b.fits(item)
+                    and room(b.vehicle_id, max(b.start, item.start), min(b.end, item.end)) >= item.volume - 1e-9
+                ),
+                None,
+            )
+            if target is None:
+                # Відкриваємо новий кузов — найменший вільний, куди влазить
+                taken = {(b.vehicle_id, b.unit) for b in bins}
+                for capacity, vehicle_id, unit, body in units:
+                    if (vehicle_id, unit) in taken or capacity < item.volume:
+                        continue
+                    if item.bodies and body not in item.bodies:
+                        continue
+                    if room(vehicle_id, item.start, item.end) < item.volume - 1e-9:
+                        continue
+                    target = _Bin(vehicle_id, unit, body, capacity)
+                    bins.append(target)
+                    break
+            if target is not None:
+                target.add(item)
+
+        for b in bins:
+            utilization = b.load / b.capacity if b.capacity else 0.0
+            if len(b.items) < 2 or utilization < MIN_UTILIZATION:
+                continue
+            used_units.add((b.vehicle_id, b.unit))
+            committed[b.vehicle_id] += b.load
+            proposals.append({
+                "vehicle_id": b.vehicle_id,
+                "from_region": from_region,
+                "to_region": to_region,
+                "window": (b.start, b.end),
+                "shipment_ids": [i.shipment_id for i in b.items],
+                "load_tons": round(b.load, 2),
+                "capacity_tons": b.capacity,
+                "utilization": round(utilization, 4),
+            })
+
+    proposals.sort(key=lambda p: p["utilization"], reverse=True)
+    return proposals
+
+
+def _ensure_proposals_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS load_proposals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_id INTEGER NOT NULL,
+            from_region TEXT NOT NULL,
+            to_region TEXT NOT NULL,
+            date_from TEXT,
+            date_to TEXT,
+            shipment_ids TEXT NOT NULL,
+            load_tons REAL NOT NULL,
+            capacity_tons REAL NOT NULL,
+            utilization REAL NOT NULL,
+            status TEXT NOT NULL DEFAULT 'proposed',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )"""
+    )
+
+
+def run_consolidation(db_path: str) -> Dict[str, float]:
+    """Reads active shipments/available vehicles, plans loads, replaces proposals"""
+    from datetime import date
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        if not {"shipments", "vehicles"} <= tables:
+            return {"shipments": 0, "proposals": 0, "seconds": 0.0}
+
+        shipments = conn.execute("SELECT * FROM shipments WHERE status='active'").fetchall()
+        vehicles = conn.execute("SELECT * FROM vehicles WHERE status='available'").fetchall()
+        bookings = conn.execute(
+            "SELECT vehicle_id, tons, date_from, date_to FROM vehicle_bookings WHERE status='booked'"
+        ).fetchall() if "vehicle_bookings" in tables else []
+        proposals = plan_loads(shipments, vehicles, bookings)
+
+        _ensure_proposals_table(conn)
+        conn.execute("DELETE FROM load_proposals WHERE status='proposed'")
+        conn.executemany(
+            """INSERT INTO load_proposals
+               (vehicle_id, from_region, to_region, date_from, date_to, shipment_ids,
+                load_tons, capacity_tons, utilization)
+               VALUES (?,?,?,?,?,?,?,?,?)""",
+            [
+                (
+                    p["vehicle_id"], p["from_region"], p["to_region"],
+                    date.fromordinal(p["window"][0]).isoformat(), date.fromordinal(p["window"][1]).isoformat(),
+                    json.dumps(p["shipment_ids"]), p["load_tons"], p["capacity_tons"], p["utilization"],
+                )
+                for p in proposals
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    seconds = time.perf_counter() - started
+    logger.info(f"🚛 Consolidation: {len(shipments)} shipments → {len(proposals)} loads in {seconds:.2f}s")
+    return {"shipments": len(shipments), "proposals": len(proposals), "seconds": seconds}
+
+
+class ConsolidationJob:
+    """Periodic background consolidation"""
+
+    def __init__(self, db_path: str, interval: float = CONSOLIDATION_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self.is_running = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the consolidation loop"""
+        if self.is_running:
+            return
+        self.is_running = True
+        self._task = asyncio.create_task(self._loop())
+        logger.info("✅ Consolidation job started")
+
+    async def stop(self):
+        """Stop the consolidation loop"""
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info("⏹ Consolidation job stopped")
+
+    async def run_now(self) -> Dict[str, float]:
+        return await asyncio.to_thread(run_consolidation, self.db_path)
+
+    async def _loop(self):
+        while self.is_running:
+            try:
+                await self.run_now()
+            except Exception as e:
+                logger.error(f"Error in consolidation job: {e}")
+            await asyncio.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "data/agro_bot.db"
+    stats = run_consolidation(db_path)
+    print(f"✅ Заявок: {stats['shipments']}, запропоновано завантажень: {stats['proposals']} "
+          f"за {stats['seconds']:.2f} с")
@@ -0,0 +1,273 @@
+"""
+Delivery Scheduler - single outbound queue for bot.send_message
+
+All notifications go through one scheduler with priority lanes
+(interactive > transactional > bulk), a global token bucket, per-chat
+limits and RetryAfter-aware retries, so a broadcast can't starve chat relay
+and Telegram flood limits are respected instead of silently swallowed.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import random
+import time
+from enum import IntEnum
+from typing import Any, Dict, Optional
+
+from aiogram.exceptions import (
+    TelegramRetryAfter,
+    TelegramForbiddenError,
+    TelegramBadRequest,
+    TelegramNetworkError,
+    TelegramServerError,
+)
+
+logger = logging.getLogger(__name__)
+
+# Ліміти Telegram: ~30 повідомлень/с глобально, ~1/с в один чат
+GLOBAL_RATE = float(os.getenv("DELIVERY_RATE", "25"))
+PER_CHAT_INTERVAL = float(os.getenv("DELIVERY_PER_CHAT_INTERVAL", "1.0"))
+MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "5"))
+MAX_IN_FLIGHT = int(os.getenv("DELIVERY_MAX_IN_FLIGHT", "20"))
+
+
+class Lane(IntEnum):
+    """Priority lanes: lower value is sent first"""
+    INTERACTIVE = 0     # chat relay
+    TRANSACTIONAL = 1   # offers, contacts, sync notifications
+    BULK = 2            # broadcasts
+
+
+class _Job:
+    __slots__ = ("chat_id", "text", "kwargs", "lane", "future", "attempts", "enqueued_at")
+
+    def __init__(self, chat_id: int, text: str, kwargs: Dict[str, Any], lane: Lane,
+                 future: Optional[asyncio.Future]):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.lane = lane
+        self.future = future
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class TokenBucket:
+    """Global send rate limiter"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DeliveryScheduler:
+    """Outbound message scheduler with priority lanes and rate limits"""
+
+    def __init__(self, bot, rate: float = GLOBAL_RATE, per_chat_interval: float = PER_CHAT_INTERVAL,
+                 max_attempts: int = MAX_ATTEMPTS, max_in_flight: int = MAX_IN_FLIGHT):
+        self.bot = bot
+        self.per_chat_interval = per_chat_interval
+        self.max_attempts = max_attempts
+        self._bucket = TokenBucket(rate)
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._chat_ready: Dict[int, float] = {}
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._delayed = 0
+        self._in_flight = 0
+        self._task: Optional[asyncio.Task] = None
+        self.is_running = False
+        self.stats: Dict[str, Dict[str, float]] = {
+            lane.name.lower(): {"queued": 0, "sent": 0, "failed": 0, "retried": 0,
+                                "retry_after": 0, "latency_total": 0.0}
+            for lane in Lane
+        }
+
+    # ---------- Публічне API ----------
+
+    async def start(self):
+        """Start the dispatch loop"""
+        if self.is_running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self.is_running = True
+        self._task = asyncio.create_task(self._dispatch_loop())
+        logger.info("✅ Delivery scheduler started")
+
+    async def stop(self, timeout: float = 10.0):
+        """Drain queued messages (up to timeout) and stop"""
+        if not self.is_running:
+            return
+        deadline = time.monotonic() + timeout
+        while self._pending() and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        logger.info(f"⏹ Delivery scheduler stopped: {self.metrics()}")
+
+    async def send(self, chat_id: int, text: str, lane: Lane = Lane.TRANSACTIONAL,
+                   wait: bool = False, **kwargs):
+        """Queues a message. With wait=True returns the sent Message or raises the final error"""
+        if not self.is_running:
+            await self.start()
+        future = asyncio.get_running_loop().create_future() if wait else None
+        self._put(_Job(chat_id, text, kwargs, lane, future))
+        self.stats[lane.name.lower()]["queued"] += 1
+        if future is not None:
+            return await future
+        return None
+
+    async def submit(self, chat_id: int, text: str, lane: Lane = Lane.TRANSACTIONAL,
+                     **kwargs) -> asyncio.Future:
+        """Queues a message without waiting; the future resolves with the Message or the final error"""
+        if not self.is_running:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._put(_Job(chat_id, text, kwargs, lane, future))
+        self.stats[lane.name.lower()]["queued"] += 1
+        return future
+
+    def metrics(self) -> Dict[str, Any]:
+        """Delivery counters per lane plus queue depth"""
+        lanes = {}
+        for name, s in self.stats.items():
+            lanes[name] = {k: v for k, v in s.items() if k != "latency_total"}
+            lanes[name]["avg_latency_ms"] = round(s["latency_total"] / s["sent"] * 1000, 1) if s["sent"] else 0
+        return {
+            "queue": self._queue.qsize() if self._queue else 0,
+            "delayed": self._delayed,
+            "in_flight": self._in_flight,
+            "lanes": lanes,
+        }
+
+    # ---------- Внутрішнє ----------
+
+    def _pending(self) -> int:
+        return (self._queue.qsize() if self._queue else 0) + self._delayed + self._in_flight
+
+    def _put(self, job: _Job) -> None:
+        self._queue.put_nowait((int(job.lane), next(self._seq), job))
+
+    def _put_later(self, job: _Job, delay: float) -> None:
+        self._delayed += 1
+
+        def _requeue():
+            self._delayed -= 1
+            if self.is_running:
+                self._put(job)
+            else:
+                self._finish(job, error=RuntimeError("Delivery scheduler stopped"))
+
+        asyncio.get_running_loop().call_later(delay, _requeue)
+
+    async def _dispatch_loop(self):
+        while self.is_running:
+            _, _, job = await self._queue.get()
+
+            # Чат ще "гарячий" — відкладаємо саме цей job, не блокуючи інших
+            now = time.monotonic()
+            ready_at = self._chat_ready.get(job.chat_id, 0.0)
+            if ready_at > now:
+                self._put_later(job, ready_at - now)
+                continue
+
+            await self._bucket.acquire()
+            await self._slots.acquire()
+            self._chat_ready[job.chat_id] = time.monotonic() + self.per_chat_interval
+            if len(self._chat_ready) > 10000:
+                self._prune_chats()
+            self._in_flight += 1
+            asyncio.create_task(self._deliver(job))
+
+    async def _deliver(self, job: _Job):
+        lane_stats = self.stats[job.lane.name.lower()]
+        try:
+            job.attempts += 1
+            result = await self.bot.send_message(job.chat_id, job.text, **job.kwargs)
+            lane_stats["sent"] += 1
+            lane_stats["latency_total"] += time.monotonic() - job.enqueued_at
+            self._finish(job, result=result)
+        except TelegramRetryAfter as e:
+            lane_stats["retry_after"] += 1
+            self._chat_ready[job.chat_id] = time.monotonic() + e.retry_after
+            self._retry(job, e, delay=e.retry_after)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            # Експоненційна затримка з jitter
+            self._retry(job, e, delay=min(30.0, 2 ** job.attempts) * random.uniform(0.5, 1.0))
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокований / чат не існує — повтор не допоможе
+            lane_stats["failed"] += 1
+            logger.warning(f"Delivery to {job.chat_id} rejected: {e}")
+            self._finish(job, error=e)
+        except Exception as e:
+            lane_stats["failed"] += 1
+            logger.error(f"Delivery to {job.chat_id} failed: {e}")
+            self._finish(job, error=e)
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+
+    def _retry(self, job: _Job, error: Exception, delay: float):
+        lane_stats = self.stats[job.lane.name.lower()]
+        if job.attempts >= self.max_attempts:
+            lane_stats["failed"] += 1
+            logger.error(f"Delivery to {job.chat_id} gave up after {job.attempts} attempts: {error}")
+            self._finish(job, error=error)
+            return
+        lane_stats["retried"] += 1
+        self._put_later(job, delay)
+
+    @staticmethod
+    def _finish(job: _Job, result: Any = None, error: Optional[Exception] = None):
+        if job.future is None or job.future.done():
+            return
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    def _prune_chats(self):
+        now = time.monotonic()
+        self._chat_ready = {c: t for c, t in self._chat_ready.items() if t > now}
+
+
+# Global delivery scheduler instance
+_scheduler: Optional[DeliveryScheduler] = None
+
+
+def get_delivery_scheduler(bot=None) -> Optional[DeliveryScheduler]:
+    """Get global scheduler; created on first use when bot is given"""
+    global _scheduler
+    if _scheduler is None and bot is not None:
+        _scheduler = DeliveryScheduler(bot)
+    return _scheduler
+
+
+async def deliver(bot, chat_id: int, text: str, lane: Lane = Lane.TRANSACTIONAL,
+                  wait: bool = False, **kwargs):
+    """Send a message through the global scheduler"""
+    return await get_delivery_scheduler(bot).send(chat_id, text, lane=lane, wait=wait, **kwargs)
+
+
+async def shutdown_delivery():
+    """Drain and stop the global scheduler (call before closing bot session)"""
+    if _scheduler is not None:
+        await _scheduler.stop()
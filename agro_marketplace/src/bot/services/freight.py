@@ -0,0 +1,81 @@
+"""
+Freight Estimator - vectorized delivery cost between oblasts
+
+Distances come from the precomputed oblast matrix (src/bot/utils/geo.py),
+tariffs are per body type. All calculations are NumPy array operations, so a
+whole table of (from, to, volume) rows, a quote to every region or the landed
+price of a page of market listings is one call.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+
+from src.bot.utils.geo import DISTANCE_KM, REGIONS
+
+
+@dataclass(frozen=True)
+class Tariff:
+    title: str
+    capacity_tons: float   # завантаження одного рейсу
+    per_km: float          # грн за км (вантажний пробіг)
+    per_trip: float        # подача / завантаження, грн за рейс
+
+
+TARIFFS: Dict[str, Tariff] = {
+    "grain": Tariff("🌾 Зерновоз", 30.0, 55.0, 1500.0),
+    "tipper": Tariff("🪨 Самоскид", 25.0, 50.0, 1500.0),
+    "tarp": Tariff("🧵 Тент", 20.0, 45.0, 1200.0),
+}
+DEFAULT_BODY = "grain"
+# Мінімальне плече для перевезення в межах області
+LOCAL_KM = 50.0
+
+REGION_INDEX: Dict[str, int] = {r: i for i, r in enumerate(REGIONS)}
+DIST = np.array([[DISTANCE_KM[a][b] for b in REGIONS] for a in REGIONS], dtype=np.float64)
+np.fill_diagonal(DIST, LOCAL_KM)
+
+
+def region_indices(regions: Sequence[str]) -> np.ndarray:
+    """Region names -> matrix indices (KeyError for unknown region)"""
+    return np.fromiter((REGION_INDEX[r] for r in regions), dtype=np.intp, count=len(regions))
+
+
+def _tariff(body_type: str) -> Tariff:
+    return TARIFFS.get(body_type) or TARIFFS[DEFAULT_BODY]
+
+
+def freight_costs(from_idx: np.ndarray, to_idx: np.ndarray, volumes: np.ndarray,
+                  body_type: str = DEFAULT_BODY) -> np.ndarray:
+    """Cost (UAH) for each (from, to, volume) row; arrays broadcast against each other"""
+    t = _tariff(body_type)
+    km = DIST[from_idx, to_idx]
+    trips = np.ceil(np.asarray(volumes, dtype=np.float64) / t.capacity_tons)
+    return trips * (t.per_trip + t.per_km * km)
+
+
+def quote_all_regions(from_region: str, volume_tons: float, body_type: str = DEFAULT_BODY) -> List[Dict]:
+    """Quotes from one region to all 24 oblasts in one vectorized call, sorted by cost"""
+    i = REGION_INDEX[from_region]
+    to_idx = np.arange(len(REGIONS))
+    costs = freight_costs(np.full_like(to_idx, i), to_idx, np.float64(volume_tons), body_type)
+    order = np.argsort(costs, kind="stable")
+    return [
+        {
+            "region": REGIONS[j],
+            "km": float(DIST[i, j]),
+            "cost": float(costs[j]),
+            "per_ton": float(costs[j] / volume_tons) if volume_tons else 0.0,
+        }
+        for j in order
+    ]
+
+
+def landed_costs(prices_per_ton: Sequence[float], from_regions: Sequence[str], to_region: str,
+                 volume_tons: Union[float, Sequence[float]], body_type: str = DEFAULT_BODY) -> np.ndarray:
+    """Price + freight per ton for many listings delivered to one region (volume per listing or shared)"""
+    prices = np.asarray(prices_per_ton, dtype=np.float64)
+    volumes = np.asarray(volume_tons, dtype=np.float64)
+    from_idx = region_indices(from_regions)
+    freight = freight_costs(from_idx, np.intp(REGION_INDEX[to_region]), volumes, body_type)
+    return prices + freight / volumes
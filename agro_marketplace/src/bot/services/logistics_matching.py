@@ -0,0 +1,258 @@
+"""
+Logistics Matching - in-memory vehicle/shipment index
+
+Available vehicles are indexed by (body_type, region) with a capacity-sorted
+bucket per key, active shipments by pickup region with a volume-sorted bucket.
+A match walks regions in order of distance from the pickup point and bisects
+the capacity buckets, so it touches only compatible candidates. The index is
+loaded once and then updated incrementally when vehicles/shipments are created.
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import aiosqlite
+
+from src.bot.utils.geo import REGIONS, distance_km, regions_by_distance
+
+logger = logging.getLogger(__name__)
+
+BODY_TYPES = ("grain", "tipper", "tarp")
+# Максимальний порожній пробіг до точки завантаження
+MATCH_RADIUS_KM = float(os.getenv("MATCH_RADIUS_KM", "400"))
+# Повне перечитування індексу (зміни статусів з веб-панелі тощо)
+MATCH_RELOAD_SECONDS = float(os.getenv("MATCH_RELOAD_SECONDS", "600"))
+
+
+@dataclass(frozen=True)
+class VehicleEntry:
+    id: int
+    owner_user_id: int
+    body_type: str
+    capacity_tons: float
+    count_units: int
+    regions: FrozenSet[str]
+
+    @property
+    def total_capacity(self) -> float:
+        return self.capacity_tons * self.count_units
+
+
+@dataclass(frozen=True)
+class ShipmentEntry:
+    id: int
+    creator_user_id: int
+    volume_tons: float
+    from_region: str
+    to_region: str
+    body_types: FrozenSet[str]  # порожня множина — підходить будь-який кузов
+
+
+@dataclass(frozen=True)
+class Match:
+    vehicle_id: int
+    shipment_id: int
+    empty_run_km: float
+    utilization: float
+
+
+def _parse_list(raw) -> List[str]:
+    if not raw:
+        return []
+    try:
+        value = json.loads(raw)
+        if isinstance(value, list):
+            return [str(v).strip() for v in value if str(v).strip()]
+    except (TypeError, ValueError):
+        pass
+    return [p.strip() for p in str(raw).split(",") if p.strip()]
+
+
+class MatchingIndex:
+    """Vehicle/shipment index with incremental updates"""
+
+    def __init__(self):
+        self._vehicles: Dict[int, VehicleEntry] = {}
+        self._shipments: Dict[int, ShipmentEntry] = {}
+        # (body_type, region) -> [(total_capacity, vehicle_id)] sorted
+        self._veh_buckets: Dict[Tuple[str, str], List[Tuple[float, int]]] = {}
+        # from_region -> [(volume_tons, shipment_id)] sorted
+        self._ship_buckets: Dict[str, List[Tuple[float, int]]] = {}
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    # ---------- Завантаження ----------
+
+    async def ensure_loaded(self, db_file: str) -> None:
+        """Loads the index on first use and re-reads it every MATCH_RELOAD_SECONDS"""
+        if time.monotonic() - self._loaded_at < MATCH_RELOAD_SECONDS:
+            return
+        async with self._lock:
+            if time.monotonic() - self._loaded_at < MATCH_RELOAD_SECONDS:
+                return
+            await self._load(db_file)
+
+    async def _load(self, db_file: str) -> None:
+        started = time.perf_counter()
+        async with aiosqlite.connect(db_file) as db:
+            db.row_factory = aiosqlite.Row
+            cur = await db.execute("SELECT * FROM vehicles WHERE status='available'")
+            vehicles = await cur.fetchall()
+            cur = await db.execute("SELECT * FROM shipments WHERE status='active'")
+            shipments = await cur.fetchall()
+
+        self._vehicles.clear()
+        self._shipments.clear()
+        self._veh_buckets.clear()
+        self._ship_buckets.clear()
+        for row in vehicles:
+            self.upsert_vehicle(row)
+        for row in shipments:
+            self.upsert_shipment(row)
+        self._loaded_at = time.monotonic()
+        logger.info(
+            f"Matching index loaded: {len(self._vehicles)} vehicles, {len(self._shipments)} shipments "
+            f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+
+    # ---------- Інкрементальні оновлення ----------
+
+    def upsert_vehicle(self, row) -> None:
+        """Adds/updates a vehicle from a DB row (non-available ones are removed)"""
+        vehicle_id = int(row["id"])
+        self.remove_vehicle(vehicle_id)
+        if (row["status"] or "available") != "available":
+            return
+        regions = {row["base_region"], *_parse_list(row["work_regions"])}
+        entry = VehicleEntry(
+            id=vehicle_id,
+            owner_user_id=int(row["owner_user_id"]),
+            body_type=row["body_type"],
+            capacity_tons=float(row["capacity_tons"] or 0),
+            count_units=int(row["count_units"] or 1),
+            regions=frozenset(r for r in regions if r),
+        )
+        self._vehicles[vehicle_id] = entry
+        for region in entry.regions:
+            insort(self._veh_buckets.setdefault((entry.body_type, region), []), (entry.total_capacity, vehicle_id))
+
+    def remove_vehicle(self, vehicle_id: int) -> None:
+        entry = self._vehicles.pop(vehicle_id, None)
+        if not entry:
+            return
+        for region in entry.regions:
+            bucket = self._veh_buckets.get((entry.body_type, region))
+            if bucket:
+                key = (entry.total_capacity, vehicle_id)
+                i = bisect_left(bucket, key)
+                if i < len(bucket) and bucket[i] == key:
+                    del bucket[i]
+
+    def upsert_shipment(self, row) -> None:
+        """Adds/updates a shipment from a DB row (non-active ones are removed)"""
+        shipment_id = int(row["id"])
+        self.remove_shipment(shipment_id)
+        if (row["status"] or "active") != "active":
+            return
+        entry = ShipmentEntry(
+            id=shipment_id,
+            creator_user_id=int(row["creator_user_id"]),
+            volume_tons=float(row["volume_tons"] or 0),
+            from_region=row["from_region"],
+            to_region=row["to_region"],
+            body_types=frozenset(_parse_list(row["required_body_types"])),
+        )
+        self._shipments[shipment_id] = entry
+        insort(self._ship_buckets.setdefault(entry.from_region, []), (entry.volume_tons, shipment_id))
+
+    def remove_shipment(self, shipment_id: int) -> None:
+        entry = self._shipments.pop(shipment_id, None)
+        if not entry:
+            return
+        bucket = self._ship_buckets.get(entry.from_region)
+        if bucket:
+            key = (entry.volume_tons, shipment_id)
+            i = bisect_left(bucket, key)
+            if i < len(bucket) and bucket[i] == key:
+                del bucket[i]
+
+    # ---------- Пошук ----------
+
+    def get_vehicle(self, vehicle_id: int) -> Optional[VehicleEntry]:
+        return self._vehicles.get(vehicle_id)
+
+    def get_shipment(self, shipment_id: int) -> Optional[ShipmentEntry]:
+        return self._shipments.get(shipment_id)
+
+    def vehicles_for_shipment(self, shipment_id: int, limit: int = 10,
+                              radius_km: float = MATCH_RADIUS_KM) -> List[Match]:
+        """Compatible vehicles ranked by empty run to pickup, then by capacity utilization"""
+        ship = self._shipments.get(shipment_id)
+        if not ship:
+            return []
+        bodies = ship.body_types or BODY_TYPES
+        seen = set()
+        matches: List[Match] = []
+
+        # Області йдуть за зростанням відстані: перша зустріч авто — його мінімальний пробіг
+        for region, dist in regions_by_distance(ship.from_region):
+            if dist > radius_km or len(matches) >= limit:
+                break
+            region_matches = []
+            for body in bodies:
+                bucket = self._veh_buckets.get((body, region))
+                if not bucket:
+                    continue
+                for total, vehicle_id in bucket[bisect_left(bucket, (ship.volume_tons, -math.inf)):]:
+                    if vehicle_id in seen:
+                        continue
+                    seen.add(vehicle_id)
+                    if self._vehicles[vehicle_id].owner_user_id == ship.creator_user_id:
+                        continue
+                    region_matches.append(Match(vehicle_id, ship.id, dist, ship.volume_tons / total))
+            region_matches.sort(key=lambda m: -m.utilization)
+            matches.extend(region_matches)
+        return matches[:limit]
+
+    def shipments_for_vehicle(self, vehicle_id: int, limit: int = 10,
+                              radius_km: float = MATCH_RADIUS_KM) -> List[Match]:
+        """Shipments the vehicle can carry, ranked by empty run, then by utilization"""
+        veh = self._vehicles.get(vehicle_id)
+        if not veh:
+            return []
+        total = veh.total_capacity
+        by_distance = sorted(
+            ((region, min(distance_km(r, region) for r in veh.regions)) for region in REGIONS),
+            key=lambda kv: kv[1],
+        )
+        matches: List[Match] = []
+        for region, dist in by_distance:
+            if dist > radius_km or len(matches) >= limit:
+                break
+            bucket = self._ship_buckets.get(region)
+            if not bucket:
+                continue
+            region_matches = []
+            for volume, shipment_id in bucket[:bisect_right(bucket, (total, math.inf))]:
+                ship = self._shipments[shipment_id]
+                if ship.body_types and veh.body_type not in ship.body_types:
+                    continue
+                if ship.creator_user_id == veh.owner_user_id:
+                    continue
+                region_matches.append(Match(vehicle_id, shipment_id, dist, volume / total if total else 0))
+            region_matches.sort(key=lambda m: -m.utilization)
+            matches.extend(region_matches)
+        return matches[:limit]
+
+    def stats(self) -> Dict[str, int]:
+        return {"vehicles": len(self._vehicles), "shipments": len(self._shipments)}
+
+
+# Global matching index
+matching_index = MatchingIndex()
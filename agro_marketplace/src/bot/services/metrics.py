@@ -0,0 +1,390 @@
+"""
+Handler Metrics - latency histograms, errors and throughput per handler
+
+Series are keyed by (router, handler, label). Each keeps an HDR-style
+log-linear histogram of latencies in microseconds: 8 sub-buckets per power
+of two, so quantiles are within ~6%, and a fixed number of buckets (bounded
+memory regardless of traffic). Upper bucket edges are inclusive, so the
+powers of two exported as Prometheus "le" bounds mean "<=" exactly; latencies
+above 2^MAX_EXP µs go into a separate overflow bucket (only in "+Inf"). The number of series is capped too; anything
+beyond METRICS_MAX_SERIES goes into one overflow series.
+
+Every bot process periodically writes its snapshot to METRICS_DIR
+(bot-<pid>.json). The bot-side /metrics endpoint and the panel merge fresh
+snapshots, so shard workers and the panel (a separate process) see one view.
+Snapshots may also carry an "sql" section (src/database/sql_trace.py, when
+SQL_TRACE is on) with per-fingerprint and per-update statement statistics,
+and a "concurrency" section (in-flight / queued / shed updates of the process).
+This module has no aiogram dependency and is safe to import from the panel.
+"""
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "500"))
+# Знімки процесів, що не оновлювались довше, вважаються мертвими
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", "300"))
+
+SUB_BITS = 3
+SUB_COUNT = 1 << SUB_BITS
+MAX_EXP = 27  # 2^27 мкс ≈ 134 с — усе довше потрапляє в бакет переповнення
+MAX_MICROS = 1 << MAX_EXP
+OVERFLOW_BUCKET = (MAX_EXP - SUB_BITS + 1) * SUB_COUNT
+BUCKETS = OVERFLOW_BUCKET + 1
+# Межі для Prometheus — степені двійки (збігаються з межами бакетів): 128 мкс … 134 с
+EXPORT_EXPONENTS = range(7, MAX_EXP + 1)
+
+OVERFLOW_KEY = ("other", "other", "other")
+SQL_LABEL_MAX_LENGTH = 300
+METRIC_PREFIX = "agro_bot"
+
+SeriesKey = Tuple[str, str, str]
+
+
+def bucket_index(micros: int) -> int:
+    """Log-linear bucket of a latency in microseconds: bucket i holds (bucket_lower(i), bucket_lower(i + 1)]"""
+    if micros > MAX_MICROS:
+        return OVERFLOW_BUCKET
+    # Зсув на 1: верхня межа бакета входить у нього (2^exp — останнє значення бакета)
+    micros -= 1
+    if micros < SUB_COUNT:
+        return micros if micros > 0 else 0
+    shift = micros.bit_length() - 1 - SUB_BITS
+    return (shift + 1) * SUB_COUNT + (micros >> shift) - SUB_COUNT
+
+
+def bucket_lower(index: int) -> int:
+    """Exclusive lower edge (µs) of the bucket; bucket 0 also holds 0"""
+    if index < 2 * SUB_COUNT:
+        return index
+    shift = index // SUB_COUNT - 1
+    return (SUB_COUNT + index % SUB_COUNT) << shift
+
+
+class Series:
+    """Histogram, error count and per-minute throughput of one handler/label"""
+
+    __slots__ = ("counts", "count", "errors", "sum_us", "max_us", "minute", "minute_count", "prev_minute_count")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.errors = 0
+        self.sum_us = 0
+        self.max_us = 0
+        self.minute = 0
+        self.minute_count = 0
+        self.prev_minute_count = 0
+
+    def record(self, micros: int, error: bool, minute: int) -> None:
+        self.counts[bucket_index(micros)] += 1
+        self.count += 1
+        self.sum_us += micros
+        if micros > self.max_us:
+            self.max_us = micros
+        if error:
+            self.errors += 1
+        if minute != self.minute:
+            self.prev_minute_count = self.minute_count if minute == self.minute + 1 else 0
+            self.minute = minute
+            self.minute_count = 0
+        self.minute_count += 1
+
+    def per_minute(self, minute: int) -> int:
+        """Updates in the last complete minute"""
+        if minute == self.minute:
+            return self.prev_minute_count
+        if minute == self.minute + 1:
+            return self.minute_count
+        return 0
+
+
+class MetricsRegistry:
+    """In-process series store; snapshot() is what gets shared and exported"""
+
+    def __init__(self, max_series: int = METRICS_MAX_SERIES):
+        self.max_series = max_series
+        self.series: Dict[SeriesKey, Series] = {}
+        self.started_at = time.time()
+
+    def record(self, key: SeriesKey, micros: int, error: bool, minute: int) -> None:
+        series = self.series.get(key)
+        if series is None:
+            if len(self.series) >= self.max_series:
+                key = OVERFLOW_KEY
+                series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = Series()
+        series.record(micros, error, minute)
+
+    def snapshot(self) -> Dict[str, Any]:
+        minute = int(time.monotonic() // 60)
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "series": [
+                {
+                    "router": key[0],
+                    "handler": key[1],
+                    "label": key[2],
+                    "count": s.count,
+                    "errors": s.errors,
+                    "sum_us": s.sum_us,
+                    "max_us": s.max_us,
+                    "per_minute": s.per_minute(minute),
+                    # Розріджено: лише непорожні бакети
+                    "buckets": {str(i): n for i, n in enumerate(s.counts) if n},
+                }
+                for key, s in list(self.series.items())
+            ],
+        }
+
+
+# ---------- Знімки процесів ----------
+
+def snapshot_path(directory: str, pid: Optional[int] = None) -> str:
+    return os.path.join(directory, f"bot-{pid or os.getpid()}.json")
+
+
+def write_snapshot(directory: str, snapshot: Dict[str, Any]) -> None:
+    """Atomic write, readers never see a half-written file"""
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(directory, snapshot["pid"])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def read_snapshots(directory: str, stale_seconds: float = METRICS_STALE_SECONDS) -> List[Dict[str, Any]]:
+    """Fresh snapshots of all bot processes"""
+    snapshots = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return snapshots
+    now = time.time()
+    for name in names:
+        if not (name.startswith("bot-") and name.endswith(".json")):
+            continue
+        try:
+            with open(os.path.join(directory, name), encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics snapshot {name}: {e}")
+            continue
+        if now - snapshot.get("updated_at", 0) <= stale_seconds:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[SeriesKey, Dict[str, Any]]:
+    """Sums series with the same key across processes"""
+    merged: Dict[SeriesKey, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        for s in snapshot["series"]:
+            key = (s["router"], s["handler"], s["label"])
+            m = merged.get(key)
+            if m is None:
+                m = merged[key] = {"count": 0, "errors": 0, "sum_us": 0, "max_us": 0, "per_minute": 0, "buckets": {}}
+            m["count"] += s["count"]
+            m["errors"] += s["errors"]
+            m["sum_us"] += s["sum_us"]
+            m["per_minute"] += s["per_minute"]
+            m["max_us"] = max(m["max_us"], s["max_us"])
+            for i, n in s["buckets"].items():
+                m["buckets"][int(i)] = m["buckets"].get(int(i), 0) + n
+    return merged
+
+
+def quantile(buckets: Dict[int, int], count: int, q: float) -> float:
+    """Quantile in microseconds (bucket midpoint)"""
+    if not count:
+        return 0.0
+    rank = max(1, int(q * count + 0.5))
+    seen = 0
+    for i in sorted(buckets):
+        seen += buckets[i]
+        if seen >= rank:
+            if i == OVERFLOW_BUCKET:
+                return float(MAX_MICROS)
+            return (bucket_lower(i) + 1 + bucket_lower(i + 1)) / 2
+    return float(bucket_lower(max(buckets)))
+
+
+def summarize(snapshots: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows for the panel: per-series quantiles (ms), error rate, throughput; slowest total first"""
+    rows = []
+    for (router, handler, label), m in merge(snapshots).items():
+        count = m["count"]
+        rows.append({
+            "router": router,
+            "handler": handler,
+            "label": label,
+            "count": count,
+            "errors": m["errors"],
+            "error_rate": m["errors"] / count if count else 0.0,
+            "per_minute": m["per_minute"],
+            "mean_ms": m["sum_us"] / count / 1000 if count else 0.0,
+            "p50_ms": quantile(m["buckets"], count, 0.50) / 1000,
+            "p95_ms": quantile(m["buckets"], count, 0.95) / 1000,
+            "p99_ms": quantile(m["buckets"], count, 0.99) / 1000,
+            "max_ms": m["max_us"] / 1000,
+            "total_s": m["sum_us"] / 1_000_000,
+        })
+    rows.sort(key=lambda r: -r["total_s"])
+    return rows
+
+
+def merge_sql(snapshots: Iterable[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, str], Dict[str, Any]],
+                                                              Dict[Tuple[str, str], Dict[str, Any]]]:
+    """SQL statistics summed across processes: by (source, fingerprint) and by (source, scope)"""
+    queries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    scopes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        sql = snapshot.get("sql")
+        if not sql:
+            continue
+        source = snapshot.get("source", "bot")
+        for q in sql["queries"]:
+            m = queries.setdefault((source, q["fingerprint"]), dict.fromkeys(
+                ("count", "seconds", "max_seconds", "rows", "slow", "repeated"), 0))
+            for field in ("count", "seconds", "rows", "slow", "repeated"):
+                m[field] += q[field]
+            m["max_seconds"] = max(m["max_seconds"], q["max_seconds"])
+        for sc in sql["scopes"]:
+            m = scopes.setdefault((source, sc["name"]), dict.fromkeys(
+                ("scopes", "statements", "max_statements", "seconds"), 0))
+            for field in ("scopes", "statements", "seconds"):
+                m[field] += sc[field]
+            m["max_statements"] = max(m["max_statements"], sc["max_statements"])
+    return queries, scopes
+
+
+def summarize_sql(snapshots: List[Dict[str, Any]], limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows for the panel: heaviest fingerprints and scopes with most statements per update"""
+    queries, scopes = merge_sql(snapshots)
+    query_rows = [
+        {"source": source, "fingerprint": fp, "count": m["count"], "rows": m["rows"],
+         "mean_ms": m["seconds"] / m["count"] * 1000 if m["count"] else 0.0,
+         "max_ms": m["max_seconds"] * 1000, "total_s": m["seconds"],
+         "slow": m["slow"], "repeated": m["repeated"]}
+        for (source, fp), m in queries.items()
+    ]
+    query_rows.sort(key=lambda r: -r["total_s"])
+    scope_rows = [
+        {"source": source, "name": name, "scopes": m["scopes"],
+         "per_scope": m["statements"] / m["scopes"] if m["scopes"] else 0.0,
+         "max_statements": m["max_statements"], "total_s": m["seconds"]}
+        for (source, name), m in scopes.items()
+    ]
+    scope_rows.sort(key=lambda r: -r["per_scope"])
+    return {"queries": query_rows[:limit], "scopes": scope_rows[:limit]}
+
+
+# ---------- Prometheus ----------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus(snapshots: List[Dict[str, Any]]) -> str:
+    """Prometheus text exposition format (version 0.0.4)"""
+    merged = merge(snapshots)
+    name = f"{METRIC_PREFIX}_handler_latency_seconds"
+    lines = [
+        f"# HELP {name} Update handling latency by router, handler and label",
+        f"# TYPE {name} histogram",
+    ]
+    errors = [
+        f"# HELP {METRIC_PREFIX}_handler_errors_total Updates whose handler raised",
+        f"# TYPE {METRIC_PREFIX}_handler_errors_total counter",
+    ]
+    for key in sorted(merged):
+        m = merged[key]
+        labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(("router", "handler", "label"), key))
+        cumulative = 0
+        ordered = sorted(m["buckets"].items())
+        pos = 0
+        for exp in EXPORT_EXPONENTS:
+            # 2^exp — верхня (включна) межа свого бакета: усі бакети до нього включно <= 2^exp
+            limit = bucket_index(1 << exp)
+            while pos < len(ordered) and ordered[pos][0] <= limit:
+                cumulative += ordered[pos][1]
+                pos += 1
+            lines.append(f'{name}_bucket{{{labels},le="{(1 << exp) / 1_000_000!r}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {m["count"]}')
+        lines.append(f"{name}_sum{{{labels}}} {m['sum_us'] / 1_000_000:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {m['count']}")
+        errors.append(f"{METRIC_PREFIX}_handler_errors_total{{{labels}}} {m['errors']}")
+    lines += errors
+    lines += _render_concurrency(snapshots)
+    lines += _render_sql(snapshots)
+    lines += [
+        f"# HELP {METRIC_PREFIX}_metrics_processes Bot processes with a fresh metrics snapshot",
+        f"# TYPE {METRIC_PREFIX}_metrics_processes gauge",
+        f"{METRIC_PREFIX}_metrics_processes {sum(1 for s in snapshots if 'pid' in s)}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def summarize_concurrency(snapshots: List[Dict[str, Any]]) -> Optional[Dict[str, int]]:
+    """In-flight / queued / shed updates summed over bot processes; None without limiter stats"""
+    stats = [s["concurrency"] for s in snapshots if "concurrency" in s]
+    if not stats:
+        return None
+    return {key: sum(s.get(key, 0) for s in stats) for key in ("in_flight", "queued", "shed")}
+
+
+def _render_concurrency(snapshots: List[Dict[str, Any]]) -> List[str]:
+    totals = summarize_concurrency(snapshots)
+    if totals is None:
+        return []
+    lines = []
+    for metric, key, kind, help_text in (
+        ("updates_in_flight", "in_flight", "gauge", "Updates being handled right now"),
+        ("updates_queued", "queued", "gauge", "Updates waiting for a concurrency slot or the user's lock"),
+        ("updates_shed_total", "shed", "counter", "Updates dropped because a queue limit was reached"),
+    ):
+        lines += [
+            f"# HELP {METRIC_PREFIX}_{metric} {help_text}",
+            f"# TYPE {METRIC_PREFIX}_{metric} {kind}",
+            f"{METRIC_PREFIX}_{metric} {totals[key]}",
+        ]
+    return lines
+
+
+def _render_sql(snapshots: List[Dict[str, Any]]) -> List[str]:
+    queries, scopes = merge_sql(snapshots)
+    if not queries and not scopes:
+        return []
+    lines = []
+    query_metrics = (
+        ("sql_statements_total", "count", "counter", "SQL statements executed, by fingerprint"),
+        ("sql_seconds_total", "seconds", "counter", "Time spent in execute and fetch, by fingerprint"),
+        ("sql_rows_total", "rows", "counter", "Rows returned by fetches, by fingerprint"),
+        ("sql_slow_total", "slow", "counter", "Statements slower than SQL_SLOW_MS"),
+        ("sql_repeated_total", "repeated", "counter", "Updates/requests that ran the fingerprint more than SQL_REPEAT_THRESHOLD times"),
+    )
+    for metric, field, kind, help_text in query_metrics:
+        lines += [f"# HELP {METRIC_PREFIX}_{metric} {help_text}", f"# TYPE {METRIC_PREFIX}_{metric} {kind}"]
+        for (source, fp) in sorted(queries):
+            value = queries[(source, fp)][field]
+            labels = f'source="{_escape(source)}",fingerprint="{_escape(fp[:SQL_LABEL_MAX_LENGTH])}"'
+            lines.append(f"{METRIC_PREFIX}_{metric}{{{labels}}} {round(value, 6)}")
+    scope_metrics = (
+        ("sql_scopes_total", "scopes", "counter", "Traced updates/requests, by handler or endpoint"),
+        ("sql_scope_statements_total", "statements", "counter", "SQL statements run inside traced updates/requests"),
+        ("sql_scope_statements_max", "max_statements", "gauge", "Most SQL statements in one update/request"),
+    )
+    for metric, field, kind, help_text in scope_metrics:
+        lines += [f"# HELP {METRIC_PREFIX}_{metric} {help_text}", f"# TYPE {METRIC_PREFIX}_{metric} {kind}"]
+        for (source, name) in sorted(scopes):
+            labels = f'source="{_escape(source)}",scope="{_escape(name)}"'
+            lines.append(f"{METRIC_PREFIX}_{metric}{{{labels}}} {scopes[(source, name)][field]}")
+    return lines
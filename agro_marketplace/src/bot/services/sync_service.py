@@ -179,20 +179,23 @@ class FileBasedSync:
             logger.error(f"Error writing sync event: {e}")
     
     @classmethod
-    def read_unprocessed_events(cls):
-        """Read unprocessed events from file"""
+    def read_all_events(cls):
+        """Read all events (processed and unprocessed) from file"""
         try:
             if not cls.SYNC_FILE.exists():
                 return []
-            
+
             with open(cls.SYNC_FILE, 'r', encoding='utf-8') as f:
-                events = json.load(f)
-            
-            return [e for e in events if not e.get('processed', False)]
-            
+                return json.load(f)
+
         except Exception as e:
             logger.error(f"Error reading sync events: {e}")
             return []
+
+    @classmethod
+    def read_unprocessed_events(cls):
+        """Read unprocessed events from file"""
+        return [e for e in cls.read_all_events() if not e.get('processed', False)]
     
     @classmethod
     def mark_event_processed(cls, event_index: int):
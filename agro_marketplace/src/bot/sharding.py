@@ -0,0 +1,365 @@
+"""
+Shard Supervisor - spreads updates over N worker processes by user id
+
+The supervisor receives updates (polling or webhook, see runner.py) and puts
+the raw JSON into the worker queue picked by user_id % N, so all updates of
+one user land in the same process and keep their order. Each worker runs the
+regular Dispatcher (dispatcher.py); inside a worker, updates of different
+users run concurrently while each user's updates are chained one after another.
+
+Workers report a heartbeat; a worker that died or whose event loop stalled
+longer than SHARD_HEARTBEAT_TIMEOUT is restarted with exponential backoff.
+Every routed update carries a sequence number and stays in the supervisor's
+per-shard buffer until the worker takes it for dispatch, so updates still
+queued for a restarted worker are re-sent to its fresh queue instead of being
+lost (in polling mode Telegram would not deliver them again).
+Background jobs (archiver, consolidation, web panel sync) run in worker 0 only,
+and the outbound DELIVERY_RATE is split evenly between workers.
+
+Run: BOT_WORKERS=4 python bot.py   (or python -m src.bot.sharding)
+"""
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue as queue_mod
+import signal
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from config.settings import BOT_MODE, BOT_TOKEN, BOT_WORKERS
+
+logger = logging.getLogger(__name__)
+
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+# Скільки оновлень одночасно обробляє один воркер (різні користувачі)
+SHARD_CONCURRENCY = int(os.getenv("SHARD_CONCURRENCY", "32"))
+SHARD_HEARTBEAT_INTERVAL = 1.0
+SHARD_HEARTBEAT_TIMEOUT = float(os.getenv("SHARD_HEARTBEAT_TIMEOUT", "30"))
+HEALTH_CHECK_INTERVAL = 5.0
+MAX_RESTART_DELAY = 30.0
+POLL_TIMEOUT = 30
+
+
+def shard_key(update: Dict[str, Any]) -> int:
+    """User id of a raw update (chat id / update_id as fallbacks)"""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+    return int(update.get("update_id", 0))
+
+
+# ---------- Воркер (окремий процес) ----------
+
+def _worker_main(index: int, shards: int, updates: "mp.Queue", heartbeat: "mp.Value", taken: "mp.Value",
+                 run_jobs: bool):
+    # Налаштування процесу — до імпорту хендлерів і сервісів
+    os.environ["BOT_BACKGROUND_JOBS"] = "1" if run_jobs else "0"
+    total_rate = float(os.getenv("DELIVERY_RATE", "25"))
+    os.environ["DELIVERY_RATE"] = str(total_rate / shards)
+    # Зупинку ініціює супервізор (сигнал None у черзі): платформа (Heroku, Railway) шле
+    # SIGTERM усій групі процесів, а воркер має спершу дообробити чергу і скинути буфери
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s - shard{index} - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(_worker_loop(index, updates, heartbeat, taken, run_jobs))
+
+
+async def _worker_loop(index: int, updates: "mp.Queue", heartbeat: "mp.Value", taken: "mp.Value",
+                       run_jobs: bool):
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+    from aiogram.types import Update
+
+    from src.bot.dispatcher import create_dispatcher
+    from src.bot.runner import bot_session
+    from src.bot.services.delivery import shutdown_delivery
+
+    bot = Bot(token=BOT_TOKEN, session=bot_session(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = create_dispatcher()
+    workflow_data = {"dispatcher": dp, "bots": [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+
+    sync_processor = None
+    if run_jobs:
+        from src.bot.middlewares.sync import SyncEventProcessor
+        sync_processor = SyncEventProcessor(bot)
+        await sync_processor.start()
+
+    loop = asyncio.get_running_loop()
+    supervisor = mp.parent_process()
+    semaphore = asyncio.Semaphore(SHARD_CONCURRENCY)
+    tails: Dict[int, asyncio.Task] = {}
+    running: Set[asyncio.Task] = set()
+
+    async def handle(user_id: int, data: Dict[str, Any], previous: Optional[asyncio.Task]):
+        try:
+            if previous is not None:
+                # Порядок оновлень одного користувача зберігається
+                await asyncio.wait([previous])
+            async with semaphore:
+                update = Update.model_validate(data, context={"bot": bot})
+                await dp.feed_update(bot, update)
+        except Exception as e:
+            logger.error(f"Error handling update {data.get('update_id')}: {e}")
+        finally:
+            if tails.get(user_id) is asyncio.current_task():
+                del tails[user_id]
+
+    logger.info(f"✅ Shard {index} started (pid {os.getpid()})")
+    try:
+        while True:
+            heartbeat.value = time.time()
+            if len(running) >= SHARD_CONCURRENCY * 4:
+                # Зворотний тиск: черга процесу наповнюється, супервізор пригальмує прийом
+                await asyncio.wait(running, timeout=SHARD_HEARTBEAT_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                item = await loop.run_in_executor(None, updates.get, True, SHARD_HEARTBEAT_INTERVAL)
+            except queue_mod.Empty:
+                if supervisor is not None and not supervisor.is_alive():
+                    # Супервізор убитий (SIGKILL) — сигналу зупинки не буде, SIGTERM ігноруємо
+                    logger.error(f"Shard {index}: supervisor is gone, stopping")
+                    break
+                continue
+            if item is None:
+                break
+            seq, user_id, data = item
+            # Узяте в обробку супервізор більше не перешле при рестарті
+            taken.value = seq
+            task = asyncio.create_task(handle(user_id, data, tails.get(user_id)))
+            tails[user_id] = task
+            running.add(task)
+            task.add_done_callback(running.discard)
+    finally:
+        if running:
+            await asyncio.wait(running, timeout=SHARD_HEARTBEAT_TIMEOUT)
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        if sync_processor:
+            await sync_processor.stop()
+        await shutdown_delivery()
+        await dp.storage.close()
+        await bot.session.close()
+        logger.info(f"⏹ Shard {index} stopped")
+
+
+# ---------- Супервізор ----------
+
+class ShardSupervisor:
+    """Receives updates and routes them to worker processes by user id"""
+
+    def __init__(self, shards: int = BOT_WORKERS, queue_size: int = SHARD_QUEUE_SIZE):
+        self.shards = max(1, shards)
+        self.queue_size = queue_size
+        self._ctx = mp.get_context("spawn")
+        self._queues: List[Any] = [self._ctx.Queue(queue_size) for _ in range(self.shards)]
+        self._heartbeats = [self._ctx.Value("d", 0.0) for _ in range(self.shards)]
+        # Останній seq, який воркер узяв у обробку, і ще не взяті оновлення (seq, user_id, update)
+        self._taken = [self._ctx.Value("q", 0) for _ in range(self.shards)]
+        self._unacked: List[Deque[Tuple[int, int, Dict[str, Any]]]] = [deque() for _ in range(self.shards)]
+        self._seq = 0
+        self._procs: List[Optional[Any]] = [None] * self.shards
+        self._restarts = [0] * self.shards
+        self._next_start = [0.0] * self.shards
+        self.routed = 0
+        self.rejected = 0
+
+    # ---------- Процеси ----------
+
+    def _spawn(self, index: int) -> None:
+        self._heartbeats[index].value = time.time()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(index, self.shards, self._queues[index], self._heartbeats[index], self._taken[index], index == 0),
+            name=f"bot-shard-{index}",
+        )
+        proc.start()
+        self._procs[index] = proc
+        logger.info(f"🚀 Shard {index} spawned (pid {proc.pid})")
+
+    def _check_workers(self) -> None:
+        now = time.time()
+        for i, proc in enumerate(self._procs):
+            if proc is None:
+                if now >= self._next_start[i]:
+                    self._spawn(i)
+                continue
+            stalled = now - self._heartbeats[i].value > SHARD_HEARTBEAT_TIMEOUT
+            if proc.is_alive() and not stalled:
+                continue
+
+            if proc.is_alive():
+                logger.error(f"❌ Shard {i} is not responding for {SHARD_HEARTBEAT_TIMEOUT:.0f}s — restarting")
+                # SIGTERM воркер ігнорує — завислий процес лише вбиваємо
+                proc.kill()
+                proc.join()
+            else:
+                logger.error(f"❌ Shard {i} exited with code {proc.exitcode} — restarting")
+            # Процес міг загинути, тримаючи lock черги — нова черга і повтор ще не взятих оновлень
+            self._replace_queue(i)
+
+            self._restarts[i] += 1
+            delay = min(MAX_RESTART_DELAY, 2 ** (self._restarts[i] - 1))
+            self._procs[i] = None
+            self._next_start[i] = now + delay
+
+    def _trim(self, index: int) -> Deque[Tuple[int, int, Dict[str, Any]]]:
+        unacked, taken = self._unacked[index], self._taken[index].value
+        while unacked and unacked[0][0] <= taken:
+            unacked.popleft()
+        return unacked
+
+    def _replace_queue(self, index: int) -> None:
+        old = self._queues[index]
+        pending = list(self._trim(index))
+        queue = self._ctx.Queue(max(self.queue_size, len(pending)))
+        for item in pending:
+            queue.put_nowait(item)
+        self._queues[index] = queue
+        # Стару чергу ніхто не читає — не чекаємо її feeder-потік на виході
+        old.cancel_join_thread()
+        old.close()
+        if pending:
+            logger.warning(f"↩️ Shard {index}: {len(pending)} queued updates re-sent to the new queue")
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            try:
+                self._check_workers()
+            except Exception as e:
+                logger.error(f"Error in shard health check: {e}")
+
+    def health(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return [
+            {
+                "shard": i,
+                "pid": proc.pid if proc else None,
+                "alive": bool(proc and proc.is_alive()),
+                "heartbeat_age": round(now - self._heartbeats[i].value, 1),
+                "restarts": self._restarts[i],
+            }
+            for i, proc in enumerate(self._procs)
+        ]
+
+    # ---------- Маршрутизація ----------
+
+    def route(self, update: Dict[str, Any]) -> bool:
+        """Puts a raw update into its shard queue; False if that shard is full"""
+        user_id = shard_key(update)
+        index = user_id % self.shards
+        item = (self._seq + 1, user_id, update)
+        try:
+            self._queues[index].put_nowait(item)
+        except queue_mod.Full:
+            self.rejected += 1
+            return False
+        self._seq += 1
+        self._trim(index).append(item)
+        self.routed += 1
+        return True
+
+    async def _poll(self, bot, allowed_updates):
+        from aiogram.methods import GetUpdates
+
+        await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        while True:
+            try:
+                updates = await bot(GetUpdates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=allowed_updates))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in getUpdates: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                data = update.model_dump(mode="json", by_alias=True, exclude_none=True)
+                # Шард переповнений — чекаємо, offset не зсуваємо (нічого не губимо)
+                while not self.route(data):
+                    await asyncio.sleep(0.2)
+                offset = update.update_id + 1
+
+    # ---------- Запуск ----------
+
+    async def run(self):
+        from aiogram import Bot
+
+        from src.bot.dispatcher import create_dispatcher
+        from src.bot.runner import WebhookServer, bot_session
+
+        for i in range(self.shards):
+            self._spawn(i)
+
+        bot = Bot(token=BOT_TOKEN, session=bot_session())
+        # Диспетчер тут лише для allowed_updates; обробка — у воркерах
+        dp = create_dispatcher()
+        monitor = asyncio.create_task(self._monitor())
+        logger.info(f"🧩 Shard supervisor: {self.shards} workers, mode {BOT_MODE}")
+
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows
+
+        try:
+            if BOT_MODE == "webhook":
+                server = WebhookServer(bot, dp, on_update=self.route)
+                await server.start()
+                try:
+                    await stop_event.wait()
+                finally:
+                    await server.stop()
+            else:
+                poller = asyncio.create_task(self._poll(bot, dp.resolve_used_update_types()))
+                await asyncio.wait([poller, asyncio.create_task(stop_event.wait())],
+                                   return_when=asyncio.FIRST_COMPLETED)
+                poller.cancel()
+                await asyncio.gather(poller, return_exceptions=True)
+        finally:
+            monitor.cancel()
+            await self.stop()
+            await dp.storage.close()
+            await bot.session.close()
+
+    async def stop(self):
+        """Asks workers to finish their queues, then waits for them"""
+        deadline = time.time() + SHARD_HEARTBEAT_TIMEOUT
+        for i, proc in enumerate(self._procs):
+            if proc is not None and proc.is_alive():
+                try:
+                    # Повна черга звільниться, поки воркер її обробляє
+                    await asyncio.to_thread(self._queues[i].put, None, True, max(0.1, deadline - time.time()))
+                except queue_mod.Full:
+                    logger.error(f"Shard {i} didn't take the stop signal in time")
+        for proc in self._procs:
+            if proc is None:
+                continue
+            await asyncio.to_thread(proc.join, max(0.0, deadline - time.time()))
+            if proc.is_alive():
+                proc.kill()
+        logger.info("⏹ Shard supervisor stopped")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    try:
+        asyncio.run(ShardSupervisor().run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,70 @@
+"""
+Oblast geography: centers and approximate road distances between oblasts
+"""
+import math
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# Координати обласних центрів (lat, lon)
+OBLAST_CENTERS: Dict[str, Tuple[float, float]] = {
+    "Вінницька": (49.2331, 28.4682),
+    "Волинська": (50.7472, 25.3254),
+    "Дніпропетровська": (48.4647, 35.0462),
+    "Донецька": (48.0159, 37.8028),
+    "Житомирська": (50.2547, 28.6587),
+    "Закарпатська": (48.6208, 22.2879),
+    "Запорізька": (47.8388, 35.1396),
+    "Івано-Франківська": (48.9226, 24.7111),
+    "Київська": (50.4501, 30.5234),
+    "Кіровоградська": (48.5079, 32.2623),
+    "Луганська": (48.5740, 39.3078),
+    "Львівська": (49.8397, 24.0297),
+    "Миколаївська": (46.9750, 31.9946),
+    "Одеська": (46.4825, 30.7233),
+    "Полтавська": (49.5883, 34.5514),
+    "Рівненська": (50.6199, 26.2516),
+    "Сумська": (50.9077, 34.7981),
+    "Тернопільська": (49.5535, 25.5948),
+    "Харківська": (49.9935, 36.2304),
+    "Херсонська": (46.6354, 32.6169),
+    "Хмельницька": (49.4229, 26.9871),
+    "Черкаська": (49.4444, 32.0598),
+    "Чернівецька": (48.2921, 25.9358),
+    "Чернігівська": (51.4982, 31.2893),
+}
+
+REGIONS: List[str] = list(OBLAST_CENTERS)
+
+# Дороги довші за пряму — усереднений коефіцієнт звивистості
+ROAD_FACTOR = 1.25
+EARTH_RADIUS_KM = 6371.0
+
+
+def _haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+# Матриця відстаней рахується один раз при імпорті (24×24)
+DISTANCE_KM: Dict[str, Dict[str, float]] = {
+    a: {b: round(_haversine_km(ca, cb) * ROAD_FACTOR, 1) for b, cb in OBLAST_CENTERS.items()}
+    for a, ca in OBLAST_CENTERS.items()
+}
+
+
+def distance_km(from_region: str, to_region: str) -> float:
+    """Approximate road distance between oblast centers (inf for unknown regions)"""
+    try:
+        return DISTANCE_KM[from_region][to_region]
+    except KeyError:
+        return 0.0 if from_region == to_region else math.inf
+
+
+@lru_cache(maxsize=None)
+def regions_by_distance(region: str) -> Tuple[Tuple[str, float], ...]:
+    """All oblasts ordered by distance from region (region itself first)"""
+    if region not in DISTANCE_KM:
+        return ((region, 0.0),)
+    return tuple(sorted(DISTANCE_KM[region].items(), key=lambda kv: kv[1]))
@@ -30,6 +30,9 @@ from src.bot.handlers import (
 
 # Імпорт синхронізації
 from src.bot.middlewares.sync import SyncEventProcessor
+from src.bot.services.delivery import shutdown_delivery
+from src.bot.runner import bot_session, run_updates
+from src.bot.fsm_storage import create_storage
 
 # Налаштування логування
 logging.basicConfig(
@@ -67,11 +70,12 @@ async def main():
     # Ініціалізація бота
     bot = Bot(
         token=BOT_TOKEN,
+        session=bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
 
     # Ініціалізація диспетчера
-    dp = Dispatcher()
+    dp = Dispatcher(storage=create_storage())
 
     # Ініціалізація sync processor
     sync_processor = SyncEventProcessor(bot)
@@ -93,20 +97,21 @@ async def main():
     logger.info("🔄 Синхронізація з веб-панеллю активована")
 
     try:
-        # Видалення webhook (якщо був)
-        await bot.delete_webhook(drop_pending_updates=True)
-
         # Запуск sync processor
         await sync_processor.start()
 
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        # Polling або webhook — залежно від BOT_MODE
+        await run_updates(bot, dp)
 
     except Exception as e:
         logger.error(f"❌ Помилка запуску бота: {e}")
     finally:
         # Зупинка sync processor
         await sync_processor.stop()
+        # Досилаємо чергу вихідних повідомлень
+        await shutdown_delivery()
+        # Записуємо відкладені стани FSM
+        await dp.storage.close()
         await bot.session.close()
 
 
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+ETL в аналітичне сховище (DuckDB + Parquet)
+
+Копіює lots, counter_offers, chat_messages, users, shipments з робочої SQLite
+у локальний файл DuckDB (data/analytics.duckdb):
+- chat_messages (велика, лише дописується) — інкрементально, по водяному знаку id;
+- змінювані таблиці (users, lots, counter_offers, shipments) — перечитуються
+  повністю на кожному запуску: статуси і бани оновлюються без updated_at,
+  рядки видаляються, тож інкремент по id/updated_at їх пропускав би.
+Опційно вивантажує таблиці в Parquet, партиціоновані по місяцю created_at.
+
+Оновлення збирається в копії сховища (<analytics>.building) і атомарно
+підміняє файл через os.replace, тож звіти панелі (read_only) ніколи не
+натрапляють на файл, зайнятий записом. Одночасний запуск з панелі, cron чи
+іншого воркера gunicorn відсікається файловим lock-ом (<analytics>.lock).
+
+Звіти панелі читають лише DuckDB і не торкаються бази бота.
+
+Запуск (cron, щоночі):
+    python -m src.database.analytics_etl [--full] [--parquet]
+"""
+import csv
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+ANALYTICS_DB = os.getenv("ANALYTICS_DB", "data/analytics.duckdb")
+ANALYTICS_PARQUET_DIR = os.getenv("ANALYTICS_PARQUET_DIR", "data/analytics_parquet")
+ETL_CHUNK_ROWS = int(os.getenv("ETL_CHUNK_ROWS", "50000"))
+
+# (таблиця, чи змінюються рядки після вставки — такі перечитуються повністю)
+ETL_TABLES: List[Tuple[str, bool]] = [
+    ("users", True),
+    ("lots", True),
+    ("counter_offers", True),
+    ("shipments", True),
+    ("chat_messages", False),
+]
+
+# Важкі агрегати для панелі: назва -> (заголовок, SQL у DuckDB)
+REPORTS: Dict[str, Tuple[str, str]] = {
+    "lots_by_crop": (
+        "Лоти по культурах і місяцях",
+        """SELECT crop, substr(created_at, 1, 7) AS month, type,
+                  count(*) AS lots, round(sum(coalesce(volume, 0)), 1) AS volume,
+                  round(avg(price), 2) AS avg_price
+           FROM lots GROUP BY ALL ORDER BY month DESC, lots DESC LIMIT 500""",
+    ),
+    "offers_funnel": (
+        "Зустрічні пропозиції по статусах",
+        """SELECT substr(created_at, 1, 7) AS month, status, count(*) AS offers,
+                  round(avg(offered_price), 2) AS avg_price
+           FROM counter_offers GROUP BY ALL ORDER BY month DESC, offers DESC""",
+    ),
+    "chat_activity": (
+        "Активність чатів по днях (90 днів)",
+        """SELECT substr(created_at, 1, 10) AS day, count(*) AS messages,
+                  count(DISTINCT session_id) AS sessions, count(DISTINCT sender_user_id) AS senders
+           FROM chat_messages
+           WHERE TRY_CAST(created_at AS TIMESTAMP) >= now() - INTERVAL 90 DAY
+           GROUP BY ALL ORDER BY day DESC""",
+    ),
+    "users_by_region": (
+        "Користувачі по областях і ролях",
+        """SELECT coalesce(region, '—') AS region, coalesce(role, '—') AS role, count(*) AS users,
+                  sum(CASE WHEN is_banned = 1 THEN 1 ELSE 0 END) AS banned
+           FROM users GROUP BY ALL ORDER BY users DESC""",
+    ),
+    "shipment_corridors": (
+        "Топ коридорів перевезень",
+        """SELECT from_region, to_region, count(*) AS shipments,
+                  round(sum(volume_tons), 1) AS tons, round(avg(volume_tons), 1) AS avg_tons
+           FROM shipments GROUP BY ALL ORDER BY tons DESC LIMIT 100""",
+    ),
+}
+
+# Непорожні значення в CSV мають цей префікс: порожній рядок ≠ NULL
+_VALUE_MARK = "="
+
+
+class EtlBusyError(RuntimeError):
+    """Another ETL run holds the lock"""
+
+
+@contextmanager
+def _etl_lock(analytics_path: str) -> Iterator[None]:
+    """Cross-process lock next to the store; raises EtlBusyError if already held"""
+    path = os.path.abspath(analytics_path) + ".lock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    f = open(path, "a+b")
+    try:
+        try:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            raise EtlBusyError("ETL вже виконується")
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        f.close()
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise RuntimeError("Аналітика потребує пакет duckdb: pip install duckdb")
+    return duckdb
+
+
+def _duck_type(sqlite_type: str) -> str:
+    t = (sqlite_type or "").upper()
+    if "INT" in t:
+        return "BIGINT"
+    if any(k in t for k in ("REAL", "FLOA", "DOUB", "NUM", "DEC")):
+        return "DOUBLE"
+    return "VARCHAR"
+
+
+def _sqlite_columns(src: sqlite3.Connection, table: str) -> List[Tuple[str, str]]:
+    return [(r[1], _duck_type(r[2])) for r in src.execute(f"PRAGMA table_info({table})")]
+
+
+def _ensure_meta(duck) -> None:
+    duck.execute(
+        """CREATE TABLE IF NOT EXISTS etl_watermarks (
+            table_name VARCHAR PRIMARY KEY,
+            last_id BIGINT NOT NULL DEFAULT 0,
+            last_updated_at VARCHAR,
+            rows_total BIGINT NOT NULL DEFAULT 0,
+            synced_at TIMESTAMP
+        )"""
+    )
+
+
+def _ensure_table(duck, table: str, columns: List[Tuple[str, str]]) -> None:
+    cols_sql = ", ".join(f'"{name}" {typ}' for name, typ in columns)
+    duck.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols_sql})')
+    existing = {r[0] for r in duck.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?", [table]
+    ).fetchall()}
+    # Нові колонки в SQLite — доганяємо схему
+    for name, typ in columns:
+        if name not in existing:
+            duck.execute(f'ALTER TABLE "{table}" ADD COLUMN "{name}" {typ}')
+
+
+def _load_chunk(duck, table: str, columns: List[Tuple[str, str]], rows: List[sqlite3.Row]) -> None:
+    """Stages a chunk through a temp CSV and appends it"""
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow([name for name, _ in columns])
+            # NULL — порожнє поле, будь-яке значення (і '') — з префіксом
+            writer.writerows(
+                [None if v is None else f"{_VALUE_MARK}{v}" for v in row] for row in rows
+            )
+
+        src = (
+            f"read_csv('{path.replace(chr(39), chr(39) * 2)}', header=true, all_varchar=true, "
+            f"delim=',', quote='\"', escape='\"')"
+        )
+        names = ", ".join(f'"{name}"' for name, _ in columns)
+        casts = ", ".join(f'TRY_CAST(substr("{name}", 2) AS {typ})' for name, typ in columns)
+        duck.execute(f'INSERT INTO "{table}" ({names}) SELECT {casts} FROM {src}')
+    finally:
+        os.remove(path)
+
+
+def _sync_table(src: sqlite3.Connection, duck, table: str, mutable: bool, full: bool) -> Dict[str, int]:
+    columns = _sqlite_columns(src, table)
+    names = [name for name, _ in columns]
+    if "id" not in names:
+        logger.warning(f"ETL: {table} has no id column, skipped")
+        return {"rows": 0}
+
+    if full or mutable:
+        # Змінювані таблиці перезбираються цілком (ми працюємо в копії — читачі не бачать проміжного стану)
+        duck.execute(f'DROP TABLE IF EXISTS "{table}"')
+        duck.execute("DELETE FROM etl_watermarks WHERE table_name = ?", [table])
+    _ensure_table(duck, table, columns)
+
+    mark = duck.execute(
+        "SELECT last_id, last_updated_at FROM etl_watermarks WHERE table_name = ?", [table]
+    ).fetchone()
+    last_id, last_updated = (mark[0], mark[1]) if mark else (0, None)
+
+    # Межа id фіксується на старті — рядки, вставлені під час ETL, підуть наступним запуском
+    max_id = src.execute(f"SELECT coalesce(max(id), 0) FROM {table}").fetchone()[0]
+
+    select = ", ".join(f'"{n}"' for n in names)
+    cursor = src.execute(f"SELECT {select} FROM {table} WHERE id > ? AND id <= ? ORDER BY id", (last_id, max_id))
+    total = 0
+    while True:
+        rows = cursor.fetchmany(ETL_CHUNK_ROWS)
+        if not rows:
+            break
+        _load_chunk(duck, table, columns, rows)
+        total += len(rows)
+
+    new_updated = None
+    if "updated_at" in names:
+        new_updated = src.execute(f"SELECT max(updated_at) FROM {table} WHERE id <= ?", (max_id,)).fetchone()[0]
+    rows_total = duck.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+    duck.execute(
+        """INSERT OR REPLACE INTO etl_watermarks (table_name, last_id, last_updated_at, rows_total, synced_at)
+           VALUES (?, ?, ?, ?, now())""",
+        [table, max(max_id, last_id), new_updated or last_updated, rows_total],
+    )
+    return {"rows": total}
+
+
+def export_parquet(duck, out_dir: str = ANALYTICS_PARQUET_DIR) -> None:
+    """Writes every synced table as Parquet partitioned by created_at month"""
+    os.makedirs(out_dir, exist_ok=True)
+    for table, _ in ETL_TABLES:
+        exists = duck.execute(
+            "SELECT count(*) FROM information_schema.tables WHERE table_name = ?", [table]
+        ).fetchone()[0]
+        if not exists:
+            continue
+        target = os.path.join(out_dir, table).replace("'", "''")
+        duck.execute(
+            f"""COPY (SELECT *, coalesce(substr(CAST(created_at AS VARCHAR), 1, 7), 'unknown') AS month
+                      FROM "{table}")
+                TO '{target}' (FORMAT PARQUET, PARTITION_BY (month), OVERWRITE_OR_IGNORE)"""
+        )
+
+
+def run_etl(db_path: str, analytics_path: str = ANALYTICS_DB, full: bool = False,
+            parquet: bool = False) -> Dict[str, object]:
+    """Copies the bot DB into the analytics store (append-only tables incrementally); returns per-table stats"""
+    duckdb = _duckdb()
+    started = time.perf_counter()
+    with _etl_lock(analytics_path):
+        building = analytics_path + ".building"
+        for stale in (building, building + ".wal"):
+            if os.path.exists(stale):
+                os.remove(stale)
+        # Працюємо з копією: читачі відкривають старий файл, поки нова версія не готова
+        if os.path.exists(analytics_path) and not full:
+            shutil.copyfile(analytics_path, building)
+        try:
+            # Читаємо SQLite лише для читання — бот не блокується
+            src = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+            duck = duckdb.connect(building)
+            try:
+                _ensure_meta(duck)
+                present = {r[0] for r in src.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+                stats: Dict[str, object] = {}
+                for table, mutable in ETL_TABLES:
+                    if table in present:
+                        stats[table] = _sync_table(src, duck, table, mutable, full)["rows"]
+                if parquet:
+                    export_parquet(duck)
+                duck.execute("CHECKPOINT")
+            finally:
+                duck.close()
+                src.close()
+            os.replace(building, analytics_path)
+        except BaseException:
+            if os.path.exists(building):
+                os.remove(building)
+            raise
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"📊 Analytics ETL done: {stats}")
+    return stats
+
+
+def is_running(analytics_path: str = ANALYTICS_DB) -> bool:
+    try:
+        with _etl_lock(analytics_path):
+            return False
+    except EtlBusyError:
+        return True
+
+
+def read_watermarks(analytics_path: str = ANALYTICS_DB) -> List[Dict]:
+    """Current sync state per table (empty list if the store doesn't exist yet)"""
+    if not os.path.exists(analytics_path):
+        return []
+    duck = _duckdb().connect(analytics_path, read_only=True)
+    try:
+        rows = duck.execute(
+            "SELECT table_name, last_id, last_updated_at, rows_total, synced_at FROM etl_watermarks ORDER BY table_name"
+        ).fetchall()
+    finally:
+        duck.close()
+    keys = ("table_name", "last_id", "last_updated_at", "rows_total", "synced_at")
+    return [dict(zip(keys, r)) for r in rows]
+
+
+def run_report(name: str, analytics_path: str = ANALYTICS_DB) -> Tuple[List[str], List[tuple]]:
+    """Runs a named report against the analytics store only"""
+    if name not in REPORTS:
+        raise KeyError(name)
+    if not os.path.exists(analytics_path):
+        raise RuntimeError("Аналітичне сховище ще не створене — запустіть оновлення")
+    duck = _duckdb().connect(analytics_path, read_only=True)
+    try:
+        cur = duck.execute(REPORTS[name][1])
+        cols = [d[0] for d in cur.description]
+        return cols, cur.fetchall()
+    finally:
+        duck.close()
+
+
+def start_background_etl(db_path: str, analytics_path: str = ANALYTICS_DB) -> bool:
+    """Starts run_etl in a daemon thread (for the panel); False if already running"""
+    if is_running(analytics_path):
+        return False
+
+    def _target():
+        try:
+            run_etl(db_path, analytics_path)
+        except EtlBusyError:
+            pass
+        except Exception as e:
+            logger.error(f"Analytics ETL failed: {e}")
+
+    threading.Thread(target=_target, name="analytics-etl", daemon=True).start()
+    return True
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ETL бази бота в аналітичне сховище")
+    parser.add_argument("db_path", nargs="?", default=os.getenv("DB_FILE", "data/agro_bot.db"))
+    parser.add_argument("--analytics", default=ANALYTICS_DB)
+    parser.add_argument("--full", action="store_true", help="перезібрати таблиці з нуля")
+    parser.add_argument("--parquet", action="store_true", help="додатково вивантажити Parquet")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = run_etl(args.db_path, args.analytics, full=args.full, parquet=args.parquet)
+    print(f"✅ ETL: {result}")
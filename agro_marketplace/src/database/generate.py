@@ -0,0 +1,739 @@
+# -*- coding: utf-8 -*-
+"""
+Генератор синтетичного датасету для бенчмарків і навантажувальних тестів
+
+Заповнює схему бота правдоподібними даними потрібного обсягу:
+users (ролі, області), lots (суміш культур з market.CROPS), counter_offers,
+chat_sessions + chat_messages + contacts, vehicles, shipments,
+user_subscriptions + payments.
+
+Розподіли:
+- активність користувачів — Парето: ≈20% користувачів дають ≈80% лотів і торгу;
+- області зважені за посівними площами, культури — за часткою в обороті;
+- час — по днях з експоненційним зростанням до --now (останні тижні щільніші)
+  і добовим профілем (пік 9–18); id зростають разом з created_at, як у робочій БД;
+- статуси залежать від віку запису (старі лоти здебільшого закриті).
+
+Той самий --seed і --now дають ті самі дані. Вставка — executemany пачками
+в одній транзакції з journal_mode=OFF, індекси будуються після завантаження.
+
+Запуск:
+    python -m src.database.generate data/bench_100k.db --users 100000 --seed 42
+    python -m src.database.generate data/bench_1m.db --size large
+"""
+import ast
+import json
+import logging
+import math
+import os
+import random
+import sqlite3
+import time
+from array import array
+from bisect import bisect_right
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src.bot import constants as C
+from src.database.migrate import migrate
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOW = "2026-01-01 00:00:00"
+DEFAULT_DAYS = 365
+CHUNK_ROWS = 50_000
+
+SIZE_PRESETS: Dict[str, int] = {
+    "tiny": 1_000,
+    "small": 10_000,
+    "medium": 100_000,
+    "large": 1_000_000,
+}
+
+# Обсяги інших таблиць відносно кількості користувачів
+LOTS_PER_USER = 1.5
+OFFERS_PER_LOT = 1.2
+SESSIONS_PER_OFFER = 0.4
+MESSAGES_PER_SESSION = 12
+VEHICLES_PER_USER = 0.25
+SHIPMENTS_PER_USER = 0.2
+
+ROLE_WEIGHTS = {C.ROLE_FARMER: 52, C.ROLE_BUYER: 30, C.ROLE_LOGISTIC: 15, "user": 3}
+# Ваги областей ≈ посівні площі; прифронтові й окуповані — мало активності
+REGION_WEIGHTS = {
+    "Вінницька": 9, "Полтавська": 9, "Харківська": 6, "Київська": 7, "Черкаська": 7,
+    "Кіровоградська": 7, "Дніпропетровська": 8, "Одеська": 8, "Хмельницька": 6,
+    "Сумська": 5, "Чернігівська": 5, "Миколаївська": 5, "Житомирська": 4,
+    "Тернопільська": 4, "Львівська": 3, "Рівненська": 3, "Волинська": 3,
+    "Запорізька": 3, "Херсонська": 1, "Чернівецька": 1, "Івано-Франківська": 1,
+    "Закарпатська": 0.5, "Донецька": 0.5, "Луганська": 0.2, "м. Київ": 4, "Інша": 0.5,
+}
+CROP_WEIGHTS = {
+    "wheat_1": 2, "wheat_2": 8, "wheat_3": 10, "wheat_4": 4, "corn": 18, "sunflower": 16,
+    "barley": 8, "soy": 7, "pea": 3, "rape": 6, "oat": 1, "rye": 1, "other": 2,
+}
+# Базова ціна, грн/т
+CROP_PRICES = {
+    "wheat_1": 9000, "wheat_2": 8400, "wheat_3": 7900, "wheat_4": 7000, "corn": 7600,
+    "sunflower": 17500, "barley": 7200, "soy": 15500, "pea": 9500, "rape": 19000,
+    "oat": 6500, "rye": 6800, "other": 8000,
+}
+# Статуси лотів за віком: до 30 днів — переважно активні
+LOT_STATUS_YOUNG = {C.LOT_STATUS_ACTIVE: 80, C.LOT_STATUS_CLOSED: 15, "deleted": 5}
+LOT_STATUS_OLD = {C.LOT_STATUS_ACTIVE: 12, C.LOT_STATUS_CLOSED: 58, "archived": 22, "deleted": 8}
+BODY_TYPES = {  # тип кузова: (вага, мін. т, макс. т)
+    C.VEHICLE_TYPE_GRAIN: (60, 22, 40),
+    C.VEHICLE_TYPE_TIPPER: (25, 18, 30),
+    C.VEHICLE_TYPE_TARP: (15, 10, 22),
+}
+VEHICLE_STATUSES = {C.VEHICLE_STATUS_AVAILABLE: 70, C.VEHICLE_STATUS_BUSY: 20, C.VEHICLE_STATUS_INACTIVE: 10}
+SHIPMENT_STATUS_OLD = {
+    C.SHIPMENT_STATUS_COMPLETED: 65, C.SHIPMENT_STATUS_CANCELLED: 20,
+    C.SHIPMENT_STATUS_ACTIVE: 10, C.SHIPMENT_STATUS_IN_PROGRESS: 5,
+}
+PLAN_WEIGHTS = {"free": 85, "basic": 9, "premium": 4.5, "business": 1.5}
+# Добовий профіль активності (година → вага)
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.3, 0.5, 1, 3, 6, 9, 10, 10, 10, 9, 9, 10, 10, 9, 8, 7, 6, 5, 4, 3, 2]
+GROWTH = 1.6  # e^1.6 ≈ 5: в останній день активність у 5 разів вища, ніж у перший
+
+FIRST_NAMES = ["Олександр", "Іван", "Микола", "Сергій", "Василь", "Андрій", "Петро", "Юрій", "Віктор",
+               "Олена", "Наталія", "Ірина", "Тетяна", "Оксана", "Марія", "Дмитро", "Богдан", "Роман"]
+LAST_NAMES = ["Коваленко", "Бондаренко", "Шевченко", "Ткаченко", "Кравченко", "Мельник", "Бойко",
+              "Олійник", "Лисенко", "Мороз", "Поліщук", "Савченко", "Руденко", "Гончаренко", "Марченко"]
+COMPANY_FORMS = ["ТОВ", "ФГ", "ПП", "СФГ", "ФОП"]
+COMPANY_WORDS = ["Агро", "Зерно", "Нива", "Колос", "Поле", "Степ", "Трейд", "Світанок", "Дніпро", "Лан"]
+USERNAME_PREFIXES = ["agro", "farm", "zerno", "pole", "trade", "logist", "ukr"]
+PHONE_CODES = ["50", "63", "66", "67", "68", "73", "93", "95", "96", "97", "98", "99"]
+TOWNS = ["Умань", "Біла Церква", "Кременчук", "Лубни", "Сміла", "Знамʼянка", "Первомайськ",
+         "Бердичів", "Козятин", "Хмільник", "Ніжин", "Прилуки", "Ромни", "Балта", "Подільськ"]
+LOT_COMMENTS = ["Самовивіз", "Можлива доставка", "Ціна з ПДВ", "Ціна без ПДВ", "Торг доречний",
+                "Партія з одного поля", "Документи в наявності", "Оплата по факту"]
+OFFER_MESSAGES = ["Готовий забрати всю партію", "Можемо обговорити", "Оплата одразу",
+                  "Цікавить частина обсягу", "Потрібна доставка"]
+CHAT_PHRASES = ["Добрий день", "Партія ще актуальна?", "Так, актуальна", "Яка вологість?",
+                "Можу скинути аналізи", "Коли можна забрати?", "Домовились", "Дякую",
+                "Яка остаточна ціна?", "Надішліть реквізити", "Машини будуть у четвер", "Ок"]
+
+# Таблиці поза migrate() — схема така сама, як у _ensure_tables хендлерів
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS counter_offers (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        lot_id INTEGER NOT NULL,
+        sender_user_id INTEGER NOT NULL,
+        offered_price REAL NOT NULL,
+        message TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TEXT DEFAULT (datetime('now'))
+    )""",
+    """CREATE TABLE IF NOT EXISTS chat_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user1_id INTEGER NOT NULL,
+        user2_id INTEGER NOT NULL,
+        lot_id INTEGER,
+        offer_id INTEGER,
+        status TEXT NOT NULL DEFAULT 'active',
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS chat_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        sender_user_id INTEGER NOT NULL,
+        message_type TEXT NOT NULL DEFAULT 'text',
+        content TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        contact_user_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(user_id, contact_user_id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS vehicles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        owner_user_id INTEGER NOT NULL,
+        body_type TEXT NOT NULL,
+        capacity_tons REAL NOT NULL,
+        count_units INTEGER NOT NULL DEFAULT 1,
+        base_region TEXT NOT NULL,
+        work_regions TEXT,
+        status TEXT NOT NULL DEFAULT 'available',
+        available_from TEXT,
+        comment TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS shipments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        creator_user_id INTEGER NOT NULL,
+        cargo_type TEXT NOT NULL,
+        volume_tons REAL NOT NULL,
+        from_region TEXT NOT NULL,
+        from_location TEXT,
+        to_region TEXT NOT NULL,
+        to_location TEXT,
+        date_from TEXT,
+        date_to TEXT,
+        required_body_types TEXT,
+        comment TEXT,
+        status TEXT NOT NULL DEFAULT 'active',
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        updated_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS user_subscriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        plan TEXT NOT NULL DEFAULT 'free',
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP,
+        is_active BOOLEAN DEFAULT 1,
+        payment_id TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )""",
+    """CREATE TABLE IF NOT EXISTS payments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        plan TEXT NOT NULL,
+        amount INTEGER NOT NULL,
+        currency TEXT DEFAULT 'UAH',
+        status TEXT DEFAULT 'pending',
+        provider TEXT DEFAULT 'manual',
+        provider_payment_id TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        paid_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id)
+    )""",
+]
+
+# Ті самі індекси, що створюють хендлери на старті бота
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_counter_offers_lot ON counter_offers(lot_id)",
+    "CREATE INDEX IF NOT EXISTS idx_counter_offers_sender ON counter_offers(sender_user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_counter_offers_status ON counter_offers(status)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_sessions_u1 ON chat_sessions(user1_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_sessions_u2 ON chat_sessions(user2_id)",
+    "CREATE INDEX IF NOT EXISTS idx_chat_messages_sess ON chat_messages(session_id)",
+    "CREATE INDEX IF NOT EXISTS idx_contacts_user ON contacts(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_contacts_contact ON contacts(contact_user_id)",
+]
+
+_HANDLERS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "bot", "handlers")
+
+
+def handler_constants(module: str, names: Sequence[str]) -> Dict[str, object]:
+    """
+    Literal constants of a handler module read from its source
+
+    Handlers are not imported on purpose: the package pulls in aiogram
+    and start.py migrates the working DB_FILE at import time.
+    """
+    with open(os.path.join(_HANDLERS_DIR, f"{module}.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    found: Dict[str, object] = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in names:
+                found[name] = ast.literal_eval(node.value)
+    missing = set(names) - set(found)
+    if missing:
+        raise RuntimeError(f"{module}.py: не знайдено {', '.join(sorted(missing))}")
+    return found
+
+
+@dataclass
+class DatasetSize:
+    """Row counts of the generated tables"""
+    users: int
+    lots: int
+    offers: int
+    sessions: int
+    messages: int
+    vehicles: int
+    shipments: int
+
+    @classmethod
+    def for_users(cls, users: int) -> "DatasetSize":
+        lots = int(users * LOTS_PER_USER)
+        offers = int(lots * OFFERS_PER_LOT)
+        sessions = int(offers * SESSIONS_PER_OFFER)
+        return cls(
+            users=users,
+            lots=lots,
+            offers=offers,
+            sessions=sessions,
+            messages=sessions * MESSAGES_PER_SESSION,
+            vehicles=int(users * VEHICLES_PER_USER),
+            shipments=int(users * SHIPMENTS_PER_USER),
+        )
+
+
+class _Weighted:
+    """Weighted choice over a fixed set of values (cumulative weights + bisect)"""
+
+    def __init__(self, weights: Dict[object, float]):
+        self.values = list(weights)
+        self.cum = list(accumulate(weights.values()))
+        self.total = self.cum[-1]
+
+    def pick(self, rng: random.Random):
+        return self.values[bisect_right(self.cum, rng.random() * self.total)]
+
+
+class _Pool:
+    """
+    Users of some roles in id order (= created_at order) with activity weights
+
+    pick(before=t) chooses only among users registered before t, so that
+    nothing is created by a user who did not exist yet.
+    """
+
+    def __init__(self):
+        self.ids = array("l")
+        self.times = array("d")
+        self.cum = array("d")
+
+    def add(self, user_id: int, created: float, weight: float) -> None:
+        self.ids.append(user_id)
+        self.times.append(created)
+        self.cum.append((self.cum[-1] if self.cum else 0.0) + weight)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def pick(self, rng: random.Random, before: Optional[float] = None, exclude: int = 0) -> int:
+        limit = len(self.ids) if before is None else max(1, bisect_right(self.times, before))
+        for _ in range(4):
+            i = bisect_right(self.cum, rng.random() * self.cum[limit - 1], 0, limit)
+            user_id = self.ids[min(i, limit - 1)]
+            if user_id != exclude:
+                return user_id
+        return user_id
+
+
+class DatasetGenerator:
+    """Fills an empty SQLite file with a deterministic synthetic dataset"""
+
+    def __init__(self, db_path: str, size: DatasetSize, seed: int = 42,
+                 days: int = DEFAULT_DAYS, now: str = DEFAULT_NOW, chunk_rows: int = CHUNK_ROWS):
+        self.db_path = db_path
+        self.size = size
+        self.seed = seed
+        self.days = days
+        self.chunk_rows = chunk_rows
+        self.rng = random.Random(seed)
+
+        self._epoch = datetime(1970, 1, 1)
+        self.now = (datetime.fromisoformat(now) - self._epoch).total_seconds()
+        self.start = self.now - days * 86400
+        self._growth_span = math.expm1(GROWTH)
+        self._hours = _Weighted(dict(enumerate(HOUR_WEIGHTS)))
+
+        market = handler_constants("market", ("CROPS", "REGIONS", "LOCATIONS"))
+        plans = handler_constants("subscriptions", ("SUBSCRIPTION_PLANS",))["SUBSCRIPTION_PLANS"]
+        self.crops: List[Tuple[str, str]] = market["CROPS"]
+        self.regions: List[str] = market["REGIONS"]
+        self.locations: List[str] = [name for name, _ in market["LOCATIONS"]]
+        self.plan_prices: Dict[str, int] = {code: plan["price"] for code, plan in plans.items()}
+
+        self._roles = _Weighted(ROLE_WEIGHTS)
+        self._region = _Weighted({r: REGION_WEIGHTS.get(r, 1) for r in self.regions})
+        self._crop = _Weighted({i: CROP_WEIGHTS.get(code, 1) for i, (_, code) in enumerate(self.crops)})
+        self._body = _Weighted({k: v[0] for k, v in BODY_TYPES.items()})
+        self._vehicle_status = _Weighted(VEHICLE_STATUSES)
+        self._lot_young = _Weighted(LOT_STATUS_YOUNG)
+        self._lot_old = _Weighted(LOT_STATUS_OLD)
+        self._shipment_old = _Weighted(SHIPMENT_STATUS_OLD)
+        self._plan = _Weighted({p: w for p, w in PLAN_WEIGHTS.items() if p in self.plan_prices})
+
+        # Стан між таблицями (компактні масиви — мільйони рядків)
+        self.user_region: List[str] = [""]
+        self.user_time = array("d", [0.0])
+        self.user_farmer = bytearray(1)
+        self.farmers = _Pool()
+        self.buyers = _Pool()
+        self.traders = _Pool()  # фермери + покупці
+        self.logistics = _Pool()
+        self.lot_owner = array("l", [0])
+        self.lot_time = array("d", [0.0])
+        self.lot_price = array("d", [0.0])
+        self.lot_crop = bytearray(1)
+        self.lot_sell = bytearray(1)
+        self.lot_active = bytearray(1)
+        self.offer_sender = array("l", [0])
+        self.counts: Dict[str, int] = {}
+
+    # ---------- Час ----------
+
+    def _ts(self, t: float) -> str:
+        return (self._epoch + timedelta(seconds=int(t))).isoformat(" ")
+
+    def _sample_time(self) -> float:
+        # Щільність ∝ e^(GROWTH·x), x∈[0,1] — обернена функція розподілу
+        x = math.log1p(self.rng.random() * self._growth_span) / GROWTH
+        day = min(int(x * self.days), self.days - 1)
+        return self.start + day * 86400 + self._hours.pick(self.rng) * 3600 + self.rng.random() * 3600
+
+    def _sorted_times(self, n: int) -> List[float]:
+        return sorted(self._sample_time() for _ in range(n))
+
+    def _after(self, t: float, mean_seconds: float) -> float:
+        return min(self.now, t + self.rng.expovariate(1.0 / mean_seconds))
+
+    def _activity(self) -> float:
+        # Парето α≈1.16 — правило 80/20; обрізаємо поодинокі викиди
+        return min(self.rng.paretovariate(1.16), 500.0)
+
+    # ---------- Запис ----------
+
+    def _insert(self, conn: sqlite3.Connection, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        total = 0
+        chunk: List[tuple] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_rows:
+                conn.executemany(sql, chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            conn.executemany(sql, chunk)
+            total += len(chunk)
+        self.counts[table] = self.counts.get(table, 0) + total
+        return total
+
+    # ---------- Таблиці ----------
+
+    def _users(self) -> Iterator[tuple]:
+        rng = self.rng
+        for user_id, created in enumerate(self._sorted_times(self.size.users), start=1):
+            role = self._roles.pick(rng)
+            registered = role != "user"  # «user» — не завершив реєстрацію
+            region = self._region.pick(rng) if registered else None
+            self.user_region.append(region or rng.choice(self.regions))
+            self.user_time.append(created)
+            self.user_farmer.append(1 if role == C.ROLE_FARMER else 0)
+            weight = self._activity()
+            if role == C.ROLE_FARMER:
+                self.farmers.add(user_id, created, weight)
+                self.traders.add(user_id, created, weight)
+            elif role == C.ROLE_BUYER:
+                self.buyers.add(user_id, created, weight)
+                self.traders.add(user_id, created, weight)
+            elif role == C.ROLE_LOGISTIC:
+                self.logistics.add(user_id, created, weight)
+
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            company = None
+            if registered and rng.random() < 0.45:
+                company = f"{rng.choice(COMPANY_FORMS)} «{rng.choice(COMPANY_WORDS)}{rng.choice(COMPANY_WORDS).lower()}»"
+            yield (
+                user_id,
+                300_000_000 + user_id * 16 + rng.randrange(16),  # унікальний telegram_id
+                f"{rng.choice(USERNAME_PREFIXES)}_{user_id}" if rng.random() < 0.7 else None,
+                f"{first} {last}",
+                f"+380{rng.choice(PHONE_CODES)}{rng.randrange(10_000_000):07d}" if registered else None,
+                role,
+                region,
+                company,
+                "free",
+                None,
+                1 if rng.random() < 0.005 else 0,
+                self._ts(created),
+            )
+
+    def _lots(self) -> Iterator[tuple]:
+        rng = self.rng
+        for lot_id, created in enumerate(self._sorted_times(self.size.lots), start=1):
+            owner = self.traders.pick(rng, before=created)
+            # Фермери здебільшого продають, покупці — купують
+            sell = rng.random() < (0.85 if self.user_farmer[owner] else 0.15)
+            crop_index = self._crop.pick(rng)
+            crop_name, crop_code = self.crops[crop_index]
+            region = self.user_region[owner] if rng.random() < 0.8 else self._region.pick(rng)
+            volume = round(min(max(rng.lognormvariate(math.log(120), 0.9), 1.0), 20_000.0), 1)
+            price = None
+            if rng.random() >= 0.1:  # 10% — «договірна»
+                price = round(CROP_PRICES.get(crop_code, 8000) * rng.gauss(1.0, 0.07) / 10) * 10
+            age_days = (self.now - created) / 86400
+            status = (self._lot_young if age_days < 30 else self._lot_old).pick(rng)
+            quality = {}
+            if rng.random() < 0.5:
+                quality = {"moisture": round(rng.uniform(10, 16), 1), "trash": round(rng.uniform(0.5, 3), 1)}
+                if crop_code.startswith("wheat"):
+                    quality["protein"] = round(rng.uniform(9.5, 14.5), 1)
+            views = int(min(rng.paretovariate(1.3) * 3 * (1 + age_days / 60), 5000))
+
+            self.lot_owner.append(owner)
+            self.lot_time.append(created)
+            self.lot_price.append(price or CROP_PRICES.get(crop_code, 8000))
+            self.lot_crop.append(crop_index)
+            self.lot_sell.append(1 if sell else 0)
+            self.lot_active.append(1 if status == C.LOT_STATUS_ACTIVE else 0)
+            ts = self._ts(created)
+            yield (
+                lot_id, owner, C.LOT_TYPE_SELL if sell else C.LOT_TYPE_BUY, crop_name, volume, volume,
+                region, rng.choice(self.locations), price,
+                rng.choice(LOT_COMMENTS) if rng.random() < 0.3 else None,
+                json.dumps(quality, ensure_ascii=False), views, status, ts,
+                ts if status == C.LOT_STATUS_ACTIVE else self._ts(self._after(created, 20 * 86400)),
+            )
+
+    def _offer_events(self) -> Tuple[array, array]:
+        """(time, lot_id) of every offer, time-ordered: popular lots get more offers"""
+        rng = self.rng
+        lots = len(self.lot_owner) - 1
+        popularity = list(accumulate(min(rng.paretovariate(1.5), 200.0) for _ in range(lots)))
+        events = []
+        for _ in range(self.size.offers):
+            lot_id = bisect_right(popularity, rng.random() * popularity[-1]) + 1
+            lot_id = min(lot_id, lots)
+            # Торг — переважно в перші дні після публікації
+            events.append((self._after(self.lot_time[lot_id], 3 * 86400), lot_id))
+        events.sort()
+        return array("d", (t for t, _ in events)), array("l", (lot_id for _, lot_id in events))
+
+    def _offers(self, times: array, lot_ids: array) -> Iterator[tuple]:
+        rng = self.rng
+        for offer_id, (created, lot_id) in enumerate(zip(times, lot_ids), start=1):
+            owner = self.lot_owner[lot_id]
+            pool = self.buyers if self.lot_sell[lot_id] else self.farmers
+            sender = pool.pick(rng, before=created, exclude=owner) if len(pool) else self.traders.pick(rng)
+            self.offer_sender.append(sender)
+            if self.lot_active[lot_id] and self.now - created < 14 * 86400:
+                status = "pending" if rng.random() < 0.7 else C.OFFER_STATUS_REJECTED
+            else:
+                status = C.OFFER_STATUS_ACCEPTED if rng.random() < 0.35 else C.OFFER_STATUS_REJECTED
+            price = round(self.lot_price[lot_id] * rng.uniform(0.88, 1.03) / 10) * 10
+            yield (
+                offer_id, lot_id, sender, price,
+                rng.choice(OFFER_MESSAGES) if rng.random() < 0.4 else None,
+                status, self._ts(created),
+            )
+
+    def _chats(self, conn: sqlite3.Connection, times: array, lot_ids: array) -> None:
+        """Sessions start from offers; messages and mutual contacts follow each session"""
+        rng = self.rng
+        offers = len(times)
+        picked = sorted(rng.sample(range(offers), min(self.size.sessions, offers)))
+        per_session = max(self.size.messages / max(len(picked), 1), 1.0)
+        messages: List[tuple] = []
+        contacts: List[tuple] = []
+        seen_pairs = set()
+        message_id = 0
+
+        def sessions() -> Iterator[tuple]:
+            nonlocal message_id
+            for session_id, offer_index in enumerate(picked, start=1):
+                lot_id = lot_ids[offer_index]
+                owner = self.lot_owner[lot_id]
+                peer = self.offer_sender[offer_index + 1]
+                started = self._after(times[offer_index], 3600)
+                t = started
+                count = max(1, int(rng.expovariate(1.0 / per_session) + 0.5))
+                sender = peer
+                for _ in range(count):
+                    t = self._after(t, 1800)
+                    message_id += 1
+                    messages.append((message_id, session_id, sender, "text", rng.choice(CHAT_PHRASES), self._ts(t)))
+                    if rng.random() < 0.7:
+                        sender = owner if sender == peer else peer
+                if len(messages) >= self.chunk_rows:
+                    self._insert(conn, "chat_messages", MESSAGE_COLUMNS, messages)
+                    messages.clear()
+                if rng.random() < 0.4 and (peer, owner) not in seen_pairs:
+                    seen_pairs.add((peer, owner))
+                    seen_pairs.add((owner, peer))
+                    ts = self._ts(started)
+                    contacts.append((peer, owner, C.CONTACT_REQUEST_ACCEPTED, ts))
+                    contacts.append((owner, peer, C.CONTACT_REQUEST_ACCEPTED, ts))
+                status = C.CHAT_STATUS_ACTIVE if self.now - t < 30 * 86400 else C.CHAT_STATUS_ENDED
+                yield (session_id, peer, owner, lot_id, offer_index + 1, status, self._ts(started), self._ts(t))
+
+        self._insert(conn, "chat_sessions", SESSION_COLUMNS, sessions())
+        self._insert(conn, "chat_messages", MESSAGE_COLUMNS, messages)
+        self._insert(conn, "contacts", ("user_id", "contact_user_id", "status", "created_at"), contacts)
+
+    def _vehicles(self) -> Iterator[tuple]:
+        rng = self.rng
+        if not len(self.logistics):
+            return
+        for vehicle_id, created in enumerate(self._sorted_times(self.size.vehicles), start=1):
+            owner = self.logistics.pick(rng, before=created)
+            body = self._body.pick(rng)
+            _, low, high = BODY_TYPES[body]
+            base = self.user_region[owner]
+            work = {base} | {self._region.pick(rng) for _ in range(rng.randrange(4))}
+            ts = self._ts(created)
+            yield (
+                vehicle_id, owner, body, float(rng.randint(low, high)),
+                min(int(rng.expovariate(0.6)) + 1, 30), base, ",".join(sorted(work)),
+                self._vehicle_status.pick(rng),
+                self._ts(self._after(created, 5 * 86400))[:10] if rng.random() < 0.5 else None,
+                rng.choice(TOWNS) if rng.random() < 0.3 else None,
+                ts, ts,
+            )
+
+    def _shipments(self) -> Iterator[tuple]:
+        rng = self.rng
+        for shipment_id, created in enumerate(self._sorted_times(self.size.shipments), start=1):
+            creator = self.traders.pick(rng, before=created)
+            crop_name = self.crops[self._crop.pick(rng)][0]
+            date_from = created + rng.randint(1, 20) * 86400
+            age_days = (self.now - created) / 86400
+            status = C.SHIPMENT_STATUS_ACTIVE if age_days < 14 else self._shipment_old.pick(rng)
+            ts = self._ts(created)
+            yield (
+                shipment_id, creator, crop_name,
+                round(min(max(rng.lognormvariate(math.log(90), 0.8), 5.0), 5000.0), 1),
+                self.user_region[creator], rng.choice(TOWNS), self._region.pick(rng), rng.choice(TOWNS),
+                self._ts(date_from)[:10] if rng.random() < 0.7 else None,
+                self._ts(date_from + rng.randint(0, 7) * 86400)[:10] if rng.random() < 0.5 else None,
+                C.VEHICLE_TYPE_GRAIN if rng.random() < 0.7 else self._body.pick(rng),
+                rng.choice(LOT_COMMENTS) if rng.random() < 0.2 else None,
+                status, ts, ts if status == C.SHIPMENT_STATUS_ACTIVE else self._ts(self._after(created, 7 * 86400)),
+            )
+
+    def _subscriptions(self, conn: sqlite3.Connection) -> None:
+        """Monthly subscription history per paying user (+ payments); users.subscription_* mirror the active one"""
+        rng = self.rng
+        subscriptions: List[tuple] = []
+        payments: List[tuple] = []
+        current: List[tuple] = []
+        month = 30 * 86400
+        for user_id in range(1, self.size.users + 1):
+            plan = self._plan.pick(rng)
+            joined = self.user_time[user_id]
+            if plan == "free" or self.plan_prices.get(plan, 0) <= 0:
+                if rng.random() < 0.6:  # рядок free з'являється після першого відкриття «Підписки»
+                    subscriptions.append((user_id, "free", self._ts(self._after(joined, 86400)), None, 1, None))
+                continue
+            started = self._after(joined, 20 * 86400)
+            periods = min(int(rng.expovariate(1 / 4)) + 1, int((self.now - started) // month) + 1)
+            for i in range(periods):
+                begin = started + i * month
+                end = begin + month
+                payment_id = len(payments) + 1
+                payments.append((
+                    user_id, plan, self.plan_prices[plan], "UAH", "paid", "manual",
+                    f"gen-{self.seed}-{payment_id}", self._ts(begin), self._ts(begin + 60),
+                ))
+                active = 1 if i == periods - 1 and end > self.now else 0
+                subscriptions.append((user_id, plan, self._ts(begin), self._ts(end), active, str(payment_id)))
+                if active:
+                    current.append((plan, self._ts(end), user_id))
+            if len(subscriptions) >= self.chunk_rows:
+                self._flush_subscriptions(conn, subscriptions, payments)
+        self._flush_subscriptions(conn, subscriptions, payments)
+        conn.executemany("UPDATE users SET subscription_plan=?, subscription_until=? WHERE id=?", current)
+
+    def _flush_subscriptions(self, conn: sqlite3.Connection, subscriptions: List[tuple], payments: List[tuple]) -> None:
+        self._insert(conn, "user_subscriptions",
+                     ("user_id", "plan", "started_at", "expires_at", "is_active", "payment_id"), subscriptions)
+        self._insert(conn, "payments",
+                     ("user_id", "plan", "amount", "currency", "status", "provider",
+                      "provider_payment_id", "created_at", "paid_at"), payments)
+        subscriptions.clear()
+        payments.clear()
+
+    # ---------- Запуск ----------
+
+    def run(self) -> Dict[str, int]:
+        migrate(self.db_path, verbose=False)
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            for pragma in ("journal_mode=OFF", "synchronous=OFF", "cache_size=-262144",
+                           "temp_store=MEMORY", "locking_mode=EXCLUSIVE"):
+                conn.execute(f"PRAGMA {pragma}")
+            for ddl in SCHEMA:
+                conn.execute(ddl)
+            conn.execute("BEGIN")
+
+            started = time.perf_counter()
+            self._insert(conn, "users", USER_COLUMNS, self._users())
+            self._insert(conn, "lots", LOT_COLUMNS, self._lots())
+            started = self._log_step("користувачі і лоти", started)
+
+            times, lot_ids = self._offer_events()
+            self._insert(conn, "counter_offers", OFFER_COLUMNS, self._offers(times, lot_ids))
+            self._chats(conn, times, lot_ids)
+            started = self._log_step("торг і чати", started)
+
+            self._insert(conn, "vehicles", VEHICLE_COLUMNS, self._vehicles())
+            self._insert(conn, "shipments", SHIPMENT_COLUMNS, self._shipments())
+            self._subscriptions(conn)
+            conn.execute("COMMIT")
+            started = self._log_step("логістика і підписки", started)
+
+            for ddl in INDEXES:
+                conn.execute(ddl)
+            self._log_step("індекси", started)
+            conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            conn.close()
+        return dict(self.counts)
+
+    @staticmethod
+    def _log_step(name: str, started: float) -> float:
+        now = time.perf_counter()
+        logger.info(f"  {name}: {now - started:.1f} с")
+        return now
+
+
+USER_COLUMNS = ("id", "telegram_id", "username", "full_name", "phone", "role", "region", "company",
+                "subscription_plan", "subscription_until", "is_banned", "created_at")
+LOT_COLUMNS = ("id", "owner_user_id", "type", "crop", "volume_tons", "volume", "region", "location", "price",
+               "comment", "quality_json", "views_count", "status", "created_at", "updated_at")
+OFFER_COLUMNS = ("id", "lot_id", "sender_user_id", "offered_price", "message", "status", "created_at")
+SESSION_COLUMNS = ("id", "user1_id", "user2_id", "lot_id", "offer_id", "status", "created_at", "updated_at")
+MESSAGE_COLUMNS = ("id", "session_id", "sender_user_id", "message_type", "content", "created_at")
+VEHICLE_COLUMNS = ("id", "owner_user_id", "body_type", "capacity_tons", "count_units", "base_region",
+                   "work_regions", "status", "available_from", "comment", "created_at", "updated_at")
+SHIPMENT_COLUMNS = ("id", "creator_user_id", "cargo_type", "volume_tons", "from_region", "from_location",
+                    "to_region", "to_location", "date_from", "date_to", "required_body_types", "comment",
+                    "status", "created_at", "updated_at")
+
+
+def generate(db_path: str, size: DatasetSize, seed: int = 42, days: int = DEFAULT_DAYS,
+             now: str = DEFAULT_NOW, force: bool = False) -> Dict[str, int]:
+    """Creates db_path and fills it; refuses to touch an existing file unless force"""
+    if os.path.exists(db_path):
+        if not force:
+            raise FileExistsError(f"{db_path} вже існує (--force, щоб перезаписати)")
+        os.remove(db_path)
+    started = time.perf_counter()
+    counts = DatasetGenerator(db_path, size, seed=seed, days=days, now=now).run()
+    logger.info(f"✅ {db_path}: {sum(counts.values()):,} рядків за {time.perf_counter() - started:.1f} с")
+    return counts
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Синтетичний датасет для бенчмарків")
+    parser.add_argument("db", help="шлях до нового файлу SQLite")
+    parser.add_argument("--size", choices=sorted(SIZE_PRESETS, key=SIZE_PRESETS.get), default="small",
+                        help="пресет кількості користувачів")
+    parser.add_argument("--users", type=int, help="кількість користувачів (замість --size)")
+    for table in ("lots", "offers", "sessions", "messages", "vehicles", "shipments"):
+        parser.add_argument(f"--{table}", type=int, help=f"кількість {table} (за замовчуванням — пропорційно)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=DEFAULT_DAYS, help="глибина історії, днів")
+    parser.add_argument("--now", default=DEFAULT_NOW, help="момент «зараз» для часових міток")
+    parser.add_argument("--force", action="store_true", help="перезаписати існуючий файл")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    size = DatasetSize.for_users(args.users or SIZE_PRESETS[args.size])
+    for table in ("lots", "offers", "sessions", "messages", "vehicles", "shipments"):
+        if getattr(args, table) is not None:
+            setattr(size, table, getattr(args, table))
+    logger.info(f"🌱 Генерація {args.db} (seed={args.seed}): {asdict(size)}")
+    result = generate(args.db, size, seed=args.seed, days=args.days, now=args.now, force=args.force)
+    for table, count in result.items():
+        print(f"  {table:20} {count:>12,}")
@@ -55,11 +55,18 @@ LOTS_COLUMNS: List[Tuple[str, str]] = [
     ("owner_user_id", "INTEGER NOT NULL"),
     ("type", "TEXT NOT NULL"),
     ("crop", "TEXT NOT NULL"),
-    ("volume", "REAL NOT NULL"),
+    # Та сама схема, що й у market._ensure_tables (обсяг пишеться у volume_tons)
+    ("volume_tons", "REAL NOT NULL DEFAULT 0"),
+    ("volume", "REAL"),
     ("price", "REAL"),
     ("region", "TEXT NOT NULL"),
+    ("location", "TEXT"),
+    ("comment", "TEXT"),
+    ("quality_json", "TEXT NOT NULL DEFAULT '{}'"),
+    ("views_count", "INTEGER NOT NULL DEFAULT 0"),
     ("status", "TEXT DEFAULT 'active'"),
     ("created_at", "TEXT DEFAULT CURRENT_TIMESTAMP"),
+    ("updated_at", "TEXT"),
 ]
 
 SETTINGS_COLUMNS: List[Tuple[str, str]] = [
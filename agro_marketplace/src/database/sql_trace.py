@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+Інструментування SQL для бота (aiosqlite) і веб-панелі (sqlite3)
+
+Вмикається змінною SQL_TRACE=1. Кожен запит записується за «відбитком»
+(fingerprint) — текстом SQL без літералів і зі стиснутими пробілами, тож
+`WHERE id = 5` і `WHERE id = 7` — один рядок статистики:
+- кількість, сумарний і максимальний час, повернуті рядки (з fetch*);
+- запити, довші за SQL_SLOW_MS, логуються з планом EXPLAIN QUERY PLAN
+  (не частіше ніж раз на SQL_LOG_INTERVAL секунд для одного відбитка);
+- запити групуються в «область» — оновлення бота або запит панелі; на її
+  завершенні рахується кількість запитів, а відбиток, виконаний більше ніж
+  SQL_REPEAT_THRESHOLD разів, позначається як N+1 (запит у циклі).
+
+Підключення:
+- бот — install_aiosqlite() підміняє aiosqlite.connect, а SqlTraceMiddleware
+  (src/bot/middlewares/sql_trace.py) відкриває область на кожне оновлення;
+- панель — traced(factory) для sqlite3.connect і область на кожен запит Flask.
+
+Статистика процесу — registry.snapshot(); бот додає її до знімків метрик.
+"""
+import contextvars
+import functools
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SQL_TRACE = os.getenv("SQL_TRACE", "0").strip().lower() in ("1", "true", "yes", "on")
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "50"))
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "10"))
+SQL_LOG_INTERVAL = float(os.getenv("SQL_LOG_INTERVAL", "60"))
+# Ліміт відбитків у статистиці; решта — в один рядок "other"
+SQL_MAX_FINGERPRINTS = int(os.getenv("SQL_MAX_FINGERPRINTS", "1000"))
+
+OVERFLOW_FINGERPRINT = "other"
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(sql: str) -> str:
+    """SQL without literals and extra whitespace; IN (?, ?, ?) → IN (?...)"""
+    text = _COMMENT.sub(" ", sql)
+    text = _STRING.sub("?", text)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("(?...)", text)
+    return _SPACE.sub(" ", text).strip().rstrip(";").strip()
+
+
+# ---------- Статистика ----------
+
+class _QueryStats:
+    __slots__ = ("count", "seconds", "max_seconds", "rows", "slow", "repeated")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.repeated = 0
+
+
+class _ScopeStats:
+    __slots__ = ("scopes", "statements", "max_statements", "seconds")
+
+    def __init__(self):
+        self.scopes = 0
+        self.statements = 0
+        self.max_statements = 0
+        self.seconds = 0.0
+
+
+class SqlRegistry:
+    """Per-fingerprint and per-scope statistics of this process (thread-safe)"""
+
+    def __init__(self, max_fingerprints: int = SQL_MAX_FINGERPRINTS):
+        self.max_fingerprints = max_fingerprints
+        self.queries: Dict[str, _QueryStats] = {}
+        self.scopes: Dict[str, _ScopeStats] = {}
+        self._lock = threading.Lock()
+        self._logged: Dict[str, float] = {}
+
+    def _query(self, fp: str) -> _QueryStats:
+        stats = self.queries.get(fp)
+        if stats is None:
+            if len(self.queries) >= self.max_fingerprints:
+                fp = OVERFLOW_FINGERPRINT
+                stats = self.queries.get(fp)
+            if stats is None:
+                stats = self.queries[fp] = _QueryStats()
+        return stats
+
+    def add(self, fp: str, seconds: float, rows: int, executed: bool, total: float, slow: bool) -> None:
+        with self._lock:
+            stats = self._query(fp)
+            if executed:
+                stats.count += 1
+            stats.seconds += seconds
+            stats.rows += rows
+            if total > stats.max_seconds:
+                stats.max_seconds = total
+            if slow:
+                stats.slow += 1
+
+    def add_scope(self, name: str, statements: int, seconds: float, repeated: Dict[str, int]) -> None:
+        with self._lock:
+            stats = self.scopes.get(name)
+            if stats is None:
+                if len(self.scopes) >= self.max_fingerprints:
+                    name = OVERFLOW_FINGERPRINT
+                    stats = self.scopes.get(name)
+                if stats is None:
+                    stats = self.scopes[name] = _ScopeStats()
+            stats.scopes += 1
+            stats.statements += statements
+            stats.seconds += seconds
+            if statements > stats.max_statements:
+                stats.max_statements = statements
+            for fp in repeated:
+                self._query(fp).repeated += 1
+
+    def should_log(self, key: str) -> bool:
+        """Rate limit for slow / N+1 log lines: once per SQL_LOG_INTERVAL per key"""
+        now = time.monotonic()
+        with self._lock:
+            last = self._logged.get(key)
+            if last is not None and now - last < SQL_LOG_INTERVAL:
+                return False
+            if len(self._logged) >= self.max_fingerprints:
+                self._logged.clear()
+            self._logged[key] = now
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queries": [
+                    {"fingerprint": fp, "count": s.count, "seconds": round(s.seconds, 6),
+                     "max_seconds": round(s.max_seconds, 6), "rows": s.rows, "slow": s.slow,
+                     "repeated": s.repeated}
+                    for fp, s in self.queries.items()
+                ],
+                "scopes": [
+                    {"name": name, "scopes": s.scopes, "statements": s.statements,
+                     "max_statements": s.max_statements, "seconds": round(s.seconds, 6)}
+                    for name, s in self.scopes.items()
+                ],
+            }
+
+
+registry = SqlRegistry()
+
+
+# ---------- Області (оновлення / запит) ----------
+
+class TraceScope:
+    """Statements of one update or panel request; N+1 check on close"""
+
+    __slots__ = ("name", "resolve", "counts", "statements", "seconds", "closed", "_token")
+
+    def __init__(self, name: str = "-", resolve: Optional[Callable[[], str]] = None):
+        self.name = name
+        # Назва, відома лише під час обробки (хендлер оновлення)
+        self.resolve = resolve
+        self.counts: Counter = Counter()
+        self.statements = 0
+        self.seconds = 0.0
+        self.closed = False
+        self._token = None
+
+    @property
+    def label(self) -> str:
+        return self.resolve() if self.resolve is not None else self.name
+
+    def add(self, fp: str) -> None:
+        self.counts[fp] += 1
+        self.statements += 1
+
+    def open(self) -> "TraceScope":
+        self._token = _current.set(self)
+        return self
+
+    def close(self) -> None:
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        self.closed = True
+        label = self.label
+        repeated = {fp: n for fp, n in self.counts.items() if n > SQL_REPEAT_THRESHOLD}
+        registry.add_scope(label, self.statements, self.seconds, repeated)
+        for fp, n in repeated.items():
+            if registry.should_log(f"repeat:{label}:{fp}"):
+                logger.warning(f"🔁 N+1: {label} виконав запит {n} разів: {fp}")
+
+    def __enter__(self) -> "TraceScope":
+        return self.open()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+_current: contextvars.ContextVar[Optional[TraceScope]] = contextvars.ContextVar("sql_trace_scope", default=None)
+
+
+def current_scope() -> Optional[TraceScope]:
+    return _current.get()
+
+
+# ---------- Курсор і зʼєднання ----------
+
+class _Statement:
+    __slots__ = ("fingerprint", "sql", "parameters", "seconds", "rows", "scope", "slow")
+
+    def __init__(self, sql: str, parameters: Any, scope: Optional[TraceScope]):
+        self.fingerprint = fingerprint(sql)
+        self.sql = sql
+        self.parameters = parameters
+        self.seconds = 0.0
+        self.rows = 0
+        self.scope = scope if scope is not None and not scope.closed else None
+        self.slow = False
+
+
+def _explain(conn: sqlite3.Connection, sql: str, parameters: Any) -> str:
+    # executemany / executescript — без параметрів для плану
+    if parameters is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return ""
+    try:
+        # Звичайний курсор — сам EXPLAIN не потрапляє в статистику
+        rows = sqlite3.Connection.cursor(conn, sqlite3.Cursor).execute(
+            "EXPLAIN QUERY PLAN " + sql, parameters
+        ).fetchall()
+    except sqlite3.Error as e:
+        return f"(EXPLAIN недоступний: {e})"
+    depth: Dict[int, int] = {}
+    lines = []
+    for row in rows:
+        node, parent, detail = row[0], row[1], row[3]
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return "\n".join(lines)
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that times execute/fetch and counts returned rows"""
+
+    _statement: Optional[_Statement] = None
+
+    def _track(self, sql: str, parameters: Any, seconds: float) -> None:
+        conn = self.connection
+        statement = self._statement = _Statement(sql, parameters, getattr(conn, "trace_scope", None) or _current.get())
+        if statement.scope is not None:
+            statement.scope.add(statement.fingerprint)
+        self._add(seconds, 0, executed=True)
+
+    def _add(self, seconds: float, rows: int, executed: bool = False) -> None:
+        statement = self._statement
+        if statement is None:
+            return
+        statement.seconds += seconds
+        statement.rows += rows
+        if statement.scope is not None:
+            statement.scope.seconds += seconds
+        slow = not statement.slow and statement.seconds * 1000 >= SQL_SLOW_MS
+        registry.add(statement.fingerprint, seconds, rows, executed, statement.seconds, slow)
+        if slow:
+            statement.slow = True
+            if registry.should_log(f"slow:{statement.fingerprint}"):
+                plan = _explain(self.connection, statement.sql, statement.parameters)
+                scope = statement.scope.label if statement.scope is not None else "-"
+                logger.warning(
+                    f"🐢 Повільний запит {statement.seconds * 1000:.1f} мс ({scope}): "
+                    f"{statement.fingerprint}" + (f"\n{plan}" if plan else "")
+                )
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._track(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._track(sql, None, time.perf_counter() - started)
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            self._track(sql_script, None, time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(time.perf_counter() - started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._add(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(time.perf_counter() - started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._add(time.perf_counter() - started, 0)
+            raise
+        self._add(time.perf_counter() - started, 1)
+        return row
+
+
+class _TracedConnectionMixin:
+    """Routes Connection.execute* through TracedCursor (the C shortcuts bypass cursor())"""
+
+    # Область, у якій відкрито зʼєднання (aiosqlite виконує запити в іншому потоці)
+    trace_scope: Optional[TraceScope] = None
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+@functools.lru_cache(maxsize=64)
+def traced(factory=sqlite3.Connection):
+    """Connection factory with statement tracing, for sqlite3.connect(factory=...)"""
+    return type(f"Traced{factory.__name__}", (_TracedConnectionMixin, factory), {})
+
+
+# ---------- aiosqlite ----------
+
+_original_connect = None
+
+
+def install_aiosqlite() -> None:
+    """Makes aiosqlite.connect return traced connections bound to the current scope"""
+    global _original_connect
+    import aiosqlite
+
+    if _original_connect is not None:
+        return
+    _original_connect = aiosqlite.connect
+
+    def connect(database, *, iter_chunk_size=64, **kwargs):
+        # Область фіксується тут: потік aiosqlite не бачить contextvars задачі
+        scope = _current.get()
+        factory = traced(kwargs.pop("factory", sqlite3.Connection))
+        location = database.decode("utf-8") if isinstance(database, bytes) else os.fspath(database)
+
+        def connector() -> sqlite3.Connection:
+            conn = sqlite3.connect(location, factory=factory, **kwargs)
+            conn.trace_scope = scope
+            return conn
+
+        return aiosqlite.Connection(connector, iter_chunk_size)
+
+    aiosqlite.connect = connect
+    logger.info(f"🔍 SQL trace: повільні запити ≥ {SQL_SLOW_MS:g} мс, N+1 > {SQL_REPEAT_THRESHOLD} повторів")
@@ -0,0 +1,7 @@
+"""
+Інструменти навантажувального тестування бота без Telegram
+
+fake_api.py — локальний замінник Bot API (getUpdates / webhook, sendMessage,
+editMessageText, answerCallbackQuery ...);
+loadgen.py — генератор навантаження з віртуальними користувачами.
+"""
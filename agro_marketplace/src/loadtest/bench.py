@@ -0,0 +1,403 @@
+"""
+Bench - мікробенчмарки гарячих функцій доступу до даних і рендерингу
+
+Кожен набір даних (src/database/generate.py, пресети --sizes) проганяється
+в окремому процесі на власній копії БД (prepare_workdir з loadgen.py):
+модулі бота читають DB_FILE під час імпорту, а частина викликів змінює базу
+(get_user_subscription деактивує прострочені підписки).
+
+Вимірюються:
+- start.get_user_row, subscriptions.get_user_subscription, check_lot_limit;
+- хендлери start.counteroffers і market.exchange_offers цілком (запити +
+  форматування), без мережі: сесія бота відповідає локально;
+- BanCheckMiddleware на Message;
+- market.format_lot_text і logistics._vehicle_text (пачками — це мікросекунди);
+- панель: dashboard() і пошук users_page через Flask test client,
+  з очищеним panel_cache (тобто вартість запитів, а не кешу).
+
+Користувачі й лоти для викликів вибираються детерміновано з --seed.
+Результат — JSON (p50/p95/p99/mean у мікросекундах на виклик). З --baseline
+порівнює --metric із попереднім прогоном і завершується з кодом 1, якщо
+регресія більша за --max-regression %. Повільні випадки з малою кількістю
+замірів (< MIN_SAMPLES) порівнюються за p50 і позначаються «*».
+
+Запуск:
+    python -m src.loadtest.bench --sizes tiny,small,medium --json bench.json
+    python -m src.loadtest.bench --json bench_new.json --baseline bench.json --max-regression 15
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from src.loadtest.loadgen import PROJECT_ROOT, percentile, prepare_workdir
+
+logger = logging.getLogger(__name__)
+
+BENCH_DATASET_DIR = os.getenv("BENCH_DATASET_DIR", str(PROJECT_ROOT / "data" / "bench"))
+DEFAULT_SIZES = "tiny,small,medium"
+CASE_SECONDS = 1.0
+MIN_ITERATIONS = 30
+MIN_SLOW_ITERATIONS = 5
+CASE_MAX_SECONDS = 30.0
+MAX_ITERATIONS = 100_000
+WARMUP = 3
+SAMPLE_USERS = 256
+# Менше замірів (повільні випадки, MIN_SLOW_ITERATIONS) — хвости ненадійні, порівнюємо медіану
+MIN_SAMPLES = 20
+BENCH_BOT_TOKEN = "123456:BENCHMARK"
+
+
+@dataclass
+class Case:
+    """One benchmarked call; fn(i) gets the iteration number to rotate inputs"""
+    name: str
+    fn: Callable[[int], Any]
+    inner: int = 1  # викликів на один замір (для мікросекундних функцій)
+    setup: Optional[Callable[[], Any]] = None  # перед кожним заміром, не враховується
+
+
+async def measure(case: Case, seconds: float) -> Dict[str, Any]:
+    """Per-call latency samples until the time budget and MIN_ITERATIONS are both met
+
+    Cases slower than CASE_MAX_SECONDS in total stop after MIN_SLOW_ITERATIONS.
+    """
+    samples: List[float] = []
+    iteration = 0
+    started = time.perf_counter()
+    while len(samples) < MAX_ITERATIONS:
+        elapsed = time.perf_counter() - started
+        if len(samples) >= MIN_ITERATIONS and elapsed >= seconds:
+            break
+        # Дуже повільні випадки (секунди на виклик) — досить кількох замірів
+        if len(samples) >= MIN_SLOW_ITERATIONS and elapsed >= CASE_MAX_SECONDS:
+            break
+        if case.setup is not None:
+            case.setup()
+        t0 = time.perf_counter_ns()
+        for j in range(case.inner):
+            result = case.fn(iteration * case.inner + j)
+            if inspect.isawaitable(result):
+                await result
+        elapsed_us = (time.perf_counter_ns() - t0) / 1000 / case.inner
+        if iteration >= WARMUP:
+            samples.append(elapsed_us)
+        iteration += 1
+
+    mean = sum(samples) / len(samples)
+    return {
+        "samples": len(samples),
+        "calls": len(samples) * case.inner,
+        "mean_us": round(mean, 2),
+        "min_us": round(min(samples), 2),
+        "p50_us": round(percentile(samples, 50), 2),
+        "p95_us": round(percentile(samples, 95), 2),
+        "p99_us": round(percentile(samples, 99), 2),
+        "ops_per_s": round(1_000_000 / mean, 1) if mean else 0.0,
+    }
+
+
+# ---------- Набори викликів (у процесі-воркері) ----------
+
+def _sample(db_path: str, rng: random.Random) -> Dict[str, Any]:
+    """Deterministic inputs: traders, lot owners, lots and vehicles from the dataset"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        traders = [r[0] for r in conn.execute(
+            "SELECT telegram_id FROM users WHERE role IN ('farmer', 'buyer') AND is_banned=0 ORDER BY id")]
+        owners = [r[0] for r in conn.execute(
+            """SELECT DISTINCT u.telegram_id FROM users u JOIN lots l ON l.owner_user_id = u.id
+               WHERE l.status = 'active' AND u.is_banned = 0 ORDER BY u.id""")]
+        max_lot = conn.execute("SELECT MAX(id) FROM lots").fetchone()[0] or 0
+        lot_ids = sorted({rng.randint(1, max_lot) for _ in range(SAMPLE_USERS)}) if max_lot else []
+        lots = [dict(r) for r in conn.execute(
+            f"SELECT * FROM lots WHERE id IN ({','.join('?' * len(lot_ids))})", lot_ids)] if lot_ids else []
+        vehicles = conn.execute("SELECT * FROM vehicles ORDER BY id LIMIT ?", (SAMPLE_USERS,)).fetchall()
+        names = [r[0] for r in conn.execute(
+            "SELECT full_name FROM users WHERE full_name IS NOT NULL ORDER BY id LIMIT 1000")]
+        counts = {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                  for t in ("users", "lots", "counter_offers", "chat_messages")}
+    finally:
+        conn.close()
+
+    def pick(values: List[Any]) -> List[Any]:
+        return rng.sample(values, min(SAMPLE_USERS, len(values))) if values else []
+
+    # Пошук у панелі: частина прізвища (LIKE '%...%') і фрагмент telegram_id
+    queries = [name.split()[-1][:5] for name in pick(names)[:32]] + [str(t)[3:8] for t in pick(traders)[:32]]
+    return {
+        "traders": pick(traders), "owners": pick(owners), "lots": lots,
+        "vehicles": vehicles, "queries": queries, "counts": counts,
+    }
+
+
+def _bot_cases(inputs: Dict[str, Any]) -> List[Case]:
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+    from aiogram.types import Message
+
+    from src.bot.handlers import logistics, market, start, subscriptions
+    from src.bot.middlewares.ban_check import BanCheckMiddleware
+
+    bot = Bot(token=BENCH_BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+
+    async def no_network(make_request, bot, method):
+        # Відповіді Telegram не потрібні — хендлери не читають результат answer()
+        return True
+
+    bot.session.middleware(no_network)
+
+    def message(telegram_id: int, text: str) -> Message:
+        return Message.model_validate({
+            "message_id": 1, "date": 0, "text": text,
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": {"id": telegram_id, "is_bot": False, "first_name": "Bench"},
+        }, context={"bot": bot})
+
+    traders = inputs["traders"]
+    owners = inputs["owners"] or traders
+    lots = inputs["lots"]
+    vehicles = inputs["vehicles"]
+    owner_messages = [message(t, "🔁 Зустрічні") for t in owners]
+    market_messages = [message(t, "💰 Біржові пропозиції") for t in traders]
+    ban_messages = [message(t, "🌾 Маркет") for t in traders]
+    ban_middleware = BanCheckMiddleware()
+
+    async def passthrough(event, data):
+        return None
+
+    cases = [
+        Case("get_user_row", lambda i: start.get_user_row(traders[i % len(traders)])),
+        Case("get_user_subscription", lambda i: subscriptions.get_user_subscription(traders[i % len(traders)])),
+        Case("check_lot_limit", lambda i: subscriptions.check_lot_limit(traders[i % len(traders)])),
+        Case("counteroffers", lambda i: start.counteroffers(owner_messages[i % len(owner_messages)])),
+        Case("exchange_offers", lambda i: market.exchange_offers(market_messages[i % len(market_messages)])),
+        Case("ban_middleware", lambda i: ban_middleware(passthrough, ban_messages[i % len(ban_messages)], {})),
+    ]
+    if lots:
+        cases.append(Case("format_lot_text", lambda i: market.format_lot_text(lots[i % len(lots)]), inner=200))
+    if vehicles:
+        cases.append(Case("vehicle_text", lambda i: logistics._vehicle_text(vehicles[i % len(vehicles)]), inner=200))
+    return cases
+
+
+def _panel_cases(inputs: Dict[str, Any]) -> List[Case]:
+    try:
+        from config.settings import ADMIN_PASS, ADMIN_USER
+        from src.web_panel.app import create_app
+        from src.web_panel.cache import panel_cache
+    except ImportError as e:
+        logger.warning(f"Панель пропущено (не встановлено залежності web): {e}")
+        return []
+
+    app = create_app()
+    app.config["TESTING"] = True
+    client = app.test_client()
+    client.post("/login", data={"username": ADMIN_USER, "password": ADMIN_PASS})
+    queries = inputs["queries"] or [""]
+
+    def get(url: str) -> None:
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url}: HTTP {response.status_code}")
+
+    return [
+        Case("panel.dashboard", lambda i: get("/dashboard"), setup=panel_cache.clear),
+        Case("panel.users_search", lambda i: get(f"/users?q={queries[i % len(queries)]}"), setup=panel_cache.clear),
+    ]
+
+
+async def run_cases(db_path: str, seconds: float, seed: int, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    inputs = _sample(db_path, random.Random(seed))
+    cases = _bot_cases(inputs) + _panel_cases(inputs)
+    if only:
+        cases = [c for c in cases if c.name in only]
+
+    results: Dict[str, Any] = {}
+    for case in cases:
+        try:
+            results[case.name] = await measure(case, seconds)
+        except Exception as e:
+            logger.error(f"{case.name}: {type(e).__name__}: {e}")
+            results[case.name] = {"error": f"{type(e).__name__}: {e}"}
+        else:
+            r = results[case.name]
+            logger.info(f"  {case.name:<24} p50 {r['p50_us']:>10} µs  p95 {r['p95_us']:>10} µs")
+    return {"rows": inputs["counts"], "cases": results}
+
+
+def worker_main(args) -> None:
+    """Child process: private DB copy, cwd and panel cache, then all cases"""
+    workdir = tempfile.mkdtemp(prefix="agro_bench_")
+    os.environ["PANEL_CACHE_FILE"] = os.path.join(workdir, "panel_cache.db")
+    os.environ["BOT_BACKGROUND_JOBS"] = "0"
+    os.environ.setdefault("BOT_TOKEN", BENCH_BOT_TOKEN)
+    try:
+        db_path = prepare_workdir(workdir, args.worker)
+        result = asyncio.run(run_cases(db_path, args.seconds, args.seed, args.only))
+    finally:
+        os.chdir(PROJECT_ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+# ---------- Набори даних, прогін, порівняння ----------
+
+def ensure_dataset(size: str, seed: int) -> str:
+    """Generated dataset for a preset, cached in BENCH_DATASET_DIR"""
+    from src.database.generate import SIZE_PRESETS, DatasetSize, generate
+
+    path = os.path.join(BENCH_DATASET_DIR, f"{size}-s{seed}.db")
+    if not os.path.exists(path):
+        os.makedirs(BENCH_DATASET_DIR, exist_ok=True)
+        logger.info(f"🌱 Генерація набору {size} ({SIZE_PRESETS[size]:,} користувачів) → {path}")
+        partial = path + ".tmp"
+        generate(partial, DatasetSize.for_users(SIZE_PRESETS[size]), seed=seed, force=True)
+        os.replace(partial, path)
+    return path
+
+
+def run_dataset(size: str, db_path: str, args) -> Dict[str, Any]:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        out = tmp.name
+    cmd = [sys.executable, "-m", "src.loadtest.bench", "--worker", db_path, "--json", out,
+           "--seconds", str(args.seconds), "--seed", str(args.seed)]
+    if args.only:
+        cmd += ["--only", ",".join(args.only)]
+    logger.info(f"▶️  {size}: {db_path}")
+    try:
+        subprocess.run(cmd, cwd=str(PROJECT_ROOT), check=True)
+        with open(out, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        os.unlink(out)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(PROJECT_ROOT),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], metric: str, max_regression: float) -> List[str]:
+    """Regressions of metric beyond max_regression percent, as printable lines"""
+    regressions = []
+    print()
+    print(f"{'dataset/case':<40}{'base':>12}{'new':>12}{'delta':>9}")
+    for size, data in report["datasets"].items():
+        old_cases = baseline.get("datasets", {}).get(size, {}).get("cases", {})
+        for name, new in data["cases"].items():
+            old = old_cases.get(name)
+            if not old or "error" in new or "error" in old:
+                continue
+            # Мало замірів — порівнюємо медіану і позначаємо «*»
+            few = new["samples"] < MIN_SAMPLES or old["samples"] < MIN_SAMPLES
+            case_metric = "p50_us" if few else metric
+            if not old.get(case_metric):
+                continue
+            delta = (new[case_metric] - old[case_metric]) / old[case_metric] * 100
+            flag = (" *" if few else "") + (" ❗" if delta > max_regression else "")
+            label = f"{size}/{name}"
+            print(f"{label[:39]:<40}{old[case_metric]:>12}{new[case_metric]:>12}{delta:>+8.1f}%{flag}")
+            if delta > max_regression:
+                note = f", {new['samples']} samples" if few else ""
+                regressions.append(
+                    f"{label}: {case_metric} {old[case_metric]} → {new[case_metric]} µs ({delta:+.1f}%{note})"
+                )
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for size, data in report["datasets"].items():
+        rows = ", ".join(f"{t} {n:,}" for t, n in data["rows"].items())
+        print()
+        print(f"[{size}] {rows}")
+        header = f"{'case':<26}{'calls':>9}{'p50 µs':>12}{'p95 µs':>12}{'p99 µs':>12}{'ops/s':>12}"
+        print(header)
+        print("-" * len(header))
+        for name, r in data["cases"].items():
+            if "error" in r:
+                print(f"{name:<26}  ❌ {r['error']}")
+                continue
+            print(f"{name:<26}{r['calls']:>9}{r['p50_us']:>12}{r['p95_us']:>12}{r['p99_us']:>12}{r['ops_per_s']:>12}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Мікробенчмарки доступу до даних і рендерингу")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="пресети generate.py через кому")
+    parser.add_argument("--db", action="append", default=[],
+                        help="готова БД замість пресету (можна кілька; ім'я файлу — назва набору)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seconds", type=float, default=CASE_SECONDS, help="час на один випадок, с")
+    parser.add_argument("--only", type=lambda s: [x for x in s.split(",") if x], help="лише ці випадки")
+    parser.add_argument("--json", help="зберегти результати в JSON")
+    parser.add_argument("--baseline", help="попередні результати для порівняння")
+    parser.add_argument("--metric", choices=["p50_us", "p95_us", "mean_us"], default="p50_us")
+    parser.add_argument("--max-regression", type=float, default=15.0, help="допустиме зростання метрики, %%")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+    logging.getLogger("src.database.generate").setLevel(logging.INFO)
+
+    if args.worker:
+        worker_main(args)
+        return
+
+    datasets: Dict[str, str] = {}
+    if args.db:
+        datasets = {Path(p).stem: os.path.abspath(p) for p in args.db}
+    else:
+        for size in [s.strip() for s in args.sizes.split(",") if s.strip()]:
+            datasets[size] = ensure_dataset(size, args.seed)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "seconds": args.seconds,
+        },
+        "datasets": {size: run_dataset(size, path, args) for size, path in datasets.items()},
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.metric, args.max_regression)
+        if regressions:
+            print()
+            print(f"❗ Регресії понад {args.max_regression}%:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Fake Bot API - локальний замінник api.telegram.org для навантажувальних тестів
+
+Реалізує підмножину Bot API, якої достатньо боту:
+- getMe, getUpdates (long polling з offset), setWebhook / deleteWebhook;
+- sendMessage, editMessageText, editMessageReplyMarkup, answerCallbackQuery,
+  deleteMessage; решта методів відповідає {"ok": true, "result": true}.
+
+Оновлення подаються через push(): у режимі polling вони чекають на getUpdates,
+а після setWebhook — надсилаються POST-ом на webhook бота з секретним
+заголовком (503 від бота — повтор через Retry-After, як робить Telegram).
+
+Кожен виклик бота фіксується як BotCall і передається слухачам (loadgen).
+
+Бот під'єднується через TELEGRAM_API_URL=http://127.0.0.1:8081
+Окремий запуск:  python -m src.loadtest.fake_api --port 8081
+"""
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import ClientSession, ClientTimeout, web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER_ID = 7000000001
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Методи, що повертають Message
+_MESSAGE_METHODS = {"sendMessage", "sendPhoto", "sendDocument", "sendLocation", "sendContact",
+                    "editMessageText", "editMessageReplyMarkup", "editMessageCaption", "forwardMessage"}
+# Поля форми, що містять JSON (решта — рядки: текст «25» має лишитися текстом)
+_JSON_FIELDS = {"reply_markup", "allowed_updates", "entities", "caption_entities",
+                "link_preview_options", "reply_parameters"}
+
+
+@dataclass
+class BotCall:
+    """One request the bot made to the Bot API"""
+    method: str
+    params: Dict[str, Any]
+    chat_id: Optional[int]
+    at: float
+    message: Optional[Dict[str, Any]] = None
+
+    @property
+    def text(self) -> str:
+        return str(self.params.get("text") or "")
+
+    def buttons(self) -> List[str]:
+        """callback_data of all inline buttons in reply_markup"""
+        markup = self.params.get("reply_markup") or {}
+        return [
+            btn["callback_data"]
+            for row in markup.get("inline_keyboard", [])
+            for btn in row
+            if btn.get("callback_data")
+        ]
+
+
+@dataclass
+class _Webhook:
+    url: str
+    secret: str = ""
+    allowed_updates: List[str] = field(default_factory=list)
+
+
+class FakeBotAPI:
+    """In-memory Bot API server (aiohttp)"""
+
+    def __init__(self, latency: float = 0.0, bot_username: str = "agro_loadtest_bot"):
+        self.latency = latency
+        self.bot_user = {"id": BOT_USER_ID, "is_bot": True, "first_name": "Agro Bot", "username": bot_username}
+        self._update_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._message_ids: Dict[int, itertools.count] = {}
+        self._updates: List[Dict[str, Any]] = []
+        self._updates_ready = asyncio.Event()
+        self._webhook: Optional[_Webhook] = None
+        self._client: Optional[ClientSession] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.listeners: List[Callable[[BotCall], None]] = []
+        # Бот почав отримувати оновлення (перший getUpdates або setWebhook)
+        self.connected = asyncio.Event()
+        # Повідомлення бота за (chat_id, message_id) — для callback_query.message
+        self.messages: Dict[tuple, Dict[str, Any]] = {}
+
+        self.calls = Counter()
+        self.total_calls = 0
+        self.webhook_retries = 0
+
+    # ---------- Побудова оновлень ----------
+
+    @staticmethod
+    def make_user(user_id: int, first_name: str, username: Optional[str] = None) -> Dict[str, Any]:
+        user = {"id": user_id, "is_bot": False, "first_name": first_name, "language_code": "uk"}
+        if username:
+            user["username"] = username
+        return user
+
+    def _next_message_id(self, chat_id: int) -> int:
+        counter = self._message_ids.setdefault(chat_id, itertools.count(1))
+        return next(counter)
+
+    def message_update(self, user: Dict[str, Any], text: str) -> Dict[str, Any]:
+        message = {
+            "message_id": self._next_message_id(user["id"]),
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": next(self._update_ids), "message": message}
+
+    def callback_update(self, user: Dict[str, Any], data: str,
+                        message: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        query = {
+            "id": f"{user['id']}-{next(self._callback_ids)}",
+            "from": user,
+            "chat_instance": str(user["id"]),
+            "data": data,
+        }
+        if message is not None:
+            query["message"] = message
+        return {"update_id": next(self._update_ids), "callback_query": query}
+
+    # ---------- Доставка оновлень боту ----------
+
+    async def push(self, update: Dict[str, Any]) -> None:
+        """Delivers an update via webhook (if set) or queues it for getUpdates"""
+        if self._webhook is None:
+            self._updates.append(update)
+            self._updates_ready.set()
+            return
+
+        if self._client is None:
+            self._client = ClientSession(timeout=ClientTimeout(total=30))
+        headers = {SECRET_HEADER: self._webhook.secret} if self._webhook.secret else {}
+        while True:
+            async with self._client.post(self._webhook.url, json=update, headers=headers) as resp:
+                if resp.status < 300:
+                    return
+                if resp.status in (429, 502, 503, 504):
+                    self.webhook_retries += 1
+                    await asyncio.sleep(float(resp.headers.get("Retry-After", "1")))
+                    continue
+                raise RuntimeError(f"Webhook answered {resp.status} for update {update['update_id']}")
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        if offset:
+            # Підтверджені оновлення більше не віддаються
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._updates_ready.clear()
+            try:
+                await asyncio.wait_for(self._updates_ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # ---------- Методи Bot API ----------
+
+    def _bot_message(self, chat_id: int, params: Dict[str, Any], message_id: Optional[int] = None) -> Dict[str, Any]:
+        if message_id is None:
+            message_id = self._next_message_id(chat_id)
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": self.bot_user,
+            "text": params.get("text") or self.messages.get((chat_id, message_id), {}).get("text", ""),
+        }
+        markup = params.get("reply_markup")
+        if isinstance(markup, dict) and "inline_keyboard" in markup:
+            message["reply_markup"] = markup
+        self.messages[(chat_id, message_id)] = message
+        return message
+
+    async def _call(self, method: str, params: Dict[str, Any]) -> Any:
+        if method == "getMe":
+            return self.bot_user
+        if method == "getUpdates":
+            self.connected.set()
+            return await self._get_updates(params)
+        if method == "setWebhook":
+            self._webhook = _Webhook(params["url"], params.get("secret_token") or "",
+                                     params.get("allowed_updates") or [])
+            # Накопичені для polling оновлення переходять на webhook
+            pending, self._updates = self._updates, []
+            for update in pending:
+                asyncio.create_task(self.push(update))
+            self.connected.set()
+            return True
+        if method == "deleteWebhook":
+            self._webhook = None
+            if params.get("drop_pending_updates") in (True, "true", "True"):
+                self._updates = []
+            return True
+        if method == "getWebhookInfo":
+            return {"url": self._webhook.url if self._webhook else "", "has_custom_certificate": False,
+                    "pending_update_count": len(self._updates)}
+
+        chat_id = params.get("chat_id")
+        if method in _MESSAGE_METHODS and chat_id is not None:
+            message_id = params.get("message_id")
+            return self._bot_message(int(chat_id), params, int(message_id) if message_id else None)
+        return True
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        params: Dict[str, Any] = {}
+        for key, value in (await request.post()).items():
+            if not isinstance(value, str):
+                continue  # файли ігноруємо
+            if key in _JSON_FIELDS:
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = await self._params(request)
+        if self.latency and method != "getUpdates":
+            await asyncio.sleep(self.latency)
+        result = await self._call(method, params)
+
+        if method not in ("getUpdates", "getMe"):
+            self.calls[method] += 1
+            self.total_calls += 1
+            chat_id = params.get("chat_id")
+            if chat_id is None and method == "answerCallbackQuery":
+                # id запиту має вигляд "<user_id>-<n>"
+                chat_id = str(params.get("callback_query_id", "")).split("-")[0] or None
+            call = BotCall(
+                method=method,
+                params=params,
+                chat_id=int(chat_id) if chat_id not in (None, "") else None,
+                at=time.monotonic(),
+                message=result if isinstance(result, dict) else None,
+            )
+            for listener in self.listeners:
+                try:
+                    listener(call)
+                except Exception as e:
+                    logger.error(f"Fake API listener failed: {e}")
+
+        return web.json_response({"ok": True, "result": result})
+
+    # ---------- Lifecycle ----------
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_route("*", "/bot{token}/{method}", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> None:
+        self._runner = web.AppRunner(self.make_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"🧪 Fake Bot API слухає http://{host}:{port}")
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Локальний замінник Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="затримка відповіді, с")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    async def _serve():
+        api = FakeBotAPI(latency=args.latency)
+        await api.start(args.host, args.port)
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,655 @@
+"""
+Load Generator - віртуальні користувачі проти справжніх хендлерів бота
+
+Піднімає Fake Bot API (fake_api.py) і бота в тому ж процесі (той самий
+create_dispatcher(), polling або webhook через run_updates), та запускає N
+віртуальних користувачів, які проходять реальні сценарії:
+/start і реєстрацію, створення лота (CreateLot), перегляд біржових пропозицій,
+зустрічну пропозицію та чат (з додаванням у контакти — власник лота,
+якщо він теж віртуальний, приймає запит автоматично).
+
+Для кожного сценарію звіт містить p50/p95/p99 затримки оновлення й усього
+сценарію, кількість викликів Telegram API та SQL-запитів на одне оновлення.
+Виклики та запити атрибутуються оновленню через contextvar: усе, що хендлер
+робить у своїй задачі, рахується йому; відкладене (delivery, write-behind)
+— окремо як «фонове».
+
+База — окрема копія в --workdir (за замовчуванням тимчасова тека), тож
+робоча БД не змінюється.
+
+Запуск:
+    python -m src.loadtest.loadgen --users 1000 --duration 120
+    python -m src.loadtest.loadgen --users 200 --mode webhook --json result.json
+    # бот окремим процесом (напр. BOT_WORKERS=4), лише затримки й виклики API:
+    python -m src.loadtest.loadgen --external --port 8081
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import math
+import os
+import random
+import secrets
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Awaitable, Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+logger = logging.getLogger(__name__)
+
+USER_ID_BASE = 900_000_000
+STEP_TIMEOUT = 30.0
+# Зовнішній бот: оновлення вважається обробленим після паузи без викликів
+SETTLE_SECONDS = 0.15
+CONTACT_ACCEPT_TIMEOUT = 10.0
+
+DEFAULT_MIX = {"browse": 40, "create_lot": 15, "counter_offer": 20, "chat": 15, "start": 10}
+
+CROPS = ["Пшениця 2кл", "Пшениця 3кл", "Кукурудза", "Соняшник", "Ячмінь", "Соя", "Ріпак"]
+REGIONS = ["Київська", "Полтавська", "Вінницька", "Одеська", "Харківська", "Черкаська"]
+REGION_CODES = ["kyivska", "poltavska", "vinnytska", "odeska", "kharkivska", "cherkaska"]
+ROLES = ["👨‍🌾 Фермер", "🧑‍💼 Покупець"]
+CHAT_PHRASES = ["Добрий день!", "Яка вологість?", "Можна фото?", "Ціна актуальна?", "Домовились 👍"]
+
+
+# ---------- Атрибуція викликів і SQL-запитів оновленню ----------
+
+class _UpdateStats:
+    __slots__ = ("tg_calls", "db_statements", "closed")
+
+    def __init__(self):
+        self.tg_calls = 0
+        self.db_statements = 0
+        self.closed = False
+
+
+_current: contextvars.ContextVar[Optional[_UpdateStats]] = contextvars.ContextVar("loadgen_update", default=None)
+
+
+class Probe:
+    """Wraps the in-process bot: completion futures and per-update counters"""
+
+    def __init__(self):
+        self._pending: Dict[int, asyncio.Future] = {}
+        self.background_tg_calls = 0
+        self.background_db_statements = 0
+        self.total_db_statements = 0
+
+    def expect(self, update_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending[update_id] = future
+        return future
+
+    # SQL
+
+    def _count_statement(self, stats: Optional[_UpdateStats]) -> None:
+        self.total_db_statements += 1
+        if stats is not None and not stats.closed:
+            stats.db_statements += 1
+        else:
+            self.background_db_statements += 1
+
+    def _connection_factory(self, stats: Optional[_UpdateStats]):
+        probe = self
+
+        class CountingConnection(sqlite3.Connection):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.set_trace_callback(lambda _sql: probe._count_statement(stats))
+
+        return CountingConnection
+
+    def install(self, bot, dp) -> None:
+        import aiosqlite
+
+        # Хендлери викликають aiosqlite.connect(...) під час обробки — підміняємо
+        # фабрику з'єднання, запамʼятовуючи оновлення, яке відкрило з'єднання
+        original_connect = aiosqlite.connect
+
+        def connect(database, *args, **kwargs):
+            kwargs.setdefault("factory", self._connection_factory(_current.get()))
+            return original_connect(database, *args, **kwargs)
+
+        aiosqlite.connect = connect
+
+        # Виклики Bot API з контексту оновлення
+        async def count_request(make_request, bot_, method):
+            stats = _current.get()
+            if stats is not None and not stats.closed:
+                stats.tg_calls += 1
+            else:
+                self.background_tg_calls += 1
+            return await make_request(bot_, method)
+
+        bot.session.middleware(count_request)
+
+        # Обгортка feed_update: і polling, і webhook викликають dp.feed_update
+        original_feed = dp.feed_update
+
+        async def feed_update(bot_, update, **kwargs):
+            stats = _UpdateStats()
+            token = _current.set(stats)
+            error = None
+            try:
+                return await original_feed(bot_, update, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _current.reset(token)
+                stats.closed = True
+                future = self._pending.pop(update.update_id, None)
+                if future is not None and not future.done():
+                    future.set_result((stats.tg_calls, stats.db_statements, error))
+
+        dp.feed_update = feed_update
+
+
+# ---------- Результати ----------
+
+@dataclass
+class StepResult:
+    flow: str
+    latency: float
+    tg_calls: int
+    db_statements: Optional[int]
+    ok: bool
+
+
+@dataclass
+class FlowResult:
+    flow: str
+    latency: float
+    ok: bool
+
+
+@dataclass
+class Results:
+    steps: List[StepResult] = field(default_factory=list)
+    flows: List[FlowResult] = field(default_factory=list)
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def error(self, reason: str) -> None:
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class FlowFailed(Exception):
+    pass
+
+
+# ---------- Віртуальний користувач ----------
+
+class VirtualUser:
+    def __init__(self, gen: "LoadGenerator", index: int):
+        self.gen = gen
+        self.user_id = USER_ID_BASE + index
+        self.user = gen.api.make_user(self.user_id, f"Load{index}", f"load_user_{index}")
+        self.inbox: List[Any] = []
+        self.registered = False
+        self.flow = "start"
+        self._new_call = asyncio.Event()
+        self._accepted = asyncio.Event()
+
+    # Виклики бота, адресовані цьому користувачу (слухач Fake API)
+    def on_call(self, call) -> None:
+        self.inbox.append(call)
+        self._new_call.set()
+        if any(b.startswith("contact:accept:") for b in call.buttons()):
+            # Приймаємо паралельно з власним сценарієм: інакше двоє користувачів,
+            # що чекають один на одного, заблокуються до таймауту
+            self.gen.background.add(asyncio.create_task(self._accept_contact(call)))
+        if "прийняв ваш запит" in call.text:
+            self._accepted.set()
+
+    async def _accept_contact(self, call) -> None:
+        data = next(b for b in call.buttons() if b.startswith("contact:accept:"))
+        started = time.monotonic()
+        try:
+            await self._push(self.gen.api.callback_update(self.user, data, call.message), flow="contact_accept")
+            ok = True
+        except FlowFailed:
+            ok = False
+        self.gen.results.flows.append(FlowResult("contact_accept", time.monotonic() - started, ok))
+
+    async def _push(self, update: Dict[str, Any], flow: Optional[str] = None) -> List[Any]:
+        """Sends an update and waits until the bot has handled it"""
+        flow = flow or self.flow
+        start_index = len(self.inbox)
+        started = time.monotonic()
+        probe = self.gen.probe
+        ok = True
+        db_statements: Optional[int] = None
+
+        if probe is not None:
+            done = probe.expect(update["update_id"])
+            await self.gen.api.push(update)
+            try:
+                tg_calls, db_statements, error = await asyncio.wait_for(done, STEP_TIMEOUT)
+            except asyncio.TimeoutError:
+                ok, tg_calls, error = False, 0, "timeout"
+            if error is not None:
+                ok = False
+                self.gen.results.error(f"{flow}: {error}")
+        else:
+            await self.gen.api.push(update)
+            ok = await self._settle(start_index, started)
+            tg_calls = len(self.inbox) - start_index
+            if not ok:
+                self.gen.results.error(f"{flow}: timeout")
+
+        self.gen.updates_sent += 1
+        self.gen.results.steps.append(
+            StepResult(flow, time.monotonic() - started, tg_calls, db_statements, ok)
+        )
+        if not ok:
+            raise FlowFailed("update not handled")
+        return self.inbox[start_index:]
+
+    async def _settle(self, start_index: int, started: float) -> bool:
+        # Перша відповідь + пауза SETTLE_SECONDS без нових викликів
+        while len(self.inbox) == start_index:
+            if time.monotonic() - started > STEP_TIMEOUT:
+                return False
+            self._new_call.clear()
+            try:
+                await asyncio.wait_for(self._new_call.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+        while True:
+            seen = len(self.inbox)
+            await asyncio.sleep(SETTLE_SECONDS)
+            if len(self.inbox) == seen:
+                return True
+
+    async def send(self, text: str) -> List[Any]:
+        return await self._push(self.gen.api.message_update(self.user, text))
+
+    async def click(self, data: str, calls: Optional[List[Any]] = None) -> List[Any]:
+        message = None
+        for call in reversed(calls or self.inbox):
+            if data in call.buttons():
+                message = call.message
+                break
+        return await self._push(self.gen.api.callback_update(self.user, data, message))
+
+    @staticmethod
+    def buttons(calls: List[Any], prefix: str) -> List[str]:
+        return [b for call in calls for b in call.buttons() if b.startswith(prefix)]
+
+    # ---------- Сценарії ----------
+
+    async def run_flow(self, name: str, flow: Callable[[], Awaitable[None]]) -> None:
+        self.flow = name
+        started = time.monotonic()
+        ok = True
+        try:
+            await flow()
+        except FlowFailed as e:
+            ok = False
+            self.gen.results.error(f"{name}: {e}")
+        except Exception as e:
+            ok = False
+            self.gen.results.error(f"{name}: {type(e).__name__}: {e}")
+        self.gen.results.flows.append(FlowResult(name, time.monotonic() - started, ok))
+
+    async def flow_registration(self) -> None:
+        calls = await self.send("/start")
+        if any("Вітаємо знову" in c.text for c in calls):
+            self.registered = True
+            return
+        await self.send(random.choice(ROLES))
+        await self.click(f"reg:region:{random.choice(REGION_CODES)}")
+        await self.send("⏭ Пропустити")
+        await self.send("⏭ Пропустити")
+        self.registered = True
+
+    async def flow_start(self) -> None:
+        await self.send("/start")
+
+    async def flow_create_lot(self) -> None:
+        await self.send("🌾 Маркет")
+        await self.send("📋 Створити")
+        await self.click(random.choice(["lot:type:sell", "lot:type:buy"]))
+        await self.send(random.choice(CROPS))
+        await self.send(random.choice(REGIONS))
+        await self.send(random.choice(["Елеватор", "Господарство"]))
+        await self.send(str(random.randint(5, 500)))
+        await self.send(str(random.randint(60, 180) * 100))
+        calls = await self.send("⏭ Пропустити")
+        if not any("Заявку створено" in c.text for c in calls):
+            raise FlowFailed("lot not created")
+
+    async def _browse(self) -> List[Any]:
+        await self.send("🌾 Маркет")
+        return await self.send("💰 Біржові пропозиції")
+
+    async def flow_browse(self) -> None:
+        await self._browse()
+
+    async def flow_counter_offer(self) -> None:
+        calls = await self._browse()
+        offers = self.buttons(calls, "offer:make:")
+        if not offers:
+            raise FlowFailed("no foreign lots")
+        await self.click(random.choice(offers), calls)
+        await self.send(str(random.randint(60, 180) * 100))
+        await self.send(random.choice(["-", "Готовий забрати цього тижня"]))
+
+    async def flow_chat(self) -> None:
+        browse = await self._browse()
+        lots = self.buttons(browse, "chat:start:lot:")
+        if not lots:
+            raise FlowFailed("no foreign lots")
+        lot = random.choice(lots)
+        calls = await self.click(lot, browse)
+
+        add = self.buttons(calls, "contact:add:")
+        if add:
+            self._accepted.clear()
+            calls = await self.click(add[0], calls)
+            try:
+                await asyncio.wait_for(self._accepted.wait(), CONTACT_ACCEPT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise FlowFailed("contact not accepted")
+            calls = await self.click(lot, browse)
+
+        chats = self.buttons(calls, "chat:open:")
+        if not chats:
+            raise FlowFailed("chat not opened")
+        await self.click(chats[0], calls)
+        for _ in range(random.randint(1, 4)):
+            await self.send(random.choice(CHAT_PHRASES))
+        await self.send("❌ Вийти з чату")
+
+    async def run(self, deadline: float, iterations: Optional[int], mix: Dict[str, int], think: float) -> None:
+        if not self.registered:
+            await self.run_flow("registration", self.flow_registration)
+        names, weights = list(mix), list(mix.values())
+        done = 0
+        while time.monotonic() < deadline and (iterations is None or done < iterations):
+            if think:
+                await asyncio.sleep(random.expovariate(1 / think))
+            name = random.choices(names, weights)[0]
+            await self.run_flow(name, getattr(self, f"flow_{name}"))
+            done += 1
+
+
+# ---------- Генератор ----------
+
+class LoadGenerator:
+    def __init__(self, api, probe: Optional[Probe]):
+        self.api = api
+        self.probe = probe
+        self.results = Results()
+        self.users: Dict[int, VirtualUser] = {}
+        self.updates_sent = 0
+        self.background: set = set()
+        api.listeners.append(self._route_call)
+
+    def _route_call(self, call) -> None:
+        user = self.users.get(call.chat_id)
+        if user is not None:
+            user.on_call(call)
+
+    async def run(self, users: int, duration: float, iterations: Optional[int], ramp: float,
+                  mix: Dict[str, int], think: float) -> float:
+        for i in range(users):
+            vu = VirtualUser(self, i)
+            self.users[vu.user_id] = vu
+
+        started = time.monotonic()
+        deadline = started + duration
+
+        async def launch(i: int, vu: VirtualUser):
+            if ramp:
+                await asyncio.sleep(ramp * i / max(1, users))
+            await vu.run(deadline, iterations, mix, think)
+
+        await asyncio.gather(*(launch(i, vu) for i, vu in enumerate(self.users.values())))
+        # Дочікуємося автоматичних прийомів контактів
+        if self.background:
+            await asyncio.gather(*self.background, return_exceptions=True)
+        return time.monotonic() - started
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        by_flow: Dict[str, Dict[str, Any]] = {}
+        for name in sorted({s.flow for s in self.results.steps} | {f.flow for f in self.results.flows}):
+            steps = [s for s in self.results.steps if s.flow == name]
+            flows = [f for f in self.results.flows if f.flow == name]
+            latencies = [s.latency * 1000 for s in steps]
+            flow_latencies = [f.latency * 1000 for f in flows]
+            db = [s.db_statements for s in steps if s.db_statements is not None]
+            by_flow[name] = {
+                "flows": len(flows),
+                "failed": sum(1 for f in flows if not f.ok),
+                "updates": len(steps),
+                "update_p50_ms": round(percentile(latencies, 50), 1),
+                "update_p95_ms": round(percentile(latencies, 95), 1),
+                "update_p99_ms": round(percentile(latencies, 99), 1),
+                "flow_p50_ms": round(percentile(flow_latencies, 50), 1),
+                "flow_p95_ms": round(percentile(flow_latencies, 95), 1),
+                "flow_p99_ms": round(percentile(flow_latencies, 99), 1),
+                "tg_calls_per_update": round(sum(s.tg_calls for s in steps) / len(steps), 2) if steps else 0.0,
+                "db_statements_per_update": round(sum(db) / len(db), 2) if db else None,
+            }
+
+        all_latencies = [s.latency * 1000 for s in self.results.steps]
+        summary = {
+            "elapsed_s": round(elapsed, 2),
+            "users": len(self.users),
+            "updates": self.updates_sent,
+            "updates_per_s": round(self.updates_sent / elapsed, 1) if elapsed else 0.0,
+            "update_p50_ms": round(percentile(all_latencies, 50), 1),
+            "update_p95_ms": round(percentile(all_latencies, 95), 1),
+            "update_p99_ms": round(percentile(all_latencies, 99), 1),
+            "tg_calls_total": self.api.total_calls,
+            "tg_calls_per_update": round(self.api.total_calls / self.updates_sent, 2) if self.updates_sent else 0.0,
+            "tg_calls_by_method": dict(self.api.calls),
+            "webhook_retries": self.api.webhook_retries,
+            "errors": self.results.errors,
+        }
+        if self.probe is not None:
+            summary.update({
+                "db_statements_total": self.probe.total_db_statements,
+                "db_statements_per_update": (round(self.probe.total_db_statements / self.updates_sent, 2)
+                                             if self.updates_sent else 0.0),
+                "background_tg_calls": self.probe.background_tg_calls,
+                "background_db_statements": self.probe.background_db_statements,
+            })
+        return {"summary": summary, "flows": by_flow}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    s = report["summary"]
+    print()
+    print(f"Users: {s['users']}  updates: {s['updates']}  elapsed: {s['elapsed_s']}s  "
+          f"throughput: {s['updates_per_s']} upd/s")
+    print(f"Update latency p50/p95/p99: {s['update_p50_ms']} / {s['update_p95_ms']} / {s['update_p99_ms']} ms")
+    print(f"Telegram calls: {s['tg_calls_total']} ({s['tg_calls_per_update']}/update)  "
+          f"webhook retries: {s['webhook_retries']}")
+    if "db_statements_total" in s:
+        print(f"DB statements: {s['db_statements_total']} ({s['db_statements_per_update']}/update), "
+              f"background: {s['background_db_statements']}")
+    print()
+    header = (f"{'flow':<16}{'runs':>6}{'fail':>6}{'upd':>7}"
+              f"{'upd p50':>9}{'p95':>8}{'p99':>8}{'flow p50':>10}{'p95':>8}{'p99':>8}{'tg/upd':>8}{'db/upd':>8}")
+    print(header)
+    print("-" * len(header))
+    for name, f in report["flows"].items():
+        db = f["db_statements_per_update"]
+        print(f"{name:<16}{f['flows']:>6}{f['failed']:>6}{f['updates']:>7}"
+              f"{f['update_p50_ms']:>9}{f['update_p95_ms']:>8}{f['update_p99_ms']:>8}"
+              f"{f['flow_p50_ms']:>10}{f['flow_p95_ms']:>8}{f['flow_p99_ms']:>8}"
+              f"{f['tg_calls_per_update']:>8}{db if db is not None else '—':>8}")
+    if s["errors"]:
+        print()
+        print("Errors:")
+        for reason, count in sorted(s["errors"].items(), key=lambda kv: -kv[1]):
+            print(f"  {count:>6}  {reason}")
+
+
+# ---------- Бот у цьому ж процесі ----------
+
+def prepare_workdir(workdir: Optional[str], source_db: Optional[str]) -> str:
+    """Isolated cwd with its own DB copy; returns the DB path"""
+    workdir = os.path.abspath(workdir or tempfile.mkdtemp(prefix="agro_loadtest_"))
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    db_path = os.path.join(workdir, "agro_bot.db")
+    if source_db:
+        shutil.copyfile(source_db, db_path)
+
+    # Частина хендлерів відкриває "agro_bot.db" відносно cwd — усі шляхи ведуть у workdir
+    if str(PROJECT_ROOT) not in sys.path:
+        sys.path.insert(0, str(PROJECT_ROOT))
+    os.chdir(workdir)
+    os.environ["DB_FILE"] = db_path
+    return db_path
+
+
+async def prime_schema() -> None:
+    """Runs the handlers' soft migrations once, before virtual users start
+
+    Otherwise the first concurrent updates race on the same ALTER TABLE
+    inside _ensure_tables ("duplicate column name").
+    """
+    from src.bot.handlers import chat, market, offers_handlers
+
+    await market._ensure_tables()
+    await chat._ensure_tables()
+    await offers_handlers.ensure_counter_offers_table()
+
+
+async def start_bot(api_url: str, probe: Probe):
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+
+    from config.settings import BOT_TOKEN, DB_PATH
+    from src.bot.dispatcher import create_dispatcher
+    from src.bot.runner import bot_session, run_updates
+    from src.database.migrate import migrate
+
+    await prime_schema()
+    migrate(str(DB_PATH), verbose=False)
+
+    bot = Bot(token=BOT_TOKEN, session=bot_session(), default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = create_dispatcher()
+    probe.install(bot, dp)
+    task = asyncio.create_task(run_updates(bot, dp))
+    return bot, dp, task
+
+
+async def stop_bot(bot, dp, task) -> None:
+    from config.settings import BOT_MODE
+    from src.bot.services.delivery import shutdown_delivery
+
+    if BOT_MODE == "webhook":
+        task.cancel()
+    else:
+        try:
+            await dp.stop_polling()
+        except RuntimeError:
+            task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await shutdown_delivery()
+    await dp.storage.close()
+    await bot.session.close()
+
+
+async def main_async(args) -> Dict[str, Any]:
+    from src.loadtest.fake_api import FakeBotAPI
+
+    api = FakeBotAPI(latency=args.api_latency)
+    await api.start("127.0.0.1", args.port)
+
+    bot = dp = task = None
+    probe = None
+    try:
+        if not args.external:
+            probe = Probe()
+            bot, dp, task = await start_bot(f"http://127.0.0.1:{args.port}", probe)
+        else:
+            logger.info(f"Очікую бота: TELEGRAM_API_URL=http://127.0.0.1:{args.port}")
+        await asyncio.wait_for(api.connected.wait(), args.connect_timeout)
+
+        mix = dict(DEFAULT_MIX)
+        for item in args.mix or []:
+            name, _, weight = item.partition("=")
+            if name not in DEFAULT_MIX:
+                raise SystemExit(f"Невідомий сценарій: {name}")
+            mix[name] = int(weight)
+        mix = {k: v for k, v in mix.items() if v > 0}
+
+        gen = LoadGenerator(api, probe)
+        elapsed = await gen.run(args.users, args.duration, args.iterations, args.ramp, mix, args.think)
+        return gen.report(elapsed)
+    finally:
+        if task is not None:
+            await stop_bot(bot, dp, task)
+        await api.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Навантажувальний тест бота на Fake Bot API")
+    parser.add_argument("--users", type=int, default=100, help="кількість віртуальних користувачів")
+    parser.add_argument("--duration", type=float, default=60.0, help="тривалість, с")
+    parser.add_argument("--iterations", type=int, default=None, help="сценаріїв на користувача (замість --duration)")
+    parser.add_argument("--ramp", type=float, default=10.0, help="розгін: за скільки секунд стартують усі користувачі")
+    parser.add_argument("--think", type=float, default=1.0, help="середня пауза між сценаріями, с")
+    parser.add_argument("--mix", nargs="*", help="ваги сценаріїв, напр. browse=50 chat=0")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--port", type=int, default=8081, help="порт Fake Bot API")
+    parser.add_argument("--webhook-port", type=int, default=8443)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="імітація затримки Telegram, с")
+    parser.add_argument("--workdir", help="тека для копії БД (за замовчуванням тимчасова)")
+    parser.add_argument("--db", help="стартова БД (копіюється у workdir), напр. згенерована")
+    parser.add_argument("--external", action="store_true", help="бот запущений окремо; лише Fake API")
+    parser.add_argument("--connect-timeout", type=float, default=60.0)
+    parser.add_argument("--json", help="зберегти звіт у JSON")
+    args = parser.parse_args(argv)
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    if args.db:
+        args.db = os.path.abspath(args.db)
+    if args.iterations is not None:
+        args.duration = float("inf")
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+
+    if not args.external:
+        prepare_workdir(args.workdir, args.db)
+        os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+        os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.port}"
+        os.environ["BOT_MODE"] = args.mode
+        if args.mode == "webhook":
+            os.environ["WEBHOOK_HOST"] = "127.0.0.1"
+            os.environ["WEBHOOK_PORT"] = str(args.webhook_port)
+            os.environ["WEBHOOK_BASE_URL"] = f"http://127.0.0.1:{args.webhook_port}"
+            os.environ.setdefault("WEBHOOK_SECRET", secrets.token_urlsafe(16))
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
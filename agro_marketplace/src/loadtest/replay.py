@@ -0,0 +1,301 @@
+"""
+Replay - відтворення записаного трафіку (middlewares/recorder.py)
+
+Подає записані оновлення в бота, піднятого так само, як у loadgen.py
+(create_dispatcher + Fake Bot API + копія БД у --workdir), зі збереженням
+інтервалів між оновленнями: --speed 1 — реальний темп, 10 — у 10 разів
+швидше, 0 — максимально швидко (не більше --max-in-flight одночасно).
+
+Користувачі в записі анонімізовані HMAC-ключем, тож копія робочої БД
+анонімізується тим самим ключем (--anonymize-db, ключ з UPDATE_RECORD_KEY
+або --key) — інакше зареєстровані користувачі виглядатимуть новими.
+Знімок БД варто робити на початку запису: тоді реєстрації, лоти й чати
+з запису лягають на той самий стан, що й у продакшені.
+
+Звіт: p50/p95/p99 по типах оновлень (команда, кнопка меню, префікс
+callback_data), виклики Telegram і SQL-запити на оновлення, відставання
+відправника від розкладу. З --baseline порівнює p95 з попереднім звітом
+і завершується з кодом 1, якщо регресія більша за --max-regression %.
+
+Запуск:
+    python -m src.loadtest.replay data/traffic.jsonl.gz --db data/agro_bot.db \\
+        --anonymize-db --speed 5 --json replay.json --baseline replay_prev.json
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.loadtest.loadgen import Probe, percentile, prepare_workdir, start_bot, stop_bot
+
+logger = logging.getLogger(__name__)
+
+STEP_TIMEOUT = 60.0
+MIN_SAMPLES = 20
+_DIGITS = re.compile(r"\d+")
+
+
+def route_key(update: Dict[str, Any]) -> str:
+    """Groups updates by what they trigger: command, menu button or callback prefix"""
+    if "callback_query" in update:
+        data = update["callback_query"].get("data") or ""
+        return "cb " + _DIGITS.sub("#", data)
+    message = update.get("message") or update.get("edited_message")
+    if message is not None:
+        text = (message.get("text") or "").strip()
+        if text.startswith("/"):
+            return text.split()[0]
+        if text and not text[0].isalnum():
+            return text  # кнопка меню
+        return "text" if text else "message"
+    kinds = [k for k in update if k != "update_id"]
+    return kinds[0] if kinds else "unknown"
+
+
+def iter_records(paths: Iterable[str]) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """Recordings merged by arrival time (one file per worker process)"""
+    from src.bot.middlewares.recorder import read_recording
+
+    return heapq.merge(*(read_recording(p) for p in paths), key=lambda r: r[0])
+
+
+def anonymize_db(db_path: str, key: bytes) -> int:
+    """Maps users in a DB copy to the ids/names used in the recording"""
+    from src.bot.middlewares.recorder import Anonymizer
+
+    anonymizer = Anonymizer(key, keep_texts=set())
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.create_function("anon_id", 1, lambda v: anonymizer.anon_id(int(v)) if v is not None else None)
+        conn.create_function("anon_name", 1, lambda v: anonymizer.name(v) if v else v)
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(users)")}
+        sets = ["telegram_id = anon_id(telegram_id)"]
+        sets += [f"{c} = anon_name({c})" for c in ("username", "full_name", "company") if c in cols]
+        if "phone" in cols:
+            sets.append("phone = NULL")
+        cur = conn.execute(f"UPDATE users SET {', '.join(sets)}")
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+class Replayer:
+    def __init__(self, api, probe: Probe, speed: float, max_in_flight: int):
+        self.api = api
+        self.probe = probe
+        self.speed = speed
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._update_ids = itertools.count(1)
+        self.samples: Dict[str, List[Tuple[float, int, int]]] = {}
+        self.lag: List[float] = []
+        self.timeouts = 0
+        self.errors: Dict[str, int] = {}
+        self.sent = 0
+
+    async def _track(self, kind: str, done: asyncio.Future, update: Dict[str, Any]) -> None:
+        try:
+            sent = time.monotonic()
+            push = asyncio.create_task(self.api.push(update))
+            try:
+                tg_calls, db_statements, error = await asyncio.wait_for(done, STEP_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                return
+            finally:
+                await asyncio.gather(push, return_exceptions=True)
+            if error is not None:
+                reason = f"{kind}: {type(error).__name__}"
+                self.errors[reason] = self.errors.get(reason, 0) + 1
+            self.samples.setdefault(kind, []).append((time.monotonic() - sent, tg_calls, db_statements))
+        finally:
+            self._slots.release()
+
+    async def run(self, records: Iterator[Tuple[float, Dict[str, Any]]], limit: Optional[int]) -> float:
+        tasks = set()
+        started = time.monotonic()
+        first: Optional[float] = None
+        for arrived, update in records:
+            if limit is not None and self.sent >= limit:
+                break
+            if first is None:
+                first = arrived
+            if self.speed > 0:
+                due = started + (arrived - first) / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.lag.append(-delay)
+            await self._slots.acquire()
+
+            update = dict(update, update_id=next(self._update_ids))
+            done = self.probe.expect(update["update_id"])
+            task = asyncio.create_task(self._track(route_key(update), done, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            self.sent += 1
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return time.monotonic() - started
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        def stats(samples: List[Tuple[float, int, int]]) -> Dict[str, Any]:
+            latencies = [s[0] * 1000 for s in samples]
+            return {
+                "updates": len(samples),
+                "p50_ms": round(percentile(latencies, 50), 1),
+                "p95_ms": round(percentile(latencies, 95), 1),
+                "p99_ms": round(percentile(latencies, 99), 1),
+                "tg_calls_per_update": round(sum(s[1] for s in samples) / len(samples), 2),
+                "db_statements_per_update": round(sum(s[2] for s in samples) / len(samples), 2),
+            }
+
+        everything = [s for samples in self.samples.values() for s in samples]
+        summary = stats(everything) if everything else {"updates": 0}
+        summary.update({
+            "sent": self.sent,
+            "elapsed_s": round(elapsed, 2),
+            "updates_per_s": round(self.sent / elapsed, 1) if elapsed else 0.0,
+            "speed": self.speed,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "sender_lag_p95_ms": round(percentile([x * 1000 for x in self.lag], 95), 1),
+            "background_db_statements": self.probe.background_db_statements,
+        })
+        kinds = {kind: stats(samples) for kind, samples in
+                 sorted(self.samples.items(), key=lambda kv: -len(kv[1]))}
+        return {"summary": summary, "kinds": kinds}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """p95 regressions beyond max_regression percent, as printable lines"""
+    regressions = []
+    pairs = [("TOTAL", report["summary"], baseline.get("summary", {}))]
+    pairs += [(k, v, baseline.get("kinds", {}).get(k)) for k, v in report["kinds"].items()]
+    print()
+    print(f"{'kind':<36}{'base p95':>10}{'new p95':>10}{'delta':>9}")
+    for kind, new, old in pairs:
+        if not old or new.get("updates", 0) < MIN_SAMPLES or old.get("updates", 0) < MIN_SAMPLES:
+            continue
+        if not old.get("p95_ms"):
+            continue
+        delta = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        flag = " ❗" if delta > max_regression else ""
+        print(f"{kind[:35]:<36}{old['p95_ms']:>10}{new['p95_ms']:>10}{delta:>+8.1f}%{flag}")
+        if flag:
+            regressions.append(f"{kind}: p95 {old['p95_ms']} → {new['p95_ms']} ms ({delta:+.1f}%)")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    s = report["summary"]
+    print()
+    print(f"Replayed: {s['sent']} updates in {s['elapsed_s']}s at x{s['speed'] or 'max'} "
+          f"({s['updates_per_s']} upd/s), timeouts: {s['timeouts']}, sender lag p95: {s['sender_lag_p95_ms']} ms")
+    if s.get("updates"):
+        print(f"Latency p50/p95/p99: {s['p50_ms']} / {s['p95_ms']} / {s['p99_ms']} ms, "
+              f"Telegram calls/update: {s['tg_calls_per_update']}, DB statements/update: {s['db_statements_per_update']}")
+    print()
+    header = f"{'kind':<36}{'upd':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'tg/upd':>8}{'db/upd':>8}"
+    print(header)
+    print("-" * len(header))
+    for kind, k in report["kinds"].items():
+        print(f"{kind[:35]:<36}{k['updates']:>7}{k['p50_ms']:>9}{k['p95_ms']:>9}{k['p99_ms']:>9}"
+              f"{k['tg_calls_per_update']:>8}{k['db_statements_per_update']:>8}")
+    if s["errors"]:
+        print()
+        print("Errors:")
+        for reason, count in sorted(s["errors"].items(), key=lambda kv: -kv[1]):
+            print(f"  {count:>6}  {reason}")
+
+
+async def main_async(args) -> Dict[str, Any]:
+    from src.loadtest.fake_api import FakeBotAPI
+
+    api = FakeBotAPI()
+    await api.start("127.0.0.1", args.port)
+    probe = Probe()
+    bot, dp, task = await start_bot(f"http://127.0.0.1:{args.port}", probe)
+    try:
+        await asyncio.wait_for(api.connected.wait(), 60)
+        replayer = Replayer(api, probe, args.speed, args.max_in_flight)
+        elapsed = await replayer.run(iter_records(args.recordings), args.limit)
+        return replayer.report(elapsed)
+    finally:
+        await stop_bot(bot, dp, task)
+        await api.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Відтворення записаного трафіку бота")
+    parser.add_argument("recordings", nargs="+", help="файли запису (*.jsonl.gz)")
+    parser.add_argument("--db", help="копія робочої БД (копіюється у workdir)")
+    parser.add_argument("--anonymize-db", action="store_true", help="анонімізувати користувачів у копії БД")
+    parser.add_argument("--key", default=os.getenv("UPDATE_RECORD_KEY", ""), help="HMAC-ключ запису")
+    parser.add_argument("--speed", type=float, default=1.0, help="прискорення; 0 — максимально швидко")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--limit", type=int, help="відтворити лише перші N оновлень")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--port", type=int, default=8081, help="порт Fake Bot API")
+    parser.add_argument("--webhook-port", type=int, default=8443)
+    parser.add_argument("--workdir", help="тека для копії БД (за замовчуванням тимчасова)")
+    parser.add_argument("--json", help="зберегти звіт у JSON")
+    parser.add_argument("--baseline", help="звіт попереднього релізу для порівняння")
+    parser.add_argument("--max-regression", type=float, default=10.0, help="допустиме зростання p95, %%")
+    args = parser.parse_args(argv)
+
+    args.recordings = [os.path.abspath(p) for p in args.recordings]
+    for name in ("db", "json", "baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    if args.anonymize_db and not args.key:
+        parser.error("--anonymize-db потребує ключ запису (--key або UPDATE_RECORD_KEY)")
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.setLevel(logging.INFO)
+
+    db_path = prepare_workdir(args.workdir, args.db)
+    if args.db and args.anonymize_db:
+        logger.info(f"Анонімізовано користувачів: {anonymize_db(db_path, args.key.encode())}")
+
+    os.environ.setdefault("BOT_TOKEN", "123456:REPLAY")
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.port}"
+    os.environ["BOT_MODE"] = args.mode
+    # Відтворення не пише новий запис
+    os.environ["UPDATE_RECORD_FILE"] = ""
+    if args.mode == "webhook":
+        os.environ["WEBHOOK_HOST"] = "127.0.0.1"
+        os.environ["WEBHOOK_PORT"] = str(args.webhook_port)
+        os.environ["WEBHOOK_BASE_URL"] = f"http://127.0.0.1:{args.webhook_port}"
+        os.environ.setdefault("WEBHOOK_SECRET", "replay-secret")
+
+    report = asyncio.run(main_async(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_regression)
+        if regressions:
+            print()
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,12 +6,41 @@ Agro Marketplace — Admin Web Panel
 ✅ Керування користувачами та лотами
 """
 
+import hmac
+import json
+import os
+import threading
+import time
 from pathlib import Path
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from config.settings import FLASK_SECRET, ADMIN_USER, ADMIN_PASS
-from .db import get_conn, init_schema, get_setting, set_setting
+from config.settings import FLASK_SECRET, ADMIN_USER, ADMIN_PASS, ADMIN_IDS, DB_PATH, METRICS_DIR, METRICS_TOKEN
+from src.database import analytics_etl, sql_trace
+from .db import get_conn, init_app, init_schema, get_settings, set_setting, has_table, table_columns
 from .auth import AdminUser, check_login
+from src.bot.services.sync_service import FileBasedSync
+from src.bot.services import metrics as bot_metrics
+from .notifier import notifier
+from .cache import panel_cache, cache_key, rows_to_dicts
+from .assets import init_assets
+from .exports import iter_rows, parse_export_args, stream_csv
+
+# SSE: пауза між heartbeat (на ній же помічаємо закриті вкладки), максимальна
+# тривалість одного з'єднання (браузер сам перепідключиться з Last-Event-ID)
+# і затримка перепідключення
+SSE_HEARTBEAT_SECONDS = 10
+SSE_MAX_STREAM_SECONDS = 120
+SSE_RETRY_MS = 3000
+SSE_MAX_EVENTS = 20
+# Кожна стрічка тримає потік gunicorn (gthread) — одночасних стрічок на воркер
+# не більше SSE_MAX_STREAMS, решта вкладок опитує /api/sync/poll
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "4"))
+SSE_POLL_SECONDS = 15
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+# Масові дії: розмір порції id в одному IN (...) і дозволені статуси лотів
+BULK_CHUNK = 500
+BULK_LOT_ACTIONS = {"close": "closed", "archive": "archived", "activate": "active"}
 
 
 def create_app() -> Flask:
@@ -32,8 +61,11 @@ def create_app() -> Flask:
     def load_user(user_id: str):
         return AdminUser(user_id)
 
-    # Ініціалізація схеми БД
+    # Ініціалізація схеми БД і зʼєднання на запит
     init_schema()
+    init_app(app)
+    # Зібрані статичні файли з хешем в імені (python -m src.web_panel.build_assets)
+    init_assets(app)
 
     # ============ ROUTES ============
 
@@ -72,94 +104,99 @@ def create_app() -> Flask:
     @app.get("/dashboard")
     @login_required
     def dashboard():
-        conn = get_conn()
-        stats = {
-            "users": 0,
-            "lots": 0,
-            "active_lots": 0,
-            "banned": 0,
-        }
-
-        # Статистика користувачів
-        if _has_table(conn, "users"):
-            try:
-                stats["users"] = conn.execute("SELECT COUNT(*) AS c FROM users").fetchone()["c"]
-                if _has_col(conn, "users", "is_banned"):
-                    stats["banned"] = conn.execute("SELECT COUNT(*) AS c FROM users WHERE is_banned=1").fetchone()["c"]
-            except Exception:
-                pass
-
-        # Статистика лотів
-        if _has_table(conn, "lots"):
-            try:
-                stats["lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots").fetchone()["c"]
-                cols = _table_cols(conn, "lots")
+        def load():
+            conn = get_conn()
+            stats = {
+                "users": 0,
+                "lots": 0,
+                "active_lots": 0,
+                "banned": 0,
+            }
+
+            # Статистика користувачів
+            if _has_table(conn, "users"):
+                try:
+                    stats["users"] = conn.execute("SELECT COUNT(*) AS c FROM users").fetchone()["c"]
+                    if _has_col(conn, "users", "is_banned"):
+                        stats["banned"] = conn.execute("SELECT COUNT(*) AS c FROM users WHERE is_banned=1").fetchone()["c"]
+                except Exception:
+                    pass
+
+            # Статистика лотів
+            if _has_table(conn, "lots"):
+                try:
+                    stats["lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots").fetchone()["c"]
+                    cols = _table_cols(conn, "lots")
                 
-                if "status" in cols:
-                    stats["active_lots"] = conn.execute(
-                        "SELECT COUNT(*) AS c FROM lots WHERE status IN ('active', 'open', 'published')"
-                    ).fetchone()["c"]
-                elif "is_active" in cols:
-                    stats["active_lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots WHERE is_active=1").fetchone()["c"]
-                elif "is_closed" in cols:
-                    stats["active_lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots WHERE is_closed=0").fetchone()["c"]
-            except Exception:
-                pass
-
-        # Отримуємо дані за останні 7 днів для графіка
-        weekly_data = {
-            "labels": [],
-            "new_users": [],
-            "new_lots": []
-        }
-        
-        if _has_table(conn, "users") and _has_col(conn, "users", "created_at"):
-            try:
-                # Користувачі за останні 7 днів
-                for i in range(6, -1, -1):
-                    day_offset = i
-                    day_data = conn.execute(
-                        """SELECT COUNT(*) as c FROM users 
-                           WHERE date(created_at) = date('now', '-' || ? || ' days')""",
-                        (day_offset,)
-                    ).fetchone()
-                    weekly_data["new_users"].append(day_data["c"] if day_data else 0)
-            except Exception as e:
-                weekly_data["new_users"] = [0] * 7
-
-        if _has_table(conn, "lots") and _has_col(conn, "lots", "created_at"):
-            try:
-                # Лоти за останні 7 днів
-                for i in range(6, -1, -1):
-                    day_offset = i
-                    day_data = conn.execute(
-                        """SELECT COUNT(*) as c FROM lots 
-                           WHERE date(created_at) = date('now', '-' || ? || ' days')""",
-                        (day_offset,)
-                    ).fetchone()
-                    weekly_data["new_lots"].append(day_data["c"] if day_data else 0)
-            except Exception as e:
-                weekly_data["new_lots"] = [0] * 7
-
-        # Мітки днів
-        import datetime
-        for i in range(6, -1, -1):
-            date = datetime.datetime.now() - datetime.timedelta(days=i)
-            day_name = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Нд'][date.weekday()]
-            weekly_data["labels"].append(day_name)
-
-        # Останні лоти для відображення
-        recent_lots = []
-        if _has_table(conn, "lots"):
-            try:
-                recent_lots = conn.execute(
-                    "SELECT * FROM lots ORDER BY id DESC LIMIT 4"
-                ).fetchall()
-            except Exception:
-                pass
+                    if "status" in cols:
+                        stats["active_lots"] = conn.execute(
+                            "SELECT COUNT(*) AS c FROM lots WHERE status IN ('active', 'open', 'published')"
+                        ).fetchone()["c"]
+                    elif "is_active" in cols:
+                        stats["active_lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots WHERE is_active=1").fetchone()["c"]
+                    elif "is_closed" in cols:
+                        stats["active_lots"] = conn.execute("SELECT COUNT(*) AS c FROM lots WHERE is_closed=0").fetchone()["c"]
+                except Exception:
+                    pass
+
+            # Отримуємо дані за останні 7 днів для графіка
+            weekly_data = {
+                "labels": [],
+                "new_users": [],
+                "new_lots": []
+            }
+        
+            if _has_table(conn, "users") and _has_col(conn, "users", "created_at"):
+                try:
+                    # Користувачі за останні 7 днів
+                    for i in range(6, -1, -1):
+                        day_offset = i
+                        day_data = conn.execute(
+                            """SELECT COUNT(*) as c FROM users 
+                               WHERE date(created_at) = date('now', '-' || ? || ' days')""",
+                            (day_offset,)
+                        ).fetchone()
+                        weekly_data["new_users"].append(day_data["c"] if day_data else 0)
+                except Exception as e:
+                    weekly_data["new_users"] = [0] * 7
+
+            if _has_table(conn, "lots") and _has_col(conn, "lots", "created_at"):
+                try:
+                    # Лоти за останні 7 днів
+                    for i in range(6, -1, -1):
+                        day_offset = i
+                        day_data = conn.execute(
+                            """SELECT COUNT(*) as c FROM lots 
+                               WHERE date(created_at) = date('now', '-' || ? || ' days')""",
+                            (day_offset,)
+                        ).fetchone()
+                        weekly_data["new_lots"].append(day_data["c"] if day_data else 0)
+                except Exception as e:
+                    weekly_data["new_lots"] = [0] * 7
+
+            # Мітки днів
+            import datetime
+            for i in range(6, -1, -1):
+                date = datetime.datetime.now() - datetime.timedelta(days=i)
+                day_name = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Нд'][date.weekday()]
+                weekly_data["labels"].append(day_name)
+
+            # Останні лоти для відображення
+            recent_lots = []
+            if _has_table(conn, "lots"):
+                try:
+                    recent_lots = conn.execute(
+                        "SELECT * FROM lots ORDER BY id DESC LIMIT 4"
+                    ).fetchall()
+                except Exception:
+                    pass
 
-        conn.close()
-        return render_template("dashboard.html", stats=stats, weekly_data=weekly_data, recent_lots=recent_lots)
+            conn.close()
+            return {"stats": stats, "weekly_data": weekly_data, "recent_lots": rows_to_dicts(recent_lots)}
+
+        # Лічильники й графік — із спільного кешу; скидається write-роутами по тегах
+        data = panel_cache.get_or_set("dashboard", load, tags=("users", "lots"))
+        return render_template("dashboard.html", **data)
 
     # -------- Користувачі --------
     @app.get("/users")
@@ -173,31 +210,18 @@ def create_app() -> Flask:
             return render_template("users.html", rows=[], q=q)
 
         cols = _table_cols(conn, "users")
-        where_clauses = []
-        params = []
-
-        if q:
-            # Пошук по різним полям
-            search_fields = []
-            if "telegram_id" in cols:
-                search_fields.append("CAST(telegram_id AS TEXT) LIKE ?")
-                params.append(f"%{q}%")
-            if "username" in cols:
-                search_fields.append("COALESCE(username,'') LIKE ?")
-                params.append(f"%{q}%")
-            if "full_name" in cols:
-                search_fields.append("COALESCE(full_name,'') LIKE ?")
-                params.append(f"%{q}%")
-            
-            if search_fields:
-                where_clauses.append(f"({' OR '.join(search_fields)})")
+        where_clauses, params = _users_filter(cols, q)
 
         sql = "SELECT * FROM users"
         if where_clauses:
             sql += " WHERE " + " AND ".join(where_clauses)
         sql += " ORDER BY id DESC LIMIT 300"
 
-        rows = conn.execute(sql, tuple(params)).fetchall()
+        rows = panel_cache.get_or_set(
+            cache_key("users", {"q": q}),
+            lambda: rows_to_dicts(conn.execute(sql, tuple(params)).fetchall()),
+            tags=("users",),
+        )
         conn.close()
         return render_template("users.html", rows=rows, q=q)
 
@@ -208,6 +232,8 @@ def create_app() -> Flask:
         if _has_table(conn, "users") and _has_col(conn, "users", "is_banned"):
             conn.execute("UPDATE users SET is_banned=1 WHERE id=?", (user_id,))
             conn.commit()
+            panel_cache.invalidate("users")
+            notifier.notify()
             flash("Користувача забанено ✅", "success")
         else:
             flash("Неможливо забанити користувача ❌", "danger")
@@ -221,12 +247,78 @@ def create_app() -> Flask:
         if _has_table(conn, "users") and _has_col(conn, "users", "is_banned"):
             conn.execute("UPDATE users SET is_banned=0 WHERE id=?", (user_id,))
             conn.commit()
+            panel_cache.invalidate("users")
+            notifier.notify()
             flash("Користувача розбанено ✅", "success")
         else:
             flash("Неможливо розбанити користувача ❌", "danger")
         conn.close()
         return redirect(url_for("users_page"))
 
+    @app.post("/users/bulk")
+    @login_required
+    def users_bulk():
+        """Масовий бан/розбан: вибрані id або всі за поточним пошуком"""
+        action = request.form.get("action", "")
+        q = request.form.get("q", "").strip()
+        if action not in ("ban", "unban"):
+            flash("Невідома дія ❌", "danger")
+            return redirect(url_for("users_page", q=q))
+
+        conn = get_conn()
+        if not (_has_table(conn, "users") and _has_col(conn, "users", "is_banned")):
+            flash("Неможливо змінити користувачів ❌", "danger")
+            return redirect(url_for("users_page", q=q))
+
+        target = 1 if action == "ban" else 0
+        if request.form.get("scope") == "all":
+            where_clauses, params = _users_filter(_table_cols(conn, "users"), q)
+            if not where_clauses:
+                # Без фільтра «всі» означало б усю таблицю користувачів
+                flash("Дія для всіх знайдених доступна лише з пошуковим фільтром", "warning")
+                return redirect(url_for("users_page", q=q))
+            id_chunks = [None]
+        else:
+            ids = _form_ids()
+            if not ids:
+                flash("Не вибрано жодного користувача", "warning")
+                return redirect(url_for("users_page", q=q))
+            where_clauses, params = [], []
+            id_chunks = [ids[i:i + BULK_CHUNK] for i in range(0, len(ids), BULK_CHUNK)]
+
+        tg_col = "telegram_id" if _has_col(conn, "users", "telegram_id") else "NULL"
+        if action == "ban" and ADMIN_IDS and tg_col != "NULL":
+            # Адміністраторів бота масовою дією не банимо ніколи
+            where_clauses = where_clauses + [
+                f"COALESCE(telegram_id, 0) NOT IN ({','.join('?' * len(ADMIN_IDS))})"
+            ]
+            params = list(params) + list(ADMIN_IDS)
+        affected = []
+        with conn:  # одна транзакція на всю дію
+            conn.execute("BEGIN IMMEDIATE")
+            for chunk in id_chunks:
+                clauses = list(where_clauses) + ["COALESCE(is_banned, 0) != ?"]
+                chunk_params = list(params) + [target]
+                if chunk is not None:
+                    clauses.append(f"id IN ({','.join('?' * len(chunk))})")
+                    chunk_params += chunk
+                where = " AND ".join(clauses)
+                affected += conn.execute(
+                    f"SELECT id, {tg_col} AS telegram_id FROM users WHERE {where}", chunk_params
+                ).fetchall()
+                conn.execute(f"UPDATE users SET is_banned=? WHERE {where}", [target] + chunk_params)
+
+        telegram_ids = [r["telegram_id"] for r in affected if r["telegram_id"]]
+        if affected:
+            panel_cache.invalidate("users")
+            notifier.notify()
+        if telegram_ids:
+            FileBasedSync.write_event("users_bulk", {"action": action, "telegram_ids": telegram_ids})
+
+        verb = "заблоковано" if action == "ban" else "розблоковано"
+        flash(f"{verb.capitalize()} користувачів: {len(affected)} ✅", "success")
+        return redirect(url_for("users_page", q=q))
+
     @app.get("/users/<int:user_id>")
     @login_required
     def user_detail(user_id: int):
@@ -298,11 +390,7 @@ def create_app() -> Flask:
     @app.get("/users/export")
     @login_required
     def users_export():
-        """Експорт користувачів у CSV"""
-        import csv
-        from io import StringIO
-        from flask import Response
-        
+        """Потоковий експорт користувачів у CSV (?cols=&from=&to=&gzip=1)"""
         conn = get_conn()
         
         if not _has_table(conn, "users"):
@@ -310,29 +398,15 @@ def create_app() -> Flask:
             flash("Таблиця користувачів не знайдена", "danger")
             return redirect(url_for("users_page"))
         
-        users = conn.execute("SELECT * FROM users ORDER BY id DESC").fetchall()
+        has_rows = conn.execute("SELECT 1 FROM users LIMIT 1").fetchone()
+        cols = _table_cols(conn, "users")
         conn.close()
         
-        if not users:
+        if not has_rows:
             flash("Немає користувачів для експорту", "warning")
             return redirect(url_for("users_page"))
         
-        # Створюємо CSV
-        output = StringIO()
-        cols = list(users[0].keys())
-        writer = csv.DictWriter(output, fieldnames=cols)
-        writer.writeheader()
-        
-        for user in users:
-            writer.writerow(dict(user))
-        
-        output.seek(0)
-        
-        return Response(
-            output.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment;filename=users_export.csv"}
-        )
+        return _export_response("users", cols, "users_export")
 
     # -------- Лоти --------
     @app.get("/lots")
@@ -354,7 +428,11 @@ def create_app() -> Flask:
             params.append(status_filter)
         
         sql += " ORDER BY id DESC LIMIT 500"
-        rows = conn.execute(sql, tuple(params)).fetchall()
+        rows = panel_cache.get_or_set(
+            cache_key("lots", {"status": status_filter}),
+            lambda: rows_to_dicts(conn.execute(sql, tuple(params)).fetchall()),
+            tags=("lots",),
+        )
         conn.close()
         
         return render_template("lots.html", rows=rows, status=status_filter, cols=cols)
@@ -368,6 +446,8 @@ def create_app() -> Flask:
         if _has_table(conn, "lots") and _has_col(conn, "lots", "status"):
             conn.execute("UPDATE lots SET status=? WHERE id=?", (new_status, lot_id))
             conn.commit()
+            panel_cache.invalidate("lots")
+            notifier.notify()
             flash(f"Статус лота #{lot_id} змінено на '{new_status}' ✅", "success")
         else:
             flash("Неможливо змінити статус лота ❌", "danger")
@@ -375,14 +455,73 @@ def create_app() -> Flask:
         conn.close()
         return redirect(url_for("lots_page"))
 
+    @app.post("/lots/bulk")
+    @login_required
+    def lots_bulk():
+        """Масове закриття/архівація/активація: вибрані id або всі за фільтром статусу"""
+        action = request.form.get("action", "")
+        status_filter = request.form.get("status", "").strip()
+        new_status = BULK_LOT_ACTIONS.get(action)
+        if not new_status:
+            flash("Невідома дія ❌", "danger")
+            return redirect(url_for("lots_page", status=status_filter))
+
+        conn = get_conn()
+        if not (_has_table(conn, "lots") and _has_col(conn, "lots", "status")):
+            flash("Неможливо змінити статус лотів ❌", "danger")
+            return redirect(url_for("lots_page", status=status_filter))
+
+        if request.form.get("scope") == "all":
+            if not status_filter:
+                # Без фільтра «всі» означало б усю таблицю лотів
+                flash("Дія для всіх за фільтром доступна лише з фільтром статусу", "warning")
+                return redirect(url_for("lots_page", status=status_filter))
+            where_clauses, params = ["lots.status=?"], [status_filter]
+            id_chunks = [None]
+        else:
+            ids = _form_ids()
+            if not ids:
+                flash("Не вибрано жодного лота", "warning")
+                return redirect(url_for("lots_page", status=status_filter))
+            where_clauses, params = [], []
+            id_chunks = [ids[i:i + BULK_CHUNK] for i in range(0, len(ids), BULK_CHUNK)]
+
+        has_users = _has_table(conn, "users") and _has_col(conn, "users", "telegram_id")
+        affected = []
+        with conn:  # одна транзакція на всю дію
+            conn.execute("BEGIN IMMEDIATE")
+            for chunk in id_chunks:
+                clauses = list(where_clauses) + ["COALESCE(lots.status, '') != ?"]
+                chunk_params = list(params) + [new_status]
+                if chunk is not None:
+                    clauses.append(f"lots.id IN ({','.join('?' * len(chunk))})")
+                    chunk_params += chunk
+                where = " AND ".join(clauses)
+                if has_users:
+                    sql = f"""SELECT lots.id, users.telegram_id AS owner_telegram_id
+                              FROM lots LEFT JOIN users ON lots.owner_user_id = users.id WHERE {where}"""
+                else:
+                    sql = f"SELECT lots.id, NULL AS owner_telegram_id FROM lots WHERE {where}"
+                affected += conn.execute(sql, chunk_params).fetchall()
+                conn.execute(
+                    f"UPDATE lots SET status=? WHERE id IN (SELECT lots.id FROM lots WHERE {where})",
+                    [new_status] + chunk_params,
+                )
+
+        lots = [[r["id"], r["owner_telegram_id"]] for r in affected if r["owner_telegram_id"]]
+        if affected:
+            panel_cache.invalidate("lots")
+            notifier.notify()
+        if lots:
+            FileBasedSync.write_event("lots_bulk", {"new_status": new_status, "lots": lots})
+
+        flash(f"Статус «{new_status}» встановлено для лотів: {len(affected)} ✅", "success")
+        return redirect(url_for("lots_page", status=status_filter))
+
     @app.get("/lots/export")
     @login_required
     def lots_export():
-        """Експорт лотів у CSV"""
-        import csv
-        from io import StringIO
-        from flask import Response
-        
+        """Потоковий експорт лотів у CSV (?cols=&from=&to=&gzip=1)"""
         conn = get_conn()
         
         if not _has_table(conn, "lots"):
@@ -390,29 +529,15 @@ def create_app() -> Flask:
             flash("Таблиця лотів не знайдена", "danger")
             return redirect(url_for("lots_page"))
         
-        lots = conn.execute("SELECT * FROM lots ORDER BY id DESC").fetchall()
+        has_rows = conn.execute("SELECT 1 FROM lots LIMIT 1").fetchone()
+        cols = _table_cols(conn, "lots")
         conn.close()
         
-        if not lots:
+        if not has_rows:
             flash("Немає лотів для експорту", "warning")
             return redirect(url_for("lots_page"))
         
-        # Створюємо CSV
-        output = StringIO()
-        cols = list(lots[0].keys())
-        writer = csv.DictWriter(output, fieldnames=cols)
-        writer.writeheader()
-        
-        for lot in lots:
-            writer.writerow(dict(lot))
-        
-        output.seek(0)
-        
-        return Response(
-            output.getvalue(),
-            mimetype="text/csv",
-            headers={"Content-Disposition": "attachment;filename=lots_export.csv"}
-        )
+        return _export_response("lots", cols, "lots_export")
 
     @app.get("/lots/<int:lot_id>")
     @login_required
@@ -461,6 +586,8 @@ def create_app() -> Flask:
                 conn.execute("UPDATE lots SET is_active=0 WHERE id=?", (lot_id,))
             
             conn.commit()
+            panel_cache.invalidate("lots")
+            notifier.notify()
             flash(f"Лот #{lot_id} закрито ✅", "success")
         else:
             flash("Неможливо закрити лот ❌", "danger")
@@ -472,13 +599,14 @@ def create_app() -> Flask:
     @app.get("/settings")
     @login_required
     def settings_page():
+        stored = get_settings()
         settings_data = {
-            "platform_name": get_setting("platform_name", "Agro Marketplace"),
-            "currency": get_setting("currency", "UAH"),
-            "min_price": get_setting("min_price", "0"),
-            "max_price": get_setting("max_price", "999999"),
-            "example_amount": get_setting("example_amount", "25т"),
-            "auto_moderation": get_setting("auto_moderation", "0"),
+            "platform_name": stored.get("platform_name", "Agro Marketplace"),
+            "currency": stored.get("currency", "UAH"),
+            "min_price": stored.get("min_price", "0"),
+            "max_price": stored.get("max_price", "999999"),
+            "example_amount": stored.get("example_amount", "25т"),
+            "auto_moderation": stored.get("auto_moderation", "0"),
         }
         return render_template("settings.html", s=settings_data)
 
@@ -493,8 +621,8 @@ def create_app() -> Flask:
             conn.close()
             return render_template("contacts.html", contacts=[])
         
-        # Отримуємо всі контакти з інформацією про користувачів
-        contacts = conn.execute("""
+        # Отримуємо всі контакти з інформацією про користувачів (через кеш)
+        sql = """
             SELECT 
                 c.id,
                 c.user_id,
@@ -512,7 +640,10 @@ def create_app() -> Flask:
             LEFT JOIN users u2 ON c.contact_user_id = u2.id
             ORDER BY c.created_at DESC
             LIMIT 500
-        """).fetchall()
+        """
+        contacts = panel_cache.get_or_set(
+            "contacts", lambda: rows_to_dicts(conn.execute(sql).fetchall()), tags=("contacts", "users")
+        )
         
         conn.close()
         
@@ -527,10 +658,74 @@ def create_app() -> Flask:
         set_setting("max_price", request.form.get("max_price", "999999"))
         set_setting("example_amount", request.form.get("example_amount", "25т"))
         set_setting("auto_moderation", "1" if request.form.get("auto_moderation") else "0")
+        panel_cache.invalidate("settings")
         
         flash("Налаштування збережено ✅", "success")
         return redirect(url_for("settings_page"))
 
+    # -------- Аналітика --------
+    @app.get("/analytics")
+    @login_required
+    def analytics_page():
+        """Звіти по аналітичному сховищу (DuckDB), а не по базі бота"""
+        report = request.args.get("report", "lots_by_crop")
+        if report not in analytics_etl.REPORTS:
+            report = "lots_by_crop"
+        cols, rows, error = [], [], None
+        watermarks = []
+        try:
+            watermarks = analytics_etl.read_watermarks()
+            cols, rows = analytics_etl.run_report(report)
+        except Exception as e:
+            error = str(e)
+        return render_template(
+            "analytics.html",
+            reports=analytics_etl.REPORTS,
+            report=report,
+            cols=cols,
+            rows=rows,
+            error=error,
+            watermarks=watermarks,
+            running=analytics_etl.is_running(),
+        )
+
+    @app.post("/analytics/refresh")
+    @login_required
+    def analytics_refresh():
+        if analytics_etl.start_background_etl(str(DB_PATH)):
+            flash("Оновлення аналітики запущено — дані зʼявляться за кілька хвилин", "success")
+        else:
+            flash("Оновлення аналітики вже виконується", "warning")
+        return redirect(url_for("analytics_page"))
+
+    # -------- Метрики бота --------
+    @app.get("/bot-metrics")
+    @login_required
+    def bot_metrics_page():
+        """Затримки, помилки і пропускна здатність хендлерів за знімками процесів бота"""
+        snapshots = bot_metrics.read_snapshots(METRICS_DIR)
+        updated_at = max((s["updated_at"] for s in snapshots), default=None)
+        return render_template(
+            "bot_metrics.html",
+            rows=bot_metrics.summarize(snapshots),
+            sql=bot_metrics.summarize_sql(snapshots + _panel_sql_snapshot()),
+            processes=len(snapshots),
+            concurrency=bot_metrics.summarize_concurrency(snapshots),
+            updated_at=time.strftime("%H:%M:%S", time.localtime(updated_at)) if updated_at else None,
+        )
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        """Ті самі метрики у форматі Prometheus: після входу або з Bearer METRICS_TOKEN"""
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        authorized = current_user.is_authenticated or (
+            METRICS_TOKEN and hmac.compare_digest(token, METRICS_TOKEN)
+        )
+        if not authorized:
+            return Response("Unauthorized\n", status=401, mimetype="text/plain")
+        body = bot_metrics.render_prometheus(bot_metrics.read_snapshots(METRICS_DIR) + _panel_sql_snapshot())
+        return Response(body, mimetype="text/plain", headers={"Cache-Control": "no-store"})
+
     # -------- API для синхронізації з ботом --------
     @app.get("/api/ping")
     def api_ping():
@@ -559,57 +754,112 @@ def create_app() -> Flask:
     @login_required
     def sync_page():
         """Сторінка синхронізації"""
-        conn = get_conn()
-        
-        # Статистика синхронізації
+        # Лічильники беремо зі спільного знімка нотифікатора — без COUNT на кожен запит
+        snap = notifier.snapshot()
         stats = {
-            "users_count": 0,
-            "lots_count": 0,
+            "users_count": snap.get("users_count", 0),
+            "lots_count": snap.get("lots_count", 0),
         }
-        
-        if _has_table(conn, "users"):
-            try:
-                stats["users_count"] = conn.execute("SELECT COUNT(*) AS c FROM users").fetchone()["c"]
-            except:
-                pass
-                
-        if _has_table(conn, "lots"):
-            try:
-                stats["lots_count"] = conn.execute("SELECT COUNT(*) AS c FROM lots").fetchone()["c"]
-            except:
-                pass
-        
-        conn.close()
-        
-        # Для шаблону sync.html потрібні ці змінні
-        unprocessed_events = []  # TODO: Отримати з таблиці sync_events якщо вона є
-        total_processed = 0      # TODO: Порахувати оброблені події
-        
+
         return render_template(
             "sync.html", 
-            unprocessed_events=unprocessed_events,
-            total_processed=total_processed,
+            unprocessed_events=notifier.unprocessed_events(),
+            total_processed=snap.get("processed", 0),
             stats=stats
         )
 
+    @app.get("/api/sync/stream")
+    @login_required
+    def sync_stream():
+        """SSE-стрічка змін синхронізації: надсилає лише дельти"""
+        since = _sync_since(request.headers.get("Last-Event-ID") or request.args.get("since", ""))
+
+        if not _sse_slots.acquire(blocking=False):
+            # 204 — браузер не перепідключається, клієнт переходить на опитування
+            return Response(status=204)
+
+        def _message(version: int, payload: dict) -> str:
+            return f"id: {version}\nevent: sync\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        def generate():
+            nonlocal since
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+
+            sent: dict = {}
+            started = time.monotonic()
+            first = True
+            while time.monotonic() - started < SSE_MAX_STREAM_SECONDS:
+                version, snapshot, events = notifier.wait(since, 0 if first else SSE_HEARTBEAT_SECONDS)
+                if version == since and not first:
+                    # Коментар-heartbeat тримає з'єднання живим через проксі
+                    # і виявляє закриту вкладку (запис у закритий сокет)
+                    yield ": ping\n\n"
+                    continue
+
+                delta = {k: v for k, v in snapshot.items() if sent.get(k) != v}
+                if events:
+                    delta["events"] = events[-SSE_MAX_EVENTS:]
+                if delta or first:
+                    yield _message(version, delta)
+
+                sent = snapshot
+                since = version
+                first = False
+
+        response = Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        released = threading.Event()
+
+        def release():
+            # Викликається сервером при закритті відповіді, навіть якщо генератор не стартував
+            if not released.is_set():
+                released.set()
+                _sse_slots.release()
+
+        response.call_on_close(release)
+        return response
+
+    @app.get("/api/sync/poll")
+    @login_required
+    def sync_poll():
+        """Те саме, що стрічка, одним запитом — для вкладок понад SSE_MAX_STREAMS"""
+        since = _sync_since(request.args.get("since", ""))
+        version, snapshot, events = notifier.wait(since, 0)
+        payload = dict(snapshot)
+        if events:
+            payload["events"] = events[-SSE_MAX_EVENTS:]
+        return jsonify({"version": version, "delta": payload, "poll_seconds": SSE_POLL_SECONDS})
+
     return app
 
 
 # ============ HELPERS ============
 
+def _sync_since(raw: str) -> int:
+    """Версія, яку клієнт уже бачив; чужа (інший воркер / рестарт) — з нуля"""
+    since = int(raw) if raw.isdigit() else 0
+    return 0 if since > notifier.version else since
+
+
+def _panel_sql_snapshot() -> list:
+    """SQL-статистика цього процесу панелі (SQL_TRACE=1) у форматі знімка метрик"""
+    if not sql_trace.SQL_TRACE:
+        return []
+    return [{"source": "panel", "series": [], "sql": sql_trace.registry.snapshot()}]
+
+
 def _has_table(conn, table: str) -> bool:
-    """Перевірка існування таблиці"""
-    row = conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-        (table,)
-    ).fetchone()
-    return bool(row)
+    """Перевірка існування таблиці (з кешу схеми)"""
+    return has_table(conn, table)
 
 
 def _table_cols(conn, table: str) -> list:
-    """Отримання списку колонок таблиці"""
+    """Отримання списку колонок таблиці (з кешу схеми)"""
     try:
-        return [row["name"] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        return table_columns(conn, table)
     except Exception:
         return []
 
@@ -619,6 +869,52 @@ def _has_col(conn, table: str, col: str) -> bool:
     return col in _table_cols(conn, table)
 
 
+def _users_filter(cols, q: str):
+    """WHERE-умови пошуку користувачів (спільні для списку і масових дій)"""
+    where_clauses = []
+    params = []
+    if q:
+        # Пошук по різним полям
+        search_fields = []
+        if "telegram_id" in cols:
+            search_fields.append("CAST(telegram_id AS TEXT) LIKE ?")
+            params.append(f"%{q}%")
+        if "username" in cols:
+            search_fields.append("COALESCE(username,'') LIKE ?")
+            params.append(f"%{q}%")
+        if "full_name" in cols:
+            search_fields.append("COALESCE(full_name,'') LIKE ?")
+            params.append(f"%{q}%")
+
+        if search_fields:
+            where_clauses.append(f"({' OR '.join(search_fields)})")
+    return where_clauses, params
+
+
+def _form_ids() -> list:
+    """Унікальні цілі id з чекбоксів форми"""
+    return sorted({int(v) for v in request.form.getlist("ids") if v.isdigit()})
+
+
+def _export_response(table: str, available_cols, filename: str) -> Response:
+    """Chunked-відповідь з CSV (або .csv.gz) без Content-Length"""
+    opts = parse_export_args(request.args, available_cols)
+    rows = iter_rows(table, opts["cols"], opts["date_from"], opts["date_to"])
+    body = stream_csv(opts["cols"], rows, gzip=opts["gzip"])
+    if opts["gzip"]:
+        mimetype, filename = "application/gzip", f"{filename}.csv.gz"
+    else:
+        mimetype, filename = "text/csv", f"{filename}.csv"
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            "Content-Disposition": f"attachment;filename={filename}",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
 # ============ ЗАПУСК ============
 
 if __name__ == "__main__":
@@ -22,6 +22,7 @@ from flask_login import LoginManager, login_user, logout_user, login_required, c
 from config.settings import FLASK_SECRET, ADMIN_USER, ADMIN_PASS
 from .db import (
     get_conn,
+    init_app,
     init_schema,
     get_setting,
     set_setting,
@@ -49,8 +50,9 @@ def create_app() -> Flask:
     def load_user(user_id: str):
         return AdminUser(user_id)
 
-    # Ensure required tables exist (settings/web_admins)
+    # Ensure required tables exist (settings/web_admins); one connection per request
     init_schema()
+    init_app(app)
 
     @app.get("/")
     def root():
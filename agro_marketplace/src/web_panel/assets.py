@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Роздача зібраних статичних файлів (див. build_assets.py)
+
+asset_url("css/main.css") у шаблонах дає /assets/css/main.<hash>.css, якщо
+збірка є, інакше — звичайний /static/... (розробка без збірки працює як раніше).
+Маршрут /assets/ віддає .br/.gz варіант за Accept-Encoding з
+Cache-Control: immutable — імʼя змінюється разом із вмістом.
+"""
+
+import json
+import mimetypes
+import os
+from typing import Dict
+
+from flask import Flask, abort, request, send_file, url_for
+
+from .build_assets import DIST_DIR, MANIFEST_FILE
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _load_manifest() -> Dict[str, str]:
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def init_assets(app: Flask) -> None:
+    """Реєструє asset_url() у Jinja і маршрут /assets/"""
+    manifest = _load_manifest()
+    served = set(manifest.values())
+
+    def asset_url(filename: str) -> str:
+        hashed = manifest.get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("assets", filename=hashed)
+
+    app.jinja_env.globals["asset_url"] = asset_url
+
+    @app.get("/assets/<path:filename>", endpoint="assets")
+    def assets(filename: str):
+        if filename not in served:
+            abort(404)
+        path = os.path.join(DIST_DIR, filename)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        accepted = request.headers.get("Accept-Encoding", "")
+        encoding = None
+        for enc, ext in (("br", ".br"), ("gzip", ".gz")):
+            if enc in accepted and os.path.exists(path + ext):
+                path, encoding = path + ext, enc
+                break
+
+        response = send_file(path, mimetype=mimetype, conditional=True, max_age=IMMUTABLE_MAX_AGE)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        return response
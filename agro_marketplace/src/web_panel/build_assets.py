@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Збірка статичних файлів панелі
+
+Для кожного файлу з static/ (крім dist/) створює у static/dist/:
+- копію з хешем вмісту в імені (css/main.css -> css/main.3f2a1b9c0d.css);
+- попередньо стиснуті варіанти .gz та .br (brotli — якщо встановлено пакет);
+- manifest.json: {"css/main.css": "css/main.3f2a1b9c0d.css", ...}.
+
+Запуск (перед стартом веб-процесу):
+    python -m src.web_panel.build_assets
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict
+
+STATIC_DIR = Path(__file__).parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_FILE = DIST_DIR / "manifest.json"
+
+# Що має сенс стискати (картинки й шрифти вже стиснуті)
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".map", ".html"}
+HASH_LENGTH = 10
+
+
+def _hashed_name(rel: Path, data: bytes) -> Path:
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    return rel.with_name(f"{rel.stem}.{digest}{rel.suffix}")
+
+
+def _write_compressed(target: Path, data: bytes) -> None:
+    with open(str(target) + ".gz", "wb") as f:
+        # mtime=0 — відтворюваний результат між збірками
+        with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=9, mtime=0) as gz:
+            gz.write(data)
+    try:
+        import brotli
+    except ImportError:
+        return
+    with open(str(target) + ".br", "wb") as f:
+        f.write(brotli.compress(data, quality=11))
+
+
+def build(static_dir: Path = STATIC_DIR, dist_dir: Path = DIST_DIR) -> Dict[str, str]:
+    """Builds dist/ from scratch and returns the manifest"""
+    if dist_dir.exists():
+        shutil.rmtree(dist_dir)
+    dist_dir.mkdir(parents=True)
+
+    manifest: Dict[str, str] = {}
+    for path in sorted(static_dir.rglob("*")):
+        if not path.is_file() or dist_dir in path.parents:
+            continue
+        rel = path.relative_to(static_dir)
+        data = path.read_bytes()
+        hashed = _hashed_name(rel, data)
+        target = dist_dir / hashed
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        if path.suffix.lower() in COMPRESSIBLE:
+            _write_compressed(target, data)
+        manifest[rel.as_posix()] = hashed.as_posix()
+
+    tmp = dist_dir / "manifest.json.tmp"
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, dist_dir / "manifest.json")
+    return manifest
+
+
+if __name__ == "__main__":
+    result = build()
+    print(f"✅ Зібрано файлів: {len(result)} → {DIST_DIR}")
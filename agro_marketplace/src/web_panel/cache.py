@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Спільний TTL-кеш результатів запитів для веб-панелі
+
+Зберігається в окремому SQLite-файлі (WAL), тому однаковий для всіх воркерів
+gunicorn і не навантажує базу бота. Інвалідація — через версії тегів:
+ключ запису містить поточні версії своїх тегів, а write-роут лише збільшує
+версію тегу («users», «lots», ...) — усі залежні записи стають недосяжними
+одразу в усіх воркерах, а прострочені прибираються при записі.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence
+
+from config.settings import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+PANEL_CACHE_FILE = os.getenv("PANEL_CACHE_FILE", str(DB_PATH.parent / "panel_cache.db"))
+PANEL_CACHE_TTL = float(os.getenv("PANEL_CACHE_TTL", "30"))
+# Як часто чистити прострочені записи (секунди)
+PURGE_INTERVAL = 60.0
+
+
+class PanelCache:
+    """Key/value кеш з TTL і тегами поверх SQLite"""
+
+    def __init__(self, path: str = PANEL_CACHE_FILE, default_ttl: float = PANEL_CACHE_TTL):
+        self.path = path
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+    # ---------- Зʼєднання ----------
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )"""
+            )
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                )"""
+            )
+            self._local.conn = conn
+        return conn
+
+    # ---------- Публічне API ----------
+
+    def _versioned_key(self, conn: sqlite3.Connection, key: str, tags: Sequence[str]) -> str:
+        if not tags:
+            return key
+        marks = ",".join("?" * len(tags))
+        versions = dict(conn.execute(f"SELECT tag, version FROM cache_tags WHERE tag IN ({marks})", tuple(tags)))
+        return key + "|" + ",".join(f"{t}:{versions.get(t, 0)}" for t in sorted(tags))
+
+    def get_or_set(self, key: str, loader: Callable[[], Any], tags: Sequence[str] = (),
+                   ttl: Optional[float] = None) -> Any:
+        """Повертає закешоване значення або викликає loader і зберігає результат (JSON)"""
+        try:
+            conn = self._conn()
+            full_key = self._versioned_key(conn, key, tags)
+            row = conn.execute(
+                "SELECT value FROM cache_entries WHERE key=? AND expires_at > ?", (full_key, time.time())
+            ).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            # Кеш — лише оптимізація: при помилці рахуємо напряму
+            logger.warning(f"Panel cache read failed: {e}")
+            return loader()
+
+        value = loader()
+        try:
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (full_key, json.dumps(value, ensure_ascii=False, default=str), now + (ttl or self.default_ttl)),
+            )
+            if now - self._last_purge > PURGE_INTERVAL:
+                self._last_purge = now
+                conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        except sqlite3.Error as e:
+            logger.warning(f"Panel cache write failed: {e}")
+        return value
+
+    def invalidate(self, *tags: str) -> None:
+        """Робить недійсними всі записи з цими тегами (у всіх воркерах)"""
+        if not tags:
+            return
+        try:
+            self._conn().executemany(
+                """INSERT INTO cache_tags (tag, version) VALUES (?, 1)
+                   ON CONFLICT(tag) DO UPDATE SET version = version + 1""",
+                [(t,) for t in tags],
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Panel cache invalidate failed: {e}")
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM cache_entries")
+
+
+def cache_key(route: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Ключ: маршрут + відсортовані параметри"""
+    if not params:
+        return route
+    return route + "?" + "&".join(f"{k}={params[k]}" for k in sorted(params))
+
+
+def rows_to_dicts(rows: Iterable[sqlite3.Row]) -> list:
+    """sqlite3.Row не серіалізується — шаблони однаково працюють зі словниками"""
+    return [dict(r) for r in rows]
+
+
+panel_cache = PanelCache()
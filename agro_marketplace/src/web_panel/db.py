@@ -5,20 +5,136 @@ Database helper для веб-панелі
 """
 
 import sqlite3
+import threading
 from pathlib import Path
+from typing import Dict, List, Optional
+
+from flask import Flask, g, has_app_context, request
 from config.settings import DB_PATH
+from src.database import sql_trace
 
+from .cache import panel_cache
 
-def get_conn() -> sqlite3.Connection:
-    """Підключення до БД з row_factory"""
-    # Створюємо директорію якщо потрібно
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    
-    conn = sqlite3.connect(str(DB_PATH))
+_dir_ready = False
+
+# Кеш схеми: таблиця -> колонки. Скидається, коли змінюється PRAGMA schema_version
+# (міграції бота / CREATE TABLE / ALTER TABLE з будь-якого процесу; перевірка раз на
+# запит), а власні зміни схеми панелі (init_schema) скидають його одразу
+_schema_lock = threading.Lock()
+_schema_version: Optional[int] = None
+_schema_tables: Dict[str, List[str]] = {}
+
+
+class _RequestConnection(sqlite3.Connection):
+    """Зʼєднання запиту: close() у роутах нічого не робить, закриває teardown"""
+
+    def close(self) -> None:
+        pass
+
+    def release(self) -> None:
+        super().close()
+
+
+def _connect(factory=sqlite3.Connection) -> sqlite3.Connection:
+    global _dir_ready
+    if not _dir_ready:
+        # Створюємо директорію якщо потрібно (один раз на процес)
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _dir_ready = True
+    if sql_trace.SQL_TRACE:
+        # Запити рахуються області поточного запиту Flask (див. init_app)
+        factory = sql_trace.traced(factory)
+    conn = sqlite3.connect(str(DB_PATH), factory=factory)
     conn.row_factory = sqlite3.Row
     return conn
 
 
+def get_conn() -> sqlite3.Connection:
+    """Підключення до БД з row_factory
+
+    У межах запиту Flask повертає одне спільне зʼєднання з flask.g,
+    поза ним (фонові потоки, CLI) — нове зʼєднання, яке закриває викликач.
+    """
+    if not has_app_context():
+        return _connect()
+    conn = g.get("_db_conn")
+    if conn is None:
+        conn = g._db_conn = _connect(_RequestConnection)
+    return conn
+
+
+def close_conn(exc: Optional[BaseException] = None) -> None:
+    conn = g.pop("_db_conn", None)
+    if conn is not None:
+        conn.release()
+
+
+def _open_trace_scope() -> None:
+    g._sql_scope = sql_trace.TraceScope(f"panel.{request.endpoint}").open()
+
+
+def _close_trace_scope(exc: Optional[BaseException] = None) -> None:
+    scope = g.pop("_sql_scope", None)
+    if scope is not None:
+        scope.close()
+
+
+def init_app(app: Flask) -> None:
+    """Реєструє закриття зʼєднання запиту (і область трасування SQL при SQL_TRACE=1)"""
+    app.teardown_appcontext(close_conn)
+    if sql_trace.SQL_TRACE:
+        app.before_request(_open_trace_scope)
+        app.teardown_request(_close_trace_scope)
+
+
+def invalidate_schema_cache() -> None:
+    """Скинути кеш схеми (після змін схеми в цьому ж процесі)"""
+    global _schema_version
+    with _schema_lock:
+        _schema_version = None
+        _schema_tables.clear()
+    if has_app_context():
+        # Наступне звернення в цьому ж запиті перечитає schema_version
+        g.pop("_schema_checked", None)
+
+
+def _check_schema_version(conn: sqlite3.Connection) -> None:
+    global _schema_version
+    # Версію схеми перевіряємо раз на запит, а не на кожен виклик
+    if has_app_context():
+        if g.get("_schema_checked"):
+            return
+        g._schema_checked = True
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    with _schema_lock:
+        if version != _schema_version:
+            _schema_tables.clear()
+            _schema_version = version
+            for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"):
+                _schema_tables[row[0]] = []
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Колонки таблиці з кешу схеми ([] якщо таблиці немає)"""
+    _check_schema_version(conn)
+    with _schema_lock:
+        cols = _schema_tables.get(table)
+    if cols is None:
+        return []
+    if not cols:
+        cols = [row["name"] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+        with _schema_lock:
+            if table in _schema_tables:
+                _schema_tables[table] = cols
+    return list(cols)
+
+
+def has_table(conn: sqlite3.Connection, table: str) -> bool:
+    _check_schema_version(conn)
+    with _schema_lock:
+        return table in _schema_tables
+
+
 def init_schema() -> None:
     """Ініціалізація схеми БД (таблиці settings і web_admins)"""
     conn = get_conn()
@@ -47,18 +163,32 @@ def init_schema() -> None:
     
     conn.commit()
     conn.close()
+    invalidate_schema_cache()
+
+
+def get_settings() -> Dict[str, str]:
+    """Усі налаштування одним запитом (кешуються на час запиту і в спільному кеші)"""
+    if has_app_context() and "_settings" in g:
+        return g._settings
+    def load() -> Dict[str, str]:
+        conn = get_conn()
+        try:
+            return {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM settings")}
+        except sqlite3.OperationalError:
+            return {}
+        finally:
+            conn.close()
+
+    # Між запитами — зі спільного кешу; settings_save скидає тег «settings»
+    settings = panel_cache.get_or_set("settings", load, tags=("settings",))
+    if has_app_context():
+        g._settings = settings
+    return settings
 
 
 def get_setting(key: str, default: str = "") -> str:
     """Отримати значення налаштування"""
-    conn = get_conn()
-    try:
-        row = conn.execute("SELECT value FROM settings WHERE key=?", (key,)).fetchone()
-        return row["value"] if row else default
-    except sqlite3.OperationalError:
-        return default
-    finally:
-        conn.close()
+    return get_settings().get(key, default)
 
 
 def set_setting(key: str, value: str) -> None:
@@ -72,3 +202,5 @@ def set_setting(key: str, value: str) -> None:
         conn.commit()
     finally:
         conn.close()
+    if has_app_context() and "_settings" in g:
+        g._settings[key] = value
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Спільний in-process нотифікатор змін для живої стрічки синхронізації (SSE)
+
+Один фоновий потік на воркер стежить за файлом синхронізації та файлом БД
+(лише os.stat) і перераховує знімок (лічильники + нові події) тільки коли
+щось реально змінилось. Усі відкриті вкладки панелі чекають на Condition
+і отримують лише дельти — неактивна вкладка не генерує жодного запиту до БД.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config.settings import DB_PATH
+from src.bot.services.sync_service import FileBasedSync
+
+from .db import get_conn
+
+# Як часто фоновий потік перевіряє mtime файлів (секунди)
+POLL_INTERVAL = float(os.getenv("SYNC_STREAM_POLL", "2"))
+# Скільки останніх нових подій тримаємо для клієнтів, що перепідключились
+EVENTS_BACKLOG = 200
+
+
+def _file_signature(path) -> Tuple[int, int]:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return 0, 0
+
+
+def _event_key(event: Dict[str, Any]) -> str:
+    return f"{event.get('timestamp')}|{event.get('event_type')}"
+
+
+class ChangeNotifier:
+    """Розсилає дельти стану синхронізації всім підписникам воркера"""
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._version = 0
+        self._snapshot: Dict[str, Any] = {}
+        self._events: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=EVENTS_BACKLOG)
+        self._seen_events: set = set()
+        self._sync_sig: Optional[Tuple[int, int]] = None
+        self._db_sig: Optional[Tuple[Tuple[int, int], Tuple[int, int]]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- Публічне API ----------
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Поточний знімок (лічильники); при першому виклику рахує його"""
+        self._ensure_started()
+        with self._cond:
+            return dict(self._snapshot)
+
+    def unprocessed_events(self) -> List[Dict[str, Any]]:
+        """Необроблені події з файлу синхронізації"""
+        return FileBasedSync.read_unprocessed_events()
+
+    def notify(self) -> None:
+        """Викликається з write-роутів панелі: перерахувати знімок негайно"""
+        self._ensure_started()
+        self._refresh(force=True)
+
+    def wait(self, since: int, timeout: float) -> Tuple[int, Dict[str, Any], List[Dict[str, Any]]]:
+        """Чекає на версію > since. Повертає (версія, знімок, нові події після since)"""
+        self._ensure_started()
+        with self._cond:
+            if self._version <= since:
+                self._cond.wait(timeout)
+            events = [e for v, e in self._events if v > since]
+            return self._version, dict(self._snapshot), events
+
+    # ---------- Внутрішнє ----------
+
+    def _ensure_started(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._refresh(force=True)
+            self._thread = threading.Thread(target=self._watch, name="sync-notifier", daemon=True)
+            self._thread.start()
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._refresh()
+            except Exception:
+                # Нотифікатор не повинен падати через тимчасово заблоковану БД
+                continue
+
+    def _refresh(self, force: bool = False) -> None:
+        # Потік-спостерігач і write-роути можуть перераховувати одночасно
+        with self._refresh_lock:
+            self._refresh_locked(force)
+
+    def _refresh_locked(self, force: bool) -> None:
+        sync_sig = _file_signature(FileBasedSync.SYNC_FILE)
+        db_sig = (_file_signature(DB_PATH), _file_signature(f"{DB_PATH}-wal"))
+
+        sync_changed = force or sync_sig != self._sync_sig
+        db_changed = force or db_sig != self._db_sig
+        if not (sync_changed or db_changed):
+            return
+
+        snapshot = dict(self._snapshot)
+        new_events: List[Dict[str, Any]] = []
+
+        if sync_changed:
+            self._sync_sig = sync_sig
+            unprocessed, processed = self._read_sync_file()
+            keys = {_event_key(e) for e in unprocessed}
+            new_events = [e for e in unprocessed if _event_key(e) not in self._seen_events]
+            self._seen_events = keys
+            snapshot["unprocessed"] = len(unprocessed)
+            snapshot["processed"] = processed
+
+        if db_changed:
+            self._db_sig = db_sig
+            snapshot.update(self._count_rows())
+
+        with self._cond:
+            if snapshot == self._snapshot and not new_events:
+                return
+            self._version += 1
+            self._snapshot = snapshot
+            for event in new_events:
+                self._events.append((self._version, event))
+            self._cond.notify_all()
+
+    @staticmethod
+    def _read_sync_file() -> Tuple[List[Dict[str, Any]], int]:
+        events = FileBasedSync.read_all_events()
+        unprocessed = [e for e in events if not e.get("processed", False)]
+        return unprocessed, len(events) - len(unprocessed)
+
+    @staticmethod
+    def _count_rows() -> Dict[str, int]:
+        counts = {"users_count": 0, "lots_count": 0}
+        conn = get_conn()
+        try:
+            for key, table in (("users_count", "users"), ("lots_count", "lots")):
+                try:
+                    counts[key] = conn.execute(f"SELECT COUNT(*) AS c FROM {table}").fetchone()["c"]
+                except Exception:
+                    pass
+        finally:
+            conn.close()
+        return counts
+
+
+# Глобальний нотифікатор воркера
+notifier = ChangeNotifier()
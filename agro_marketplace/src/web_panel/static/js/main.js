@@ -486,28 +486,98 @@ if (searchInput) {
 }
 
 // ==================== 
-// LIVE UPDATES (WebSocket simulation)
+// LIVE UPDATES (Server-Sent Events)
 // ==================== 
 
-function simulateLiveUpdates() {
-    setInterval(() => {
-        updateSyncStatus();
-    }, 30000); // Update every 30 seconds
+// Одна SSE-підписка на вкладку: сервер надсилає лише дельти
+// (нові події, лічильники), тож відкрита вкладка майже нічого не коштує.
+// Кількість стрічок на воркер обмежена: понад ліміт сервер відповідає 204,
+// і вкладка переходить на рідкісне опитування /api/sync/poll.
+const syncState = { unprocessed: 0 };
+
+function applySyncDelta(delta) {
+    Object.assign(syncState, delta);
+    updateSyncStatus(syncState.unprocessed);
+
+    // Сторінки (наприклад /sync) підписуються на цю подію
+    document.dispatchEvent(new CustomEvent('sync:update', { detail: delta }));
 }
 
-function updateSyncStatus() {
-    const syncStatus = document.getElementById('syncStatus');
-    if (syncStatus) {
-        const statusDot = syncStatus.querySelector('.status-dot');
-        statusDot.style.animation = 'none';
-        setTimeout(() => {
-            statusDot.style.animation = 'pulse 2s infinite';
-        }, 10);
+function pollSync(since) {
+    fetch('/api/sync/poll?since=' + since, { credentials: 'same-origin' })
+        .then(function(response) { return response.ok ? response.json() : null; })
+        .then(function(data) {
+            if (!data) {
+                setTimeout(function() { pollSync(since); }, 15000);
+                return;
+            }
+            if (data.version !== since) {
+                applySyncDelta(data.delta);
+            }
+            setTimeout(function() { pollSync(data.version); }, data.poll_seconds * 1000);
+        })
+        .catch(function() {
+            setTimeout(function() { pollSync(since); }, 15000);
+        });
+}
+
+function initSyncStream() {
+    if (!document.getElementById('syncBadge')) {
+        return;
+    }
+    if (!window.EventSource) {
+        pollSync(0);
+        return;
+    }
+
+    const source = new EventSource('/api/sync/stream');
+    let lastVersion = 0;
+
+    source.addEventListener('sync', function(e) {
+        let delta;
+        try {
+            delta = JSON.parse(e.data);
+        } catch (err) {
+            return;
+        }
+        lastVersion = parseInt(e.lastEventId, 10) || lastVersion;
+        applySyncDelta(delta);
+    });
+
+    source.onerror = function() {
+        if (source.readyState === EventSource.CLOSED) {
+            // Сервер відмовив у стрічці (ліміт) — опитуємо
+            pollSync(lastVersion);
+            return;
+        }
+        const statusText = document.querySelector('#syncStatus .status-text');
+        if (statusText) {
+            statusText.textContent = 'Перепідключення...';
+        }
+    };
+}
+
+function updateSyncStatus(unprocessedCount) {
+    const badge = document.getElementById('syncBadge');
+    const statusDot = document.querySelector('#syncStatus .status-dot');
+    const statusText = document.querySelector('#syncStatus .status-text');
+    if (!badge || !statusDot || !statusText) {
+        return;
+    }
+
+    if (unprocessedCount > 0) {
+        badge.textContent = unprocessedCount;
+        badge.style.display = 'inline-block';
+        statusDot.className = 'status-dot status-warning';
+        statusText.textContent = 'Є події для синхронізації';
+    } else {
+        badge.style.display = 'none';
+        statusDot.className = 'status-dot status-success';
+        statusText.textContent = 'Синхронізовано';
     }
 }
 
-// Initialize live updates
-simulateLiveUpdates();
+document.addEventListener('DOMContentLoaded', initSyncStream);
 
 // ==================== 
 // EXPORT FUNCTIONALITY
@@ -0,0 +1,120 @@
+"""
+Тести анонімізації записаних оновлень (src/bot/middlewares/recorder.py)
+"""
+import os
+import tempfile
+
+os.environ.setdefault("BOT_TOKEN", "1:test")
+# Імпорт хендлерів (для клавіатур) створює БД — не в робочому дереві
+os.environ.setdefault("DB_FILE", os.path.join(tempfile.mkdtemp(), "agro_bot.db"))
+
+from src.bot.middlewares.recorder import Anonymizer, _known_texts  # noqa: E402
+
+KEY = b"test-key"
+MENU = {"🌾 Маркет", "⏭ Пропустити", "Пшениця"}
+
+
+def anonymizer() -> Anonymizer:
+    return Anonymizer(KEY, keep_texts=MENU)
+
+
+def test_personal_texts_are_masked():
+    a = anonymizer()
+    for text in ("+380 50 123 45 67", "@ivan_petrenko", "«ТОВ Агро» Іван, +380501234567",
+                 "123 45 67", "250", "Іван Петренко"):
+        masked = a.text(text)
+        assert len(masked) == len(text)
+        assert not any(ch.isdigit() and ch != "0" for ch in masked), masked
+        assert not any(ch.isalpha() and ch != "x" for ch in masked), masked
+
+
+def test_phone_and_username_examples():
+    a = anonymizer()
+    assert a.text("+380 50 123 45 67") == "+000 00 000 00 00"
+    assert a.text("@ivan_petrenko") == "@xxxx_xxxxxxxx"
+    assert a.text("«ТОВ Агро» Іван, +380501234567") == "«xxx xxxx» xxxx, +000000000000"
+
+
+def test_emoji_prefix_alone_is_not_kept():
+    a = anonymizer()
+    assert a.text("🌾 Іван +380501234567") == "🌾 xxxx +000000000000"
+    assert a.text("🌾 Маркет!") == "🌾 xxxxxx!"
+
+
+def test_known_texts_are_kept_exactly():
+    a = anonymizer()
+    assert a.text("🌾 Маркет") == "🌾 Маркет"
+    assert a.text(" Пшениця ") == " Пшениця "
+    assert a.text("") == ""
+
+
+def test_commands_keep_only_the_command():
+    a = anonymizer()
+    assert a.text("/start ref_380501234567") == "/start"
+    assert a.text("/help") == "/help"
+
+
+def test_ids_are_deterministic_and_keep_sign():
+    a, b = anonymizer(), Anonymizer(b"other-key", keep_texts=MENU)
+    assert a.anon_id(12345) == anonymizer().anon_id(12345)
+    assert a.anon_id(12345) != 12345
+    assert a.anon_id(12345) != b.anon_id(12345)
+    assert a.anon_id(-100123) < 0 < a.anon_id(100123)
+
+
+def test_update_masks_names_and_drops_contacts():
+    raw = {
+        "update_id": 1,
+        "message": {
+            "message_id": 7,
+            "from": {"id": 42, "first_name": "Іван", "username": "ivan_petrenko", "is_bot": False},
+            "chat": {"id": 42, "type": "private", "first_name": "Іван"},
+            "text": "Мій номер +380501234567",
+            "contact": {"phone_number": "+380501234567", "first_name": "Іван", "user_id": 42},
+        },
+    }
+    message = anonymizer().update(raw)["message"]
+    assert message["from"]["id"] == message["chat"]["id"] != 42
+    assert message["from"]["first_name"].startswith("u") and "Іван" not in message["from"]["first_name"]
+    assert message["from"]["username"] != "ivan_petrenko"
+    assert message["text"] == "xxx xxxxx +000000000000"
+    assert "contact" not in message
+    assert message["message_id"] == 7
+
+
+def test_known_texts_include_menu_buttons():
+    texts = _known_texts()
+    assert {"🌾 Маркет", "⬅️ Назад", "❌ Вийти з чату", "⏭ Пропустити"} <= texts
+
+
+def test_callback_message_urls_are_not_recorded():
+    raw = {
+        "update_id": 2,
+        "callback_query": {
+            "id": "99",
+            "from": {"id": 42, "first_name": "Іван", "is_bot": False},
+            "chat_instance": "-123",
+            "data": "chat:open:5",
+            "message": {
+                "message_id": 8,
+                "chat": {"id": 42, "type": "private"},
+                "text": "📇 Контакт: Петро",
+                "entities": [
+                    {"type": "text_link", "offset": 0, "length": 2, "url": "tg://user?id=555000111"},
+                    {"type": "url", "offset": 3, "length": 5},
+                ],
+                "reply_markup": {"inline_keyboard": [[
+                    {"text": "💬 Написати", "url": "https://t.me/petro_agro"},
+                    {"text": "👤 Профіль", "url": "tg://user?id=555000111"},
+                ]]},
+            },
+        },
+    }
+    recorded = anonymizer().update(raw)
+    dumped = str(recorded)
+    assert "reply_markup" not in recorded["callback_query"]["message"]
+    assert "petro_agro" not in dumped and "555000111" not in dumped
+    entities = recorded["callback_query"]["message"]["entities"]
+    assert entities[0]["url"] == anonymizer().url("tg://user?id=555000111")
+    assert entities[1] == {"type": "url", "offset": 3, "length": 5}
+    assert recorded["callback_query"]["data"] == "chat:open:5"